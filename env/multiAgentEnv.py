@@ -1,9 +1,27 @@
 import numpy as np
-import scipy.stats as ss
+import functools as ft
+import zlib
+from src.mathTools.distribution import GaussianWithFixCov, BuildGaussianFixCov, BuildGaussianFixCovWithCholesky, sampleFromContinuousSpace
 
-getPosFromAgentState = lambda state: np.array([state[0], state[1]])
-getVelFromAgentState = lambda state: np.array([state[2], state[3]])
-getCaughtHistoryFromAgentState = lambda state: np.array(state[4])
+# canonical state: one contiguous (N, 5) array of [x, y, vx, vy, caughtHistory], caught history 0 for non-sheep
+stateDim = 5
+stateDType = np.float32
+
+getPosFromAgentState = lambda state: np.asarray(state)[..., 0:2]
+getVelFromAgentState = lambda state: np.asarray(state)[..., 2:4]
+getCaughtHistoryFromAgentState = lambda state: np.asarray(state)[..., 4]
+
+
+def stackEntitiesState(state, stateDim=stateDim):
+    if isinstance(state, np.ndarray) and state.dtype != object:
+        if state.shape[-1] == stateDim:
+            return state
+        return np.concatenate([state, np.zeros(state.shape[:-1] + (stateDim - state.shape[-1], ))], axis=-1)
+    return np.array([np.pad(np.asarray(agentState, dtype=float), (0, stateDim - len(agentState))) for agentState in state])
+
+
+def toCanonicalState(state):
+    return np.ascontiguousarray(stackEntitiesState(state, stateDim), dtype=stateDType)
 
 
 class StayInBoundaryByReflectVelocity():
@@ -63,8 +81,88 @@ class IsCollision:
         return True if dist < minDist else False
 
 
+class CollisionByChecker:
+    # wolf x sheep collision matrix from the injected isCollision; a collisionContext passed to the rewards replaces it
+    def __init__(self, isCollision, entitiesSizeList):
+        self.isCollision = isCollision
+        self.entitiesSizeList = entitiesSizeList
+
+    def __call__(self, nextState, wolvesID, sheepsID):
+        return np.array([[self.isCollision(nextState[wolfID], nextState[sheepID], self.entitiesSizeList[wolfID],
+                                           self.entitiesSizeList[sheepID]) for sheepID in sheepsID] for wolfID in wolvesID],
+                        dtype=bool).reshape(len(wolvesID), len(sheepsID))
+
+
+def getEntitiesPosFromState(state):
+    if isinstance(state, np.ndarray) and state.dtype != object:
+        return state[..., :2]
+    return np.array([getPosFromAgentState(agentState) for agentState in state])
+
+
+class WolfSheepCollisionContext:
+    def __init__(self, entitiesSizeList, killZoneRatio=1.0, killZoneDistance=None):
+        self.entitiesSize = np.array(entitiesSizeList, dtype=float)
+        self.killZoneRatio = killZoneRatio
+        self.killZoneDistance = killZoneDistance if killZoneDistance is not None else \
+            (self.entitiesSize[:, None] + self.entitiesSize[None, :]) * killZoneRatio
+        self.cacheKey = None
+        self.collision = None
+        self.dist = None
+
+    def __call__(self, nextState, wolvesID, sheepsID):
+        entitiesPos = getEntitiesPosFromState(nextState)
+        wolvesPos = entitiesPos[..., list(wolvesID), :]
+        sheepsPos = entitiesPos[..., list(sheepsID), :]
+        # integrate and reward look at the same positions within one tick, so the matrix is computed once
+        cacheKey = (tuple(wolvesID), tuple(sheepsID), wolvesPos.shape, wolvesPos.tobytes(), sheepsPos.tobytes())
+        if cacheKey != self.cacheKey:
+            posDiff = wolvesPos[..., :, None, :] - sheepsPos[..., None, :, :]
+            self.dist = np.sqrt(np.sum(np.square(posDiff), axis=-1))
+            minDist = self.killZoneDistance[np.ix_(list(wolvesID), list(sheepsID))]
+            self.collision = self.dist < minDist
+            self.cacheKey = cacheKey
+        return self.collision
+
+
+class EnvSpec:
+    def __init__(self, numWolves, numSheeps, numBlocks, wolfSize, sheepSize, blockSize, wolfMaxSpeed, sheepMaxSpeed,
+                 blockMaxSpeed=None, killZoneRatio=1.0, mass=1.0):
+        self.numWolves = numWolves
+        self.numSheeps = numSheeps
+        self.numBlocks = numBlocks
+        self.numAgents = numWolves + numSheeps
+        self.numEntities = self.numAgents + numBlocks
+        self.wolvesID = list(range(numWolves))
+        self.sheepsID = list(range(numWolves, self.numAgents))
+        self.blocksID = list(range(self.numAgents, self.numEntities))
+        self.killZoneRatio = killZoneRatio
+
+        # list forms for the per-entity classes, array forms for the vectorized ones
+        self.entitiesSizeList = [wolfSize] * numWolves + [sheepSize] * numSheeps + [blockSize] * numBlocks
+        self.entityMaxSpeedList = [wolfMaxSpeed] * numWolves + [sheepMaxSpeed] * numSheeps + [blockMaxSpeed] * numBlocks
+        self.entitiesMovableList = [True] * self.numAgents + [False] * numBlocks
+        self.massList = [mass] * self.numEntities
+
+        self.entitiesSize = np.array(self.entitiesSizeList, dtype=float)
+        self.entitiesMovable = np.array(self.entitiesMovableList, dtype=bool)
+        self.entitiesMass = np.array(self.massList, dtype=float)
+        self.entitiesMaxSpeed = np.array([np.inf if maxSpeed is None else maxSpeed for maxSpeed in self.entityMaxSpeedList], dtype=float)
+        self.pairMinDistance = self.entitiesSize[:, None] + self.entitiesSize[None, :]
+        self.killZoneDistance = self.pairMinDistance * killZoneRatio
+
+        self.collisionContext = WolfSheepCollisionContext(self.entitiesSizeList, killZoneRatio, self.killZoneDistance)
+        self.observe = ObserveAllAgentsWithCaughtHistory(self.wolvesID + self.sheepsID, self.wolvesID, self.sheepsID, self.blocksID)
+
+
+@ft.lru_cache(maxsize=None)
+def getEnvSpec(numWolves, numSheeps, numBlocks, wolfSize, sheepSize, blockSize, wolfMaxSpeed, sheepMaxSpeed,
+               blockMaxSpeed=None, killZoneRatio=1.0, mass=1.0):
+    return EnvSpec(numWolves, numSheeps, numBlocks, wolfSize, sheepSize, blockSize, wolfMaxSpeed, sheepMaxSpeed,
+                   blockMaxSpeed, killZoneRatio, mass)
+
+
 class RewardWolf:
-    def __init__(self, wolvesID, sheepsID, entitiesSizeList, isCollision, collisionReward, individual):
+    def __init__(self, wolvesID, sheepsID, entitiesSizeList, isCollision, collisionReward, individual, collisionContext=None):
         self.wolvesID = wolvesID
         self.sheepsID = sheepsID
         self.entitiesSizeList = entitiesSizeList
@@ -72,31 +170,24 @@ class RewardWolf:
         self.collisionReward = collisionReward
         self.individual = float(
             individual)  # self.individual = 0.8: 0.8* reward give myself, 0.2* reward split to other agents
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            CollisionByChecker(isCollision, entitiesSizeList)
 
     def __call__(self, state, action, nextState):
         numWolves = len(self.wolvesID)
-        reward = [0] * numWolves
 
         individualReward = self.individual * self.collisionReward
         sharedRewardForEachAgent = (1 - self.individual) * self.collisionReward / numWolves
 
-        for rewardID, wolfID in enumerate(self.wolvesID):
-            wolfSize = self.entitiesSizeList[wolfID]
-            wolfNextState = nextState[wolfID]
-
-            for sheepID in self.sheepsID:
-                sheepSize = self.entitiesSizeList[sheepID]
-                sheepNextState = nextState[sheepID]
-
-                if self.isCollision(wolfNextState, sheepNextState, wolfSize, sheepSize):
-                    reward = [oldReward + sharedRewardForEachAgent for oldReward in reward]
-                    reward[rewardID] += individualReward
+        collision = self.collisionContext(nextState, self.wolvesID, self.sheepsID)
+        wolvesNumCollisions = np.sum(collision, axis=1)
+        reward = list(sharedRewardForEachAgent * np.sum(wolvesNumCollisions) + individualReward * wolvesNumCollisions)
         return reward
 
 
 class RewardWolfWithBiteAndKill:
     def __init__(self, wolvesID, sheepsID, entitiesSizeList, isCollision, getCaughtHistoryFromAgentState, sheepLife,
-                 biteReward=0.1, killReward=1):
+                 biteReward=0.1, killReward=1, collisionContext=None):
         self.wolvesID = wolvesID
         self.sheepsID = sheepsID
         self.entitiesSizeList = entitiesSizeList
@@ -105,26 +196,20 @@ class RewardWolfWithBiteAndKill:
         self.sheepLife = sheepLife
         self.biteReward = biteReward
         self.killReward = killReward
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            CollisionByChecker(isCollision, entitiesSizeList)
 
     def __call__(self, state, action, nextState):
-        wolfReward = 0
-        for wolfID in self.wolvesID:
-            wolfSize = self.entitiesSizeList[wolfID]
-            wolfNextState = nextState[wolfID]
-            for sheepID in self.sheepsID:
-                sheepSize = self.entitiesSizeList[sheepID]
-                sheepNextState = nextState[sheepID]
-                if self.isCollision(wolfNextState, sheepNextState, wolfSize, sheepSize):
-                    wolfReward += self.biteReward
-                sheepCaughtHistory = self.getEntityCaughtHistory(state, sheepID)
-                if sheepCaughtHistory == self.sheepLife:
-                    wolfReward += self.killReward
+        collision = self.collisionContext(nextState, self.wolvesID, self.sheepsID)
+        sheepsCaughtHistory = np.array([self.getEntityCaughtHistory(state, sheepID) for sheepID in self.sheepsID])
+        numKilledSheeps = np.sum(sheepsCaughtHistory == self.sheepLife)
+        wolfReward = self.biteReward * np.sum(collision) + self.killReward * numKilledSheeps * len(self.wolvesID)
         reward = [wolfReward] * len(self.wolvesID)
         return reward
 
 
 class ContinuousHuntingRewardWolf:
-    def __init__(self, wolvesID, sheepsID, entitiesSizeList, isCollision, sheepLife=3, collisionReward=1):
+    def __init__(self, wolvesID, sheepsID, entitiesSizeList, isCollision, sheepLife=3, collisionReward=1, collisionContext=None):
         self.wolvesID = wolvesID
         self.sheepsID = sheepsID
         self.entitiesSizeList = entitiesSizeList
@@ -133,20 +218,15 @@ class ContinuousHuntingRewardWolf:
         self.sheepLife = sheepLife
         # self.sheepsLife = {sheepId:sheepLife for sheepId in sheepsID}
         self.getCaughtHistory = {sheepId:0 for sheepId in sheepsID}
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            CollisionByChecker(isCollision, entitiesSizeList)
     def __call__(self, state, action, nextState):
         wolfReward = 0
-        for sheepID in self.sheepsID:
-            sheepSize = self.entitiesSizeList[sheepID]
-            sheepNextState = nextState[sheepID]
-            getCaught = 0
-            for wolfID in self.wolvesID:
-                wolfSize = self.entitiesSizeList[wolfID]
-                wolfNextState = nextState[wolfID]
-                if self.isCollision(wolfNextState, sheepNextState, wolfSize, sheepSize):
-                    self.getCaughtHistory[sheepID] += 1
-                    getCaught = 1
-                    break
-            if not getCaught:
+        sheepsCaught = np.any(self.collisionContext(nextState, self.wolvesID, self.sheepsID), axis=0)
+        for sheepID, getCaught in zip(self.sheepsID, sheepsCaught):
+            if getCaught:
+                self.getCaughtHistory[sheepID] += 1
+            else:
                 self.getCaughtHistory[sheepID] = 0
         for sheepID in self.sheepsID:
             if self.getCaughtHistory[sheepID] == self.sheepLife:
@@ -177,7 +257,7 @@ class PunishForOutOfBound:
 
 class RewardSheep:
     def __init__(self, wolvesID, sheepsID, entitiesSizeList, getPosFromState, isCollision, punishForOutOfBound,
-                 collisionPunishment):
+                 collisionPunishment, collisionContext=None):
         self.wolvesID = wolvesID
         self.getPosFromState = getPosFromState
         self.entitiesSizeList = entitiesSizeList
@@ -185,48 +265,37 @@ class RewardSheep:
         self.isCollision = isCollision
         self.collisionPunishment = collisionPunishment
         self.punishForOutOfBound = punishForOutOfBound
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            CollisionByChecker(isCollision, entitiesSizeList)
 
     def __call__(self, state, action, nextState):  # state, action not used
+        sheepsNumCollisions = np.sum(self.collisionContext(nextState, self.wolvesID, self.sheepsID), axis=0)
         reward = []
-        for sheepID in self.sheepsID:
-            sheepReward = 0
-            sheepNextState = nextState[sheepID]
-            sheepNextPos = self.getPosFromState(sheepNextState)
-            sheepSize = self.entitiesSizeList[sheepID]
-
-            sheepReward -= self.punishForOutOfBound(sheepNextPos)
-            for wolfID in self.wolvesID:
-                wolfSize = self.entitiesSizeList[wolfID]
-                wolfNextState = nextState[wolfID]
-                if self.isCollision(wolfNextState, sheepNextState, wolfSize, sheepSize):
-                    sheepReward -= self.collisionPunishment
+        for sheepID, sheepNumCollisions in zip(self.sheepsID, sheepsNumCollisions):
+            sheepNextPos = self.getPosFromState(nextState[sheepID])
+            sheepReward = 0 - self.punishForOutOfBound(sheepNextPos) - self.collisionPunishment * sheepNumCollisions
             reward.append(sheepReward)
         return reward
 
 
 class CalSheepCaughtHistory:
-    def __init__(self, wolvesID, numBlock, entitiesSizeList, isCollision, sheepLife):
+    def __init__(self, wolvesID, numBlock, entitiesSizeList, isCollision, sheepLife, collisionContext=None):
         self.wolvesID = wolvesID
         self.numBlock = numBlock
         self.entitiesSizeList = entitiesSizeList
         self.isCollision = isCollision
         self.sheepLife = sheepLife
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            CollisionByChecker(isCollision, entitiesSizeList)
     def __call__(self, state, nextState):
         self.sheepsID = range(len(self.wolvesID), len(state)-self.numBlock)
-        self.getCaughtHistory = {sheepId: getCaughtHistoryFromAgentState(state[sheepId]) for sheepId in self.sheepsID}
+        self.getCaughtHistory = {sheepId: float(getCaughtHistoryFromAgentState(state[sheepId])) for sheepId in self.sheepsID}
 
-        for sheepID in self.sheepsID:
-            sheepSize = self.entitiesSizeList[sheepID]
-            sheepNextState = nextState[sheepID]
-            getCaught = 0
-            for wolfID in self.wolvesID:
-                wolfSize = self.entitiesSizeList[wolfID]
-                wolfNextState = nextState[wolfID]
-                if self.isCollision(wolfNextState, sheepNextState, wolfSize, sheepSize):
-                    self.getCaughtHistory[sheepID] += 1
-                    getCaught = 1
-                    break
-            if not getCaught:
+        sheepsCaught = np.any(self.collisionContext(nextState, self.wolvesID, self.sheepsID), axis=0)
+        for sheepID, getCaught in zip(self.sheepsID, sheepsCaught):
+            if getCaught:
+                self.getCaughtHistory[sheepID] += 1
+            else:
                 self.getCaughtHistory[sheepID] = 0
             if self.getCaughtHistory[sheepID] == self.sheepLife+1:
                 self.getCaughtHistory[sheepID] = 0
@@ -280,10 +349,81 @@ class ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks:
         agentInitCaughtHistory = 0
         for agentState in state:
             agentState.append(agentInitCaughtHistory)
-        state = np.array(state)
+        state = toCanonicalState(state)
 
         return state
 
+class SampleMultiAgentNewtonChasingInitStatesWithDiffBlocks:
+    def __init__(self, numWolves, mapSize, minDistance, minDistanceInitBlocks):
+        self.positionDimension = 2
+        self.numWolves = numWolves
+        self.mapSize = mapSize
+        self.minDistance = minDistance
+        self.minDistanceInitBlocks = minDistanceInitBlocks
+
+    def samplePositions(self, randomState, shape):
+        return np.round(randomState.uniform(-self.mapSize, self.mapSize, shape + (self.positionDimension, )), 2)
+
+    def __call__(self, numStates, numSheeps, blockSize, randomState=np.random):
+        numBlocks = 0 if blockSize <= 0 else 2
+        wolvesPos = self.samplePositions(randomState, (numStates, self.numWolves))
+
+        # every sheep of every state is redrawn only where it is still within minDistance of a wolf of its state
+        sheepsPos = self.samplePositions(randomState, (numStates, numSheeps))
+        sheepsInvalid = np.ones((numStates, numSheeps), dtype=bool)
+        while np.any(sheepsInvalid):
+            sheepsPos[sheepsInvalid] = self.samplePositions(randomState, (np.sum(sheepsInvalid), ))
+            sheepWolfDist = np.linalg.norm(sheepsPos[:, :, None, :] - wolvesPos[:, None, :, :], axis=-1)
+            sheepsInvalid = np.any(sheepWolfDist <= self.minDistance, axis=-1)
+
+        # blocks are placed one at a time, each against the blocks already placed and the map edge
+        blocksPos = np.zeros((numStates, numBlocks, self.positionDimension))
+        for blockID in range(numBlocks):
+            blockInvalid = np.ones(numStates, dtype=bool)
+            while np.any(blockInvalid):
+                blocksPos[blockInvalid, blockID] = self.samplePositions(randomState, (np.sum(blockInvalid), ))
+                blockPos = blocksPos[:, blockID]
+                blockBlockDist = np.linalg.norm(blocksPos[:, :blockID] - blockPos[:, None, :], axis=-1)
+                tooCloseToBlocks = np.any(blockBlockDist <= self.minDistanceInitBlocks, axis=-1)
+                tooCloseToEdge = np.any(np.abs(self.mapSize - np.abs(blockPos)) < blockSize, axis=-1)
+                blockInvalid = tooCloseToBlocks | tooCloseToEdge
+
+        sheepsVel = randomState.uniform(0, 1, (numStates, numSheeps, self.positionDimension))
+        entitiesPos = np.concatenate([wolvesPos, sheepsPos, blocksPos], axis=1)
+        entitiesVel = np.concatenate([np.zeros_like(wolvesPos), sheepsVel, np.zeros_like(blocksPos)], axis=1)
+        initCaughtHistory = np.zeros(entitiesPos.shape[:2] + (1, ))
+        initStates = np.concatenate([entitiesPos, entitiesVel, initCaughtHistory], axis=-1)
+        return toCanonicalState(initStates)
+
+
+class ResetMultiAgentNewtonChasingFromInitStatePool:
+    def __init__(self, sampleInitStates, poolSize, seed):
+        self.sampleInitStates = sampleInitStates
+        self.poolSize = poolSize
+        self.seed = seed
+        self.initStatePools = {}
+        self.poolIndexes = {}
+
+    def generatePool(self, numSheeps, blockSize):
+        # one stream per condition, so trial i of two conditions does not share its wolf positions
+        conditionSeedSequence = np.random.SeedSequence([self.seed, numSheeps, zlib.crc32(repr(float(blockSize)).encode())])
+        randomState = np.random.default_rng(conditionSeedSequence)
+        self.initStatePools[(numSheeps, blockSize)] = self.sampleInitStates(self.poolSize, numSheeps, blockSize, randomState)
+        self.poolIndexes[(numSheeps, blockSize)] = 0
+
+    def getInitState(self, numSheeps, blockSize, poolIndex):
+        if (numSheeps, blockSize) not in self.initStatePools:
+            self.generatePool(numSheeps, blockSize)
+        return self.initStatePools[(numSheeps, blockSize)][poolIndex % self.poolSize].copy()
+
+    def __call__(self, numSheeps, blockSize):
+        if (numSheeps, blockSize) not in self.initStatePools:
+            self.generatePool(numSheeps, blockSize)
+        poolIndex = self.poolIndexes[(numSheeps, blockSize)]
+        self.poolIndexes[(numSheeps, blockSize)] += 1
+        return self.getInitState(numSheeps, blockSize, poolIndex)
+
+
 class ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistory:
     def __init__(self, numWolves, numBlocks, mapSize, minDistance):
         self.positionDimension = 2
@@ -317,7 +457,7 @@ class ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistory:
         agentInitCaughtHistory = 0
         for agentState in state:
             agentState.append(agentInitCaughtHistory)
-        state = np.array(state)
+        state = toCanonicalState(state)
         return state
 
 
@@ -350,7 +490,7 @@ class ResetMultiAgentNewtonChasingVariousSheep:
                        zip(initBlockRandomPos, [list(initBlockZeroVel()) for blockID in range(self.numBlocks)])]
         sheepState = [state + vel for state, vel in
                       zip(initSheepRandomPos, [list(initSheepRandomVel()) for sheepID in range(numSheeps)])]
-        state = np.array(agentsState + sheepState + blockState)
+        state = toCanonicalState(np.array(agentsState + sheepState + blockState))
         return state
 
 
@@ -370,7 +510,7 @@ class ResetMultiAgentChasingWithVariousSheep:
         getBlockSpeed = lambda: np.zeros(self.positionDimension)
 
         blocksState = [list(getBlockRandomPos()) + list(getBlockSpeed()) for blockID in range(self.numBlocks)]
-        state = np.array(agentsStates + blocksState)
+        state = toCanonicalState(np.array(agentsStates + blocksState))
         return state
 
 
@@ -405,7 +545,7 @@ class ResetMultiAgentNewtonChasing:
         sheepState = [state + vel for state, vel in
                       zip(initSheepRandomPos, [list(initSheepRandomVel()) for ID in range(numSheeps)])]
 
-        state = np.array(agentsState + sheepState)
+        state = toCanonicalState(np.array(agentsState + sheepState))
         return state
 
 
@@ -509,6 +649,46 @@ class ObserveWithCaughtHistory:
         return np.concatenate([agentVel] + [agentPos] + blocksInfo + posInfo + velInfo + caughtInfo)
 
 
+class ObserveAllAgentsWithCaughtHistory:
+    def __init__(self, agentsID, wolvesID, sheepsID, blocksID, stateDim=5):
+        self.agentsID = agentsID
+        self.stateDim = stateDim
+        zeroIndex = -1
+        getIndex = lambda entityID, column: entityID * stateDim + column
+        gatherIndexes, subtractIndexes = [], []
+        for agentID in agentsID:
+            othersID = [wolfID for wolfID in wolvesID if wolfID != agentID] + [sheepID for sheepID in sheepsID if sheepID != agentID]
+            otherSheepsID = [sheepID for sheepID in sheepsID if sheepID != agentID]
+            agentGather = [getIndex(agentID, 2), getIndex(agentID, 3), getIndex(agentID, 0), getIndex(agentID, 1)]
+            agentSubtract = [zeroIndex] * 4
+            for entityID in list(blocksID) + othersID:
+                agentGather += [getIndex(entityID, 0), getIndex(entityID, 1)]
+                agentSubtract += [getIndex(agentID, 0), getIndex(agentID, 1)]
+            for sheepID in otherSheepsID:
+                agentGather += [getIndex(sheepID, 2), getIndex(sheepID, 3)]
+                agentSubtract += [zeroIndex] * 2
+            agentGather += [getIndex(sheepID, 4) for sheepID in otherSheepsID]
+            agentSubtract += [zeroIndex] * len(otherSheepsID)
+            gatherIndexes.append(agentGather)
+            subtractIndexes.append(agentSubtract)
+
+        self.obsDims = [len(agentGather) for agentGather in gatherIndexes]
+        self.isSameObsDim = len(set(self.obsDims)) == 1
+        self.gatherIndex = np.array(sum(gatherIndexes, []), dtype=int)
+        self.subtractIndex = np.array(sum(subtractIndexes, []), dtype=int)
+        self.splitIndexes = np.cumsum(self.obsDims)[:-1]
+
+    def __call__(self, state):
+        # state: (N, 5) or (B, N, 5); returns (numAgents, obsDim) / (B, numAgents, obsDim), or per-agent arrays when obs dims differ
+        entitiesState = stackEntitiesState(state, self.stateDim)
+        flatState = entitiesState.reshape(entitiesState.shape[:-2] + (-1, ))
+        flatState = np.concatenate([flatState, np.zeros(flatState.shape[:-1] + (1, ), dtype=flatState.dtype)], axis=-1)
+        observations = flatState[..., self.gatherIndex] - flatState[..., self.subtractIndex]
+        if self.isSameObsDim:
+            return observations.reshape(observations.shape[:-1] + (len(self.agentsID), self.obsDims[0]))
+        return np.split(observations, self.splitIndexes, axis=-1)
+
+
 class GetCollisionForce:
     def __init__(self, contactMargin=0.001, contactForce=100):
         self.contactMargin = contactMargin
@@ -581,6 +761,78 @@ class ApplyEnvironForce:
         return pForce
 
 
+class FindCandidateCollisionPairs:
+    def __init__(self, entitiesSizeList, contactRangeMargin=0.05):
+        self.entitiesSize = np.array(entitiesSizeList, dtype=float)
+        self.contactRangeMargin = contactRangeMargin
+        self.cellSize = 2 * np.max(self.entitiesSize) + contactRangeMargin
+        self.forwardNeighborCells = [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+    def __call__(self, entitiesPos):
+        entitiesPos = np.asarray(entitiesPos, dtype=float)
+        numEntities = len(entitiesPos)
+        cells = np.floor(entitiesPos / self.cellSize).astype(int)
+        cells = cells - np.min(cells, axis=0) + 1
+        columnWidth = np.max(cells[:, 1]) + 2
+        cellKeys = cells[:, 0] * columnWidth + cells[:, 1]
+
+        sortedEntitiesID = np.argsort(cellKeys, kind='stable')
+        occupiedKeys, cellStarts, cellCounts = np.unique(cellKeys[sortedEntitiesID], return_index=True, return_counts=True)
+
+        pairsID1, pairsID2 = [], []
+        for dx, dy in self.forwardNeighborCells:
+            neighborKeys = cellKeys + dx * columnWidth + dy
+            neighborCellIndex = np.minimum(np.searchsorted(occupiedKeys, neighborKeys), len(occupiedKeys) - 1)
+            hasNeighbor = occupiedKeys[neighborCellIndex] == neighborKeys
+            entitiesID = np.arange(numEntities)[hasNeighbor]
+            neighborCounts = cellCounts[neighborCellIndex[hasNeighbor]]
+            neighborStarts = cellStarts[neighborCellIndex[hasNeighbor]]
+            offsetsInCell = np.arange(np.sum(neighborCounts)) - np.repeat(np.cumsum(neighborCounts) - neighborCounts, neighborCounts)
+            pairsID1.append(np.repeat(entitiesID, neighborCounts))
+            pairsID2.append(sortedEntitiesID[np.repeat(neighborStarts, neighborCounts) + offsetsInCell])
+        pairsID1, pairsID2 = np.concatenate(pairsID1), np.concatenate(pairsID2)
+        pairsID1, pairsID2 = np.minimum(pairsID1, pairsID2), np.maximum(pairsID1, pairsID2)
+
+        dist = np.sqrt(np.sum(np.square(entitiesPos[pairsID1] - entitiesPos[pairsID2]), axis=-1))
+        minDist = self.entitiesSize[pairsID1] + self.entitiesSize[pairsID2]
+        inContactRange = (pairsID1 < pairsID2) & (dist < minDist + self.contactRangeMargin)
+        pairKeys = np.unique(pairsID1[inContactRange] * numEntities + pairsID2[inContactRange])
+        return list(zip(pairKeys // numEntities, pairKeys % numEntities))
+
+
+class ApplyEnvironForceWithBroadphase:
+    def __init__(self, numEntities, entitiesMovableList, entitiesSizeList, getCollisionForce, getPosFromState, findCandidateCollisionPairs):
+        self.numEntities = numEntities
+        self.entitiesMovableList = entitiesMovableList
+        self.entitiesSizeList = entitiesSizeList
+        self.getCollisionForce = getCollisionForce
+        self.getEntityPos = lambda state, entityID: getPosFromState(state[entityID])
+        self.findCandidateCollisionPairs = findCandidateCollisionPairs
+
+    def __call__(self, pForce, state):
+        self.numEntities = len(state)
+        entitiesPos = [self.getEntityPos(state, entityID) for entityID in range(self.numEntities)]
+        # pairs come back in the (entity1ID, entity2ID) order of ApplyEnvironForce, so contact sums are unchanged
+        for entity1ID, entity2ID in self.findCandidateCollisionPairs(entitiesPos):
+            obj1Movable = self.entitiesMovableList[entity1ID]
+            obj2Movable = self.entitiesMovableList[entity2ID]
+            obj1Size = self.entitiesSizeList[entity1ID]
+            obj2Size = self.entitiesSizeList[entity2ID]
+
+            force1, force2 = self.getCollisionForce(entitiesPos[entity1ID], entitiesPos[entity2ID], obj1Size, obj2Size,
+                                                    obj1Movable, obj2Movable)
+
+            if force1 is not None:
+                if pForce[entity1ID] is None: pForce[entity1ID] = 0.0
+                pForce[entity1ID] = force1 + pForce[entity1ID]
+
+            if force2 is not None:
+                if pForce[entity2ID] is None: pForce[entity2ID] = 0.0
+                pForce[entity2ID] = force2 + pForce[entity2ID]
+
+        return pForce
+
+
 class IntegrateState:
     def __init__(self, numEntities, entitiesMovableList, massList, entityMaxSpeedList, getVelFromAgentState,
                  getPosFromAgentState, damping=0.25, dt=0.1):
@@ -594,16 +846,15 @@ class IntegrateState:
         self.getEntityPos = lambda state, entityID: getPosFromAgentState(state[entityID])
 
     def __call__(self, pForce, state):
+        state = np.asarray(stackEntitiesState(state), dtype=float)
         self.numEntities = len(state)
-        getNextState = lambda entityPos, entityVel: list(entityPos) + list(entityVel)
-        nextState = []
+        nextState = state.copy()
         for entityID in range(self.numEntities):
             entityMovable = self.entitiesMovableList[entityID]
             entityVel = self.getEntityVel(state, entityID)
             entityPos = self.getEntityPos(state, entityID)
 
             if not entityMovable:
-                nextState.append(getNextState(entityPos, entityVel))
                 continue
 
             entityNextVel = entityVel * (1 - self.damping)
@@ -619,7 +870,8 @@ class IntegrateState:
                     entityNextVel = entityNextVel / speed * entityMaxSpeed
 
             entityNextPos = entityPos + entityNextVel * self.dt
-            nextState.append(getNextState(entityNextPos, entityNextVel))
+            nextState[entityID, 0:2] = entityNextPos
+            nextState[entityID, 2:4] = entityNextVel
 
         return nextState
 
@@ -638,8 +890,8 @@ class IntegrateStateWithCaughtHistory:
         self.calSheepCaughtHistory = calSheepCaughtHistory
 
     def __call__(self, pForce, state):
-        getNextState = lambda entityPos, entityVel: list(entityPos) + list(entityVel)
-        nextState = []
+        state = np.asarray(stackEntitiesState(state), dtype=float)
+        nextState = state.copy()
         sheepsID = range(len(self.calSheepCaughtHistory.wolvesID), len(state)-self.calSheepCaughtHistory.numBlock)
         for entityID in range(self.numEntities):
             entityMovable = self.entitiesMovableList[entityID]
@@ -647,7 +899,6 @@ class IntegrateStateWithCaughtHistory:
             entityPos = self.getEntityPos(state, entityID)
 
             if not entityMovable:
-                nextState.append(getNextState(entityPos, entityVel))
                 continue
 
             entityNextVel = entityVel * (1 - self.damping)
@@ -663,12 +914,12 @@ class IntegrateStateWithCaughtHistory:
                     entityNextVel = entityNextVel / speed * entityMaxSpeed
 
             entityNextPos = entityPos + entityNextVel * self.dt
-            nextState.append(getNextState(entityNextPos, entityNextVel))
+            nextState[entityID, 0:2] = entityNextPos
+            nextState[entityID, 2:4] = entityNextVel
         caughtHistory = self.calSheepCaughtHistory(state, nextState)
         for sheepID in sheepsID:
-            nextState[sheepID].append(caughtHistory[sheepID])
-        nextStateWithCaughtHistory = nextState.copy()
-        return nextStateWithCaughtHistory
+            nextState[sheepID, 4] = caughtHistory[sheepID]
+        return nextState
 
 
 class TransitMultiAgentChasingForExpWithNoise:
@@ -688,13 +939,167 @@ class TransitMultiAgentChasingForExpWithNoise:
         SheepAction = [self.noiseAction(action) for action in SheepAction]
         actions = wolfAction + SheepAction
         
+        state = np.asarray(stackEntitiesState(state), dtype=float)
         self.numEntities = len(state)
         p_force = [None] * self.numEntities
         p_force = self.applyActionForce(p_force, actions)
         p_force = self.applyEnvironForce(p_force, state)
         nextState = self.integrateState(p_force, state)
         nextState = self.checkAllAgents(nextState)
-        return nextState
+        return toCanonicalState(nextState)
+
+
+class StayInBoundaryByReflectVelocityVectorized():
+    def __init__(self, xBoundary, yBoundary):
+        self.xMin, self.xMax = xBoundary
+        self.yMin, self.yMax = yBoundary
+
+    def __call__(self, entitiesState):
+        entitiesState = np.asarray(entitiesState)
+        positionX, positionY = entitiesState[..., 0], entitiesState[..., 1]
+        velocityX, velocityY = entitiesState[..., 2], entitiesState[..., 3]
+        checkedState = entitiesState.copy()
+        # same branch order as StayInBoundaryByReflectVelocity: the min checks win when both fire
+        checkedState[..., 0] = np.where(positionX >= self.xMax, 2 * self.xMax - positionX, checkedState[..., 0])
+        checkedState[..., 2] = np.where(positionX >= self.xMax, -np.abs(velocityX), checkedState[..., 2])
+        checkedState[..., 0] = np.where(positionX <= self.xMin, 2 * self.xMin - positionX, checkedState[..., 0])
+        checkedState[..., 2] = np.where(positionX <= self.xMin, np.abs(velocityX), checkedState[..., 2])
+        checkedState[..., 1] = np.where(positionY >= self.yMax, 2 * self.yMax - positionY, checkedState[..., 1])
+        checkedState[..., 3] = np.where(positionY >= self.yMax, -np.abs(velocityY), checkedState[..., 3])
+        checkedState[..., 1] = np.where(positionY <= self.yMin, 2 * self.yMin - positionY, checkedState[..., 1])
+        checkedState[..., 3] = np.where(positionY <= self.yMin, np.abs(velocityY), checkedState[..., 3])
+        return checkedState
+
+
+class GetCollisionForceVectorized:
+    def __init__(self, contactMargin=0.001, contactForce=100):
+        self.contactMargin = contactMargin
+        self.contactForce = contactForce
+
+    def __call__(self, entitiesPos, entitiesSize, pairMinDistance=None):
+        # pairForce[..., i, j, :] is the force on entity i from entity j, same arithmetic order as GetCollisionForce
+        numEntities = entitiesPos.shape[-2]
+        posDiff = entitiesPos[..., :, None, :] - entitiesPos[..., None, :, :]
+        dist = np.sqrt(np.sum(np.square(posDiff), axis=-1))
+        dist[..., range(numEntities), range(numEntities)] = np.inf
+
+        minDist = pairMinDistance if pairMinDistance is not None else entitiesSize[:, None] + entitiesSize[None, :]
+        penetration = np.logaddexp(0, -(dist - minDist) / self.contactMargin) * self.contactMargin
+
+        pairForce = self.contactForce * posDiff / dist[..., None] * penetration[..., None]
+        return pairForce
+
+
+class ApplyActionForceVectorized:
+    def __init__(self, entitiesMovableList):
+        # lists or the arrays of an EnvSpec, which are shared rather than copied
+        self.entitiesMovable = np.asarray(entitiesMovableList, dtype=bool)
+
+    def __call__(self, entitiesForce, actions):
+        actions = np.array(actions, dtype=float)
+        numAgents = actions.shape[-2]
+        agentsMovable = self.entitiesMovable[:numAgents]
+        entitiesForce[..., :numAgents, :][..., agentsMovable, :] = actions[..., agentsMovable, :]
+        return entitiesForce
+
+
+class ApplyEnvironForceVectorized:
+    def __init__(self, entitiesMovableList, entitiesSizeList, getCollisionForce, pairMinDistance=None):
+        self.entitiesMovable = np.asarray(entitiesMovableList, dtype=bool)
+        self.entitiesSize = np.asarray(entitiesSizeList, dtype=float)
+        self.pairMinDistance = pairMinDistance if pairMinDistance is not None else \
+            self.entitiesSize[:, None] + self.entitiesSize[None, :]
+        self.getCollisionForce = getCollisionForce
+
+    def __call__(self, entitiesForce, entitiesState):
+        entitiesState = np.asarray(entitiesState)
+        numEntities = entitiesState.shape[-2]
+        pairForce = self.getCollisionForce(entitiesState[..., :2], self.entitiesSize[:numEntities],
+                                           self.pairMinDistance[:numEntities, :numEntities])
+        pairForce[..., ~self.entitiesMovable[:numEntities], :, :] = 0.0
+        # accumulate partner by partner so the float sums match the pairwise loop of ApplyEnvironForce
+        for entityID in range(numEntities):
+            entitiesForce = entitiesForce + pairForce[..., :, entityID, :]
+        return entitiesForce
+
+
+class CalSheepCaughtHistoryVectorized:
+    def __init__(self, wolvesID, numBlock, entitiesSizeList, killZoneRatio, sheepLife, collisionContext=None):
+        self.wolvesID = wolvesID
+        self.numBlock = numBlock
+        self.sheepLife = sheepLife
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            WolfSheepCollisionContext(entitiesSizeList, killZoneRatio)
+
+    def __call__(self, entitiesState, entitiesNextState):
+        numWolves = len(self.wolvesID)
+        sheepsID = list(range(numWolves, entitiesState.shape[-2] - self.numBlock))
+        sheepsCaught = np.any(self.collisionContext(entitiesNextState, self.wolvesID, sheepsID), axis=-2)
+
+        caughtHistory = np.array(entitiesState[..., 4], dtype=float)
+        sheepsCaughtHistory = np.where(sheepsCaught, caughtHistory[..., sheepsID] + 1, 0)
+        sheepsCaughtHistory[sheepsCaughtHistory == self.sheepLife + 1] = 0
+        caughtHistory[..., sheepsID] = sheepsCaughtHistory
+        return caughtHistory
+
+
+class IntegrateStateWithCaughtHistoryVectorized:
+    def __init__(self, entitiesMovableList, massList, entityMaxSpeedList, calSheepCaughtHistory, damping=0.25, dt=0.05):
+        self.entitiesMovable = np.asarray(entitiesMovableList, dtype=bool)
+        self.entitiesMass = np.asarray(massList, dtype=float)
+        self.entitiesMaxSpeed = entityMaxSpeedList if isinstance(entityMaxSpeedList, np.ndarray) else \
+            np.array([np.inf if maxSpeed is None else maxSpeed for maxSpeed in entityMaxSpeedList], dtype=float)
+        self.calSheepCaughtHistory = calSheepCaughtHistory
+        self.damping = damping
+        self.dt = dt
+
+    def __call__(self, entitiesForce, entitiesState):
+        entitiesState = np.asarray(entitiesState, dtype=float)
+        numEntities = entitiesState.shape[-2]
+        movable = self.entitiesMovable[:numEntities]
+        entitiesPos = entitiesState[..., :2]
+        entitiesVel = entitiesState[..., 2:4]
+
+        entitiesNextVel = entitiesVel * (1 - self.damping)
+        entitiesNextVel = entitiesNextVel + (entitiesForce / self.entitiesMass[:numEntities, None]) * self.dt
+
+        # the speed limit is checked on the current velocity, as in IntegrateStateWithCaughtHistory
+        speed = np.sqrt(np.square(entitiesVel[..., 0]) + np.square(entitiesVel[..., 1]))
+        maxSpeed = np.broadcast_to(self.entitiesMaxSpeed[:numEntities], speed.shape)
+        overSpeed = movable & (speed > maxSpeed)
+        entitiesNextVel[overSpeed] = entitiesNextVel[overSpeed] / speed[overSpeed][:, None] * maxSpeed[overSpeed][:, None]
+
+        entitiesNextState = entitiesState.copy()
+        entitiesNextState[..., movable, 2:4] = entitiesNextVel[..., movable, :]
+        entitiesNextState[..., movable, :2] = entitiesPos[..., movable, :] + entitiesNextVel[..., movable, :] * self.dt
+        entitiesNextState[..., 4] = self.calSheepCaughtHistory(entitiesState, entitiesNextState)
+        return entitiesNextState
+
+
+class TransitMultiAgentChasingForExpWithNoiseVectorized:
+    def __init__(self, reshapeWolfAction, reshapeSheepAction, applyActionForce, applyEnvironForce, integrateState, checkAllAgents, noiseAction, actionDim=2):
+        self.reshapeWolfAction = reshapeWolfAction
+        self.reshapeSheepAction = reshapeSheepAction
+        self.applyActionForce = applyActionForce
+        self.applyEnvironForce = applyEnvironForce
+        self.integrateState = integrateState
+        self.checkAllAgents = checkAllAgents
+        self.noiseAction = noiseAction
+        self.actionDim = actionDim
+
+    def __call__(self, state, wolfAction, SheepAction, wolfForce, sheepForce):
+        wolfAction = [self.reshapeWolfAction(action, wolfForce) for action in wolfAction]
+        SheepAction = [self.reshapeSheepAction(action, sheepForce) for action in SheepAction]
+        SheepAction = [self.noiseAction(action) for action in SheepAction]
+        actions = wolfAction + SheepAction
+
+        entitiesState = np.asarray(stackEntitiesState(state), dtype=float)
+        entitiesForce = np.zeros((len(entitiesState), self.actionDim))
+        entitiesForce = self.applyActionForce(entitiesForce, actions)
+        entitiesForce = self.applyEnvironForce(entitiesForce, entitiesState)
+        nextState = self.integrateState(entitiesForce, entitiesState)
+        nextState = self.checkAllAgents(nextState)
+        return toCanonicalState(nextState)
 
 
 class TransitMultiAgentChasingForExpVariousForce:
@@ -711,13 +1116,14 @@ class TransitMultiAgentChasingForExpVariousForce:
         SheepAction = [self.reshapeSheepAction(action,sheepForce) for action in SheepAction]
 
         actions = humanAction + SheepAction
+        state = np.asarray(stackEntitiesState(state), dtype=float)
         self.numEntities = len(state)
         p_force = [None] * self.numEntities
         p_force = self.applyActionForce(p_force, actions)
         p_force = self.applyEnvironForce(p_force, state)
         nextState = self.integrateState(p_force, state)
         nextState = self.checkAllAgents(nextState)
-        return nextState
+        return toCanonicalState(nextState)
 
 
 class TransitMultiAgentChasingForExp:
@@ -735,13 +1141,14 @@ class TransitMultiAgentChasingForExp:
         SheepAction = [self.reshapeSheepAction(action) for action in SheepAction]
         # actions = [self.reshapeAction(action) for action in actions]
         actions = humanAction + SheepAction
+        state = np.asarray(stackEntitiesState(state), dtype=float)
         self.numEntities = len(state)
         p_force = [None] * self.numEntities
         p_force = self.applyActionForce(p_force, actions)
         p_force = self.applyEnvironForce(p_force, state)
         nextState = self.integrateState(p_force, state)
         nextState = self.checkAllAgents(nextState)
-        return nextState
+        return toCanonicalState(nextState)
 
 
 class TransitMultiAgentChasing:
@@ -753,6 +1160,7 @@ class TransitMultiAgentChasing:
         self.integrateState = integrateState
 
     def __call__(self, state, actions):
+        state = np.asarray(stackEntitiesState(state), dtype=float)
         self.numEntities = len(state)
         actions = [self.reshapeAction(action) for action in actions]
         p_force = [None] * self.numEntities
@@ -760,7 +1168,7 @@ class TransitMultiAgentChasing:
         p_force = self.applyEnvironForce(p_force, state)
         nextState = self.integrateState(p_force, state)
 
-        return nextState
+        return toCanonicalState(nextState)
 
 class ReshapeActionVariousForce:
     def __init__(self):
@@ -808,18 +1216,6 @@ class ReshapeSheepAction:
         return actionReshaped
 
 
-class BuildGaussianFixCov:
-        def __init__(self, cov):
-            self.cov = cov
-
-        def __call__(self, mean):
-            return ss.multivariate_normal(mean, self.cov)
-
-
-def sampleFromContinuousSpace(distribution):
-        return distribution.rvs()
-
-
 class ComposeCentralControlPolicyByGaussianOnDeterministicAction:
     def __init__(self, reshapeAction, observe, actOneStepOneModel, buildGaussian):
         self.reshapeAction = reshapeAction
@@ -831,3 +1227,26 @@ class ComposeCentralControlPolicyByGaussianOnDeterministicAction:
         centralControlPolicy = lambda state: [self.buildGaussian(tuple(self.reshapeAction(
             self.actOneStepOneModel(individualModels[agentId], self.observe(state))))) for agentId in range(numAgentsInWe)]
         return centralControlPolicy
+
+
+class ComposeCentralControlMeansBatch:
+    def __init__(self, reshapeAction, observe, actByPolicyBatch):
+        self.reshapeAction = reshapeAction
+        self.observe = observe
+        self.actByPolicyBatch = actByPolicyBatch
+
+    def reshapeActionBatch(self, actions):
+        # the Reshape*Action classes index the action components on the first axis, so feed them component-major
+        return np.moveaxis(self.reshapeAction(np.moveaxis(np.asarray(actions), -1, 0)), 0, -1)
+
+    def __call__(self, individualModels, numAgentsInWe):
+        def centralControlMeans(batchState):
+            # batchState: (B, N, 5) -> deterministic action means (B, numAgentsInWe, 2), one actor run per wolf model
+            observations = self.observe(batchState)
+            if isinstance(observations, list):
+                observations = [[agentObservations[batchIndex] for agentObservations in observations] for batchIndex in range(len(batchState))]
+            agentsMeans = [self.reshapeActionBatch(self.actByPolicyBatch(individualModels[agentId], observations))
+                           for agentId in range(numAgentsInWe)]
+            return np.stack(agentsMeans, axis=1)
+        return centralControlMeans
+
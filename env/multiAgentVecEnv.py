@@ -0,0 +1,65 @@
+import numpy as np
+from env.multiAgentEnv import toCanonicalState
+
+
+class TransitMultiAgentChasingBatch:
+    def __init__(self, applyActionForce, applyEnvironForce, integrateState, checkAllAgents, actionDim=2):
+        self.applyActionForce = applyActionForce
+        self.applyEnvironForce = applyEnvironForce
+        self.integrateState = integrateState
+        self.checkAllAgents = checkAllAgents
+        self.actionDim = actionDim
+
+    def __call__(self, batchState, batchActions):
+        # batchState: (B, N, 5), batchActions: (B, numAgents, 2), already reshaped to forces
+        batchState = np.asarray(batchState, dtype=float)
+        batchForce = np.zeros(batchState.shape[:-1] + (self.actionDim, ))
+        batchForce = self.applyActionForce(batchForce, batchActions)
+        batchForce = self.applyEnvironForce(batchForce, batchState)
+        batchNextState = self.integrateState(batchForce, batchState)
+        batchNextState = self.checkAllAgents(batchNextState)
+        return toCanonicalState(batchNextState)
+
+
+class ResetMultiAgentChasingBatch:
+    def __init__(self, resetOneEnv, numSheeps, blockSize):
+        self.resetOneEnv = resetOneEnv
+        self.numSheeps = numSheeps
+        self.blockSize = blockSize
+
+    def __call__(self, numEnvs):
+        batchState = toCanonicalState(np.array([self.resetOneEnv(self.numSheeps, self.blockSize) for envIndex in range(numEnvs)]))
+        return batchState
+
+
+class MultiAgentChasingVecEnv:
+    def __init__(self, numEnvs, resetBatch, transitBatch, getReward, maxTimeStep, isTerminal=None):
+        self.numEnvs = numEnvs
+        self.resetBatch = resetBatch
+        self.transitBatch = transitBatch
+        self.getReward = getReward
+        self.maxTimeStep = maxTimeStep
+        self.isTerminal = isTerminal
+        self.timeSteps = np.zeros(numEnvs, dtype=int)
+
+    def reset(self):
+        self.timeSteps = np.zeros(self.numEnvs, dtype=int)
+        return self.resetBatch(self.numEnvs)
+
+    def __call__(self, batchState, batchActions):
+        batchNextState = self.transitBatch(batchState, batchActions)
+        batchReward = np.array([self.getReward(state, actions, nextState)
+                                for state, actions, nextState in zip(batchState, batchActions, batchNextState)])
+
+        self.timeSteps += 1
+        batchDone = self.timeSteps >= self.maxTimeStep
+        if self.isTerminal is not None:
+            batchDone = batchDone | np.array([np.any(self.isTerminal(nextState)) for nextState in batchNextState])
+
+        # finished episodes continue from a fresh reset, the true next state is still returned for the buffer
+        batchContinueState = batchNextState.copy()
+        doneEnvIndex = np.flatnonzero(batchDone)
+        if len(doneEnvIndex) > 0:
+            batchContinueState[doneEnvIndex] = self.resetBatch(len(doneEnvIndex))
+            self.timeSteps[doneEnvIndex] = 0
+        return batchReward, batchNextState, batchDone, batchContinueState
@@ -0,0 +1,266 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..'))
+
+import numpy as np
+import unittest
+from ddt import ddt, data, unpack
+
+from env.multiAgentEnv import getEnvSpec, IsCollision, getPosFromAgentState, StayInBoundaryByReflectVelocityVectorized, \
+    ReshapeActionVariousForce, GetCollisionForce, ApplyActionForce, ApplyEnvironForce, CalSheepCaughtHistory, \
+    IntegrateStateWithCaughtHistory, TransitMultiAgentChasingForExpWithNoise, GetCollisionForceVectorized, \
+    ApplyActionForceVectorized, ApplyEnvironForceVectorized, CalSheepCaughtHistoryVectorized, \
+    IntegrateStateWithCaughtHistoryVectorized, TransitMultiAgentChasingForExpWithNoiseVectorized, \
+    FindCandidateCollisionPairs, ApplyEnvironForceWithBroadphase, SampleMultiAgentNewtonChasingInitStatesWithDiffBlocks, \
+    ResetMultiAgentNewtonChasingFromInitStatePool, ObserveWithCaughtHistory, ObserveAllAgentsWithCaughtHistory, \
+    getVelFromAgentState, getCaughtHistoryFromAgentState
+
+
+@ddt
+class TestTransitVectorizedParity(unittest.TestCase):
+    def setUp(self):
+        self.numWolves = 3
+        self.wolfSize = 0.075
+        self.sheepSize = 0.05
+        self.killZoneRatio = 1.2
+        self.sheepLife = 6
+        self.displaySize = 1.0
+        self.wolfForce = 5
+        self.sheepForce = 5
+
+    def buildTransits(self, numSheeps, numBlocks, blockSize, sheepMaxSpeed):
+        envSpec = getEnvSpec(self.numWolves, numSheeps, numBlocks, self.wolfSize, self.sheepSize, blockSize, 1.0,
+                             sheepMaxSpeed, None, self.killZoneRatio)
+        isCollision = IsCollision(getPosFromAgentState, self.killZoneRatio)
+        checkAllAgents = StayInBoundaryByReflectVelocityVectorized([-self.displaySize, self.displaySize], [-self.displaySize, self.displaySize])
+        reshapeAction = ReshapeActionVariousForce()
+        noiseAction = lambda action: action
+
+        applyActionForce = ApplyActionForce(envSpec.wolvesID, envSpec.sheepsID, envSpec.entitiesMovableList)
+        applyEnvironForce = ApplyEnvironForce(envSpec.numEntities, envSpec.entitiesMovableList, envSpec.entitiesSizeList,
+                                              GetCollisionForce(), getPosFromAgentState)
+        calSheepCaughtHistory = CalSheepCaughtHistory(envSpec.wolvesID, numBlocks, envSpec.entitiesSizeList, isCollision, self.sheepLife)
+        integrateState = IntegrateStateWithCaughtHistory(envSpec.numEntities, envSpec.entitiesMovableList, envSpec.massList,
+                                                         envSpec.entityMaxSpeedList, lambda state: state[2:4],
+                                                         getPosFromAgentState, calSheepCaughtHistory)
+        transit = TransitMultiAgentChasingForExpWithNoise(reshapeAction, reshapeAction, applyActionForce, applyEnvironForce,
+                                                          integrateState, checkAllAgents, noiseAction)
+
+        # the vectorized classes take the spec's arrays; testMultiAgentVecEnv builds them from the list forms
+        applyActionForceVectorized = ApplyActionForceVectorized(envSpec.entitiesMovable)
+        applyEnvironForceVectorized = ApplyEnvironForceVectorized(envSpec.entitiesMovable, envSpec.entitiesSize,
+                                                                  GetCollisionForceVectorized(), envSpec.pairMinDistance)
+        calSheepCaughtHistoryVectorized = CalSheepCaughtHistoryVectorized(envSpec.wolvesID, numBlocks, envSpec.entitiesSizeList,
+                                                                          self.killZoneRatio, self.sheepLife, envSpec.collisionContext)
+        integrateStateVectorized = IntegrateStateWithCaughtHistoryVectorized(envSpec.entitiesMovable, envSpec.entitiesMass,
+                                                                             envSpec.entitiesMaxSpeed, calSheepCaughtHistoryVectorized)
+        transitVectorized = TransitMultiAgentChasingForExpWithNoiseVectorized(reshapeAction, reshapeAction, applyActionForceVectorized,
+                                                                              applyEnvironForceVectorized, integrateStateVectorized,
+                                                                              checkAllAgents, noiseAction)
+        return envSpec, transit, transitVectorized
+
+    @data((1, 0, 0.0, 1.1), (2, 2, 0.2, 1.1), (4, 2, 0.1, 0.7))
+    @unpack
+    def testTransitMatchesLoopTransit(self, numSheeps, numBlocks, blockSize, sheepMaxSpeed):
+        envSpec, transit, transitVectorized = self.buildTransits(numSheeps, numBlocks, blockSize, sheepMaxSpeed)
+        randomState = np.random.RandomState(1)
+        for _ in range(50):
+            # a small map so that wolves, sheep and blocks overlap and the collision terms are exercised
+            state = np.zeros((envSpec.numEntities, 5))
+            state[:, :2] = randomState.uniform(-0.3, 0.3, (envSpec.numEntities, 2))
+            state[:envSpec.numAgents, 2:4] = randomState.uniform(-1.5, 1.5, (envSpec.numAgents, 2))
+            state[envSpec.sheepsID, 4] = randomState.randint(0, self.sheepLife + 1, numSheeps)
+            wolfAction = list(randomState.uniform(0, 1, (self.numWolves, 5)))
+            sheepAction = list(randomState.uniform(0, 1, (numSheeps, 5)))
+
+            nextState = transit(state, wolfAction, sheepAction, self.wolfForce, self.sheepForce)
+            nextStateVectorized = transitVectorized(state, wolfAction, sheepAction, self.wolfForce, self.sheepForce)
+            self.assertEqual(nextStateVectorized.dtype, nextState.dtype)
+            self.assertTrue(np.allclose(nextStateVectorized, nextState, atol=1e-6))
+
+
+@ddt
+class TestBroadphaseParity(unittest.TestCase):
+    def setUp(self):
+        self.getCollisionForce = GetCollisionForce()
+        self.contactRangeMargin = 0.05
+
+    def sampleEntities(self, numWolves, numSheeps, numBlocks, mapSize, randomState):
+        entitiesSizeList = [0.075] * numWolves + [0.05] * numSheeps + [0.2] * numBlocks
+        entitiesMovableList = [True] * (numWolves + numSheeps) + [False] * numBlocks
+        entitiesPos = randomState.uniform(-mapSize, mapSize, (len(entitiesSizeList), 2))
+        return entitiesSizeList, entitiesMovableList, entitiesPos
+
+    @data((3, 1, 0, 1.0), (3, 12, 2, 1.0), (4, 30, 10, 2.0), (2, 40, 0, 0.5))
+    @unpack
+    def testCandidatePairsAreAllPairsInContactRange(self, numWolves, numSheeps, numBlocks, mapSize):
+        randomState = np.random.RandomState(2)
+        for _ in range(20):
+            entitiesSizeList, entitiesMovableList, entitiesPos = self.sampleEntities(numWolves, numSheeps, numBlocks, mapSize, randomState)
+            findCandidateCollisionPairs = FindCandidateCollisionPairs(entitiesSizeList, self.contactRangeMargin)
+            numEntities = len(entitiesSizeList)
+            truePairs = [(entity1ID, entity2ID) for entity1ID in range(numEntities) for entity2ID in range(entity1ID + 1, numEntities)
+                         if np.linalg.norm(entitiesPos[entity1ID] - entitiesPos[entity2ID]) <
+                         entitiesSizeList[entity1ID] + entitiesSizeList[entity2ID] + self.contactRangeMargin]
+            self.assertEqual([tuple(map(int, pair)) for pair in findCandidateCollisionPairs(entitiesPos)], truePairs)
+
+    @data((3, 1, 0, 1.0), (3, 12, 2, 1.0), (4, 30, 10, 2.0), (2, 40, 0, 0.5))
+    @unpack
+    def testBroadphaseForceMatchesPairwiseLoop(self, numWolves, numSheeps, numBlocks, mapSize):
+        randomState = np.random.RandomState(3)
+        for _ in range(20):
+            entitiesSizeList, entitiesMovableList, entitiesPos = self.sampleEntities(numWolves, numSheeps, numBlocks, mapSize, randomState)
+            numEntities = len(entitiesSizeList)
+            state = np.concatenate([entitiesPos, np.zeros((numEntities, 3))], axis=-1)
+            applyEnvironForce = ApplyEnvironForce(numEntities, entitiesMovableList, entitiesSizeList, self.getCollisionForce,
+                                                  getPosFromAgentState)
+            applyEnvironForceWithBroadphase = ApplyEnvironForceWithBroadphase(numEntities, entitiesMovableList, entitiesSizeList,
+                                                                              self.getCollisionForce, getPosFromAgentState,
+                                                                              FindCandidateCollisionPairs(entitiesSizeList, self.contactRangeMargin))
+            toArray = lambda pForce: np.array([np.zeros(2) if force is None else force for force in pForce])
+            pForce = toArray(applyEnvironForce([None] * numEntities, state))
+            pForceWithBroadphase = toArray(applyEnvironForceWithBroadphase([None] * numEntities, state))
+            self.assertTrue(np.allclose(pForceWithBroadphase, pForce, rtol=1e-12, atol=1e-12))
+
+
+@ddt
+class TestInitStatePool(unittest.TestCase):
+    def setUp(self):
+        self.numWolves = 3
+        self.mapSize = 1.0
+        self.minDistance = self.mapSize * 1 / 3
+        self.minDistanceInitBlocks = 0.2 * 1.5
+        self.poolSize = 200
+        self.seed = 20210714
+        self.sampleInitStates = SampleMultiAgentNewtonChasingInitStatesWithDiffBlocks(self.numWolves, self.mapSize, self.minDistance,
+                                                                                       self.minDistanceInitBlocks)
+        # positions are checked in float64 and stored in float32
+        self.tolerance = 1e-6
+
+    def buildReset(self, seed=None):
+        return ResetMultiAgentNewtonChasingFromInitStatePool(self.sampleInitStates, self.poolSize, self.seed if seed is None else seed)
+
+    @data((1, 0.0), (2, 0.13), (4, 0.2))
+    @unpack
+    def testPooledStatesSatisfyConstraints(self, numSheeps, blockSize):
+        reset = self.buildReset()
+        numBlocks = 0 if blockSize <= 0 else 2
+        wolvesID = list(range(self.numWolves))
+        sheepsID = list(range(self.numWolves, self.numWolves + numSheeps))
+        blocksID = list(range(self.numWolves + numSheeps, self.numWolves + numSheeps + numBlocks))
+        for trialIndex in range(self.poolSize):
+            state = reset(numSheeps, blockSize)
+            self.assertEqual(state.shape, (self.numWolves + numSheeps + numBlocks, 5))
+            self.assertEqual(state.dtype, np.float32)
+            self.assertTrue(state.flags['C_CONTIGUOUS'])
+            pos = state[:, :2].astype(float)
+            self.assertTrue(np.all(np.abs(pos) <= self.mapSize))
+            sheepWolfDist = np.linalg.norm(pos[sheepsID][:, None] - pos[wolvesID][None], axis=-1)
+            self.assertTrue(np.all(sheepWolfDist > self.minDistance - self.tolerance))
+            blockBlockDist = [np.linalg.norm(pos[block1ID] - pos[block2ID]) for block1ID in blocksID for block2ID in blocksID if block1ID < block2ID]
+            self.assertTrue(np.all(np.array(blockBlockDist) > self.minDistanceInitBlocks - self.tolerance))
+            self.assertTrue(np.all(np.abs(self.mapSize - np.abs(pos[blocksID])) >= blockSize - self.tolerance))
+            self.assertTrue(np.all(state[wolvesID + blocksID, 2:4] == 0))
+            self.assertTrue(np.all((state[sheepsID, 2:4] >= 0) & (state[sheepsID, 2:4] <= 1)))
+            self.assertTrue(np.all(state[:, 4] == 0))
+
+    def testSameConditionGivesSamePool(self):
+        reset, otherReset = self.buildReset(), self.buildReset()
+        # conditions requested in a different order still get the same pools
+        otherReset(4, 0.2)
+        for trialIndex in range(20):
+            self.assertTrue(np.array_equal(reset(2, 0.13), otherReset(2, 0.13)))
+        self.assertTrue(np.array_equal(reset.getInitState(4, 0.2, 5), otherReset.getInitState(4, 0.2, 5)))
+
+    def testDifferentConditionsGiveDifferentPools(self):
+        reset = self.buildReset()
+        conditions = [(1, 0.0), (2, 0.0), (2, 0.13), (2, 0.2), (4, 0.2)]
+        wolvesPos = [np.array([reset.getInitState(numSheeps, blockSize, poolIndex)[:self.numWolves, :2] for poolIndex in range(self.poolSize)])
+                     for numSheeps, blockSize in conditions]
+        for condition1Index in range(len(conditions)):
+            for condition2Index in range(condition1Index + 1, len(conditions)):
+                self.assertFalse(np.array_equal(wolvesPos[condition1Index], wolvesPos[condition2Index]))
+        otherSeedReset = self.buildReset(self.seed + 1)
+        self.assertFalse(np.array_equal(reset.getInitState(2, 0.13, 0), otherSeedReset.getInitState(2, 0.13, 0)))
+
+    def testPoolWrapsAroundAndReturnsCopies(self):
+        reset = self.buildReset()
+        firstState = reset(2, 0.13)
+        firstState[0, 0] = 100
+        self.assertTrue(np.array_equal(reset.getInitState(2, 0.13, self.poolSize), reset.getInitState(2, 0.13, 0)))
+        self.assertNotEqual(reset.getInitState(2, 0.13, 0)[0, 0], 100)
+
+
+@ddt
+class TestObserveAllAgentsParity(unittest.TestCase):
+    def setUp(self):
+        self.numWolves = 3
+
+    def sampleState(self, numEntities, randomState, dtype):
+        state = randomState.uniform(-1, 1, (numEntities, 5))
+        state[:, 4] = randomState.randint(0, 7, numEntities)
+        return state.astype(dtype)
+
+    def observeByAgent(self, agentsID, wolvesID, sheepsID, blocksID):
+        observes = [ObserveWithCaughtHistory(agentID, wolvesID, sheepsID, blocksID, getPosFromAgentState, getVelFromAgentState,
+                                             getCaughtHistoryFromAgentState) for agentID in agentsID]
+        return lambda state: [observe(state) for observe in observes]
+
+    def assertObservationsEqual(self, observations, trueObservations):
+        self.assertEqual(len(observations), len(trueObservations))
+        for observation, trueObservation in zip(observations, trueObservations):
+            self.assertEqual(observation.dtype, trueObservation.dtype)
+            self.assertTrue(np.array_equal(observation, trueObservation))
+
+    @data((1, 0, np.float64), (2, 2, np.float64), (4, 2, np.float32))
+    @unpack
+    def testAllAgentsMatchPerAgentObservations(self, numSheeps, numBlocks, dtype):
+        envSpec = getEnvSpec(self.numWolves, numSheeps, numBlocks, 0.075, 0.05, 0.2, 1.0, 1.1)
+        agentsID = envSpec.wolvesID + envSpec.sheepsID
+        observeAllAgents = ObserveAllAgentsWithCaughtHistory(agentsID, envSpec.wolvesID, envSpec.sheepsID, envSpec.blocksID)
+        observeByAgent = self.observeByAgent(agentsID, envSpec.wolvesID, envSpec.sheepsID, envSpec.blocksID)
+        randomState = np.random.RandomState(47)
+        batchState = np.array([self.sampleState(envSpec.numEntities, randomState, dtype) for _ in range(20)])
+        for state in batchState:
+            self.assertObservationsEqual(observeAllAgents(state), observeByAgent(state))
+
+        # sheep do not observe themselves, so their observations are shorter and come back per agent
+        batchObservations = observeAllAgents(batchState)
+        trueBatchObservations = [np.array([observeByAgent(state)[agentIndex] for state in batchState]) for agentIndex in range(len(agentsID))]
+        self.assertObservationsEqual(batchObservations, trueBatchObservations)
+
+    @data((np.float64, ), (np.float32, ))
+    @unpack
+    def testWolvesOnlyGiveOneArray(self, dtype):
+        wolvesID, sheepsID, blocksID = [0, 1, 2], [3, 4], [5, 6]
+        observeAllAgents = ObserveAllAgentsWithCaughtHistory(wolvesID, wolvesID, sheepsID, blocksID)
+        observeByAgent = self.observeByAgent(wolvesID, wolvesID, sheepsID, blocksID)
+        randomState = np.random.RandomState(48)
+        batchState = np.array([self.sampleState(7, randomState, dtype) for _ in range(10)])
+        observations = observeAllAgents(batchState)
+        self.assertEqual(observations.dtype, dtype)
+        self.assertTrue(np.array_equal(observations, np.array([observeByAgent(state) for state in batchState])))
+        self.assertTrue(np.array_equal(observeAllAgents(batchState[0]), np.array(observeByAgent(batchState[0]))))
+
+    def testTeamWithOneSheep(self):
+        # as built in the shared-agency scripts: the wolves and the sheep each of them concerns
+        wolvesID, sheepsID, blocksID = [0, 1, 2], [4], [7, 8]
+        agentsID = wolvesID + sheepsID
+        observeAllAgents = ObserveAllAgentsWithCaughtHistory(agentsID, wolvesID, sheepsID, blocksID)
+        observeByAgent = self.observeByAgent(agentsID, wolvesID, sheepsID, blocksID)
+        randomState = np.random.RandomState(49)
+        for _ in range(10):
+            state = self.sampleState(9, randomState, np.float64)
+            self.assertObservationsEqual(observeAllAgents(state), observeByAgent(state))
+
+    def testListStateWithShortBlockRows(self):
+        wolvesID, sheepsID, blocksID = [0, 1, 2], [3, 4], [5]
+        randomState = np.random.RandomState(50)
+        state = self.sampleState(6, randomState, np.float64)
+        listState = [list(agentState) for agentState in state[:5]] + [list(state[5, :4])]
+        observeAllAgents = ObserveAllAgentsWithCaughtHistory(wolvesID + sheepsID, wolvesID, sheepsID, blocksID)
+        self.assertObservationsEqual(observeAllAgents(listState), self.observeByAgent(wolvesID + sheepsID, wolvesID, sheepsID, blocksID)(state))
+
+if __name__ == '__main__':
+    unittest.main()
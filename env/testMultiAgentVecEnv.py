@@ -0,0 +1,107 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..'))
+
+import numpy as np
+import unittest
+from ddt import ddt, data, unpack
+
+from env.multiAgentEnv import getEnvSpec, IsCollision, getPosFromAgentState, getVelFromAgentState, \
+    getCaughtHistoryFromAgentState, StayInBoundaryByReflectVelocity, StayInBoundaryByReflectVelocityVectorized, \
+    GetCollisionForce, ApplyActionForce, ApplyEnvironForce, CalSheepCaughtHistory, IntegrateStateWithCaughtHistory, \
+    TransitMultiAgentChasingForExpWithNoise, GetCollisionForceVectorized, ApplyActionForceVectorized, \
+    ApplyEnvironForceVectorized, CalSheepCaughtHistoryVectorized, IntegrateStateWithCaughtHistoryVectorized, \
+    RewardWolfWithBiteAndKill, ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks
+from env.multiAgentVecEnv import TransitMultiAgentChasingBatch, ResetMultiAgentChasingBatch, MultiAgentChasingVecEnv
+
+
+@ddt
+class TestMultiAgentChasingVecEnv(unittest.TestCase):
+    def setUp(self):
+        self.numWolves = 3
+        self.killZoneRatio = 1.2
+        self.sheepLife = 6
+        self.mapSize = 0.9
+        self.numEnvs = 8
+
+    def buildEnv(self, numSheeps, blockSize, maxTimeStep, isTerminal=None):
+        numBlocks = 2 if blockSize > 0 else 0
+        envSpec = getEnvSpec(self.numWolves, numSheeps, numBlocks, 0.075, 0.05, blockSize, 1.0, 1.1, None, self.killZoneRatio)
+        isCollision = IsCollision(getPosFromAgentState, self.killZoneRatio)
+        getReward = RewardWolfWithBiteAndKill(envSpec.wolvesID, envSpec.sheepsID, envSpec.entitiesSizeList, isCollision,
+                                              getCaughtHistoryFromAgentState, self.sheepLife)
+
+        stayInBoundaryByReflectVelocity = StayInBoundaryByReflectVelocity([-1, 1], [-1, 1])
+        checkAllAgents = lambda state: np.array([np.concatenate([stayInBoundaryByReflectVelocity(
+            getPosFromAgentState(agentState), getVelFromAgentState(agentState)), agentState[4:]]) for agentState in state])
+        calSheepCaughtHistory = CalSheepCaughtHistory(envSpec.wolvesID, numBlocks, envSpec.entitiesSizeList, isCollision, self.sheepLife)
+        transit = TransitMultiAgentChasingForExpWithNoise(
+            lambda action, force: action, lambda action, force: action,
+            ApplyActionForce(envSpec.wolvesID, envSpec.sheepsID, envSpec.entitiesMovableList),
+            ApplyEnvironForce(envSpec.numEntities, envSpec.entitiesMovableList, envSpec.entitiesSizeList, GetCollisionForce(),
+                              getPosFromAgentState),
+            IntegrateStateWithCaughtHistory(envSpec.numEntities, envSpec.entitiesMovableList, envSpec.massList,
+                                            envSpec.entityMaxSpeedList, getVelFromAgentState, getPosFromAgentState,
+                                            calSheepCaughtHistory),
+            checkAllAgents, lambda action: action)
+        transitOneEnv = lambda state, actions: transit(state, list(actions[:self.numWolves]), list(actions[self.numWolves:]), 1, 1)
+
+        calSheepCaughtHistoryVectorized = CalSheepCaughtHistoryVectorized(envSpec.wolvesID, numBlocks, envSpec.entitiesSizeList,
+                                                                          self.killZoneRatio, self.sheepLife)
+        transitBatch = TransitMultiAgentChasingBatch(
+            ApplyActionForceVectorized(envSpec.entitiesMovableList),
+            ApplyEnvironForceVectorized(envSpec.entitiesMovableList, envSpec.entitiesSizeList, GetCollisionForceVectorized()),
+            IntegrateStateWithCaughtHistoryVectorized(envSpec.entitiesMovableList, envSpec.massList, envSpec.entityMaxSpeedList,
+                                                      calSheepCaughtHistoryVectorized),
+            StayInBoundaryByReflectVelocityVectorized([-1, 1], [-1, 1]))
+        resetOneEnv = ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks(self.numWolves, numBlocks, self.mapSize,
+                                                                                              0.1, 0.2)
+        resetBatch = ResetMultiAgentChasingBatch(resetOneEnv, numSheeps, blockSize)
+        vecEnv = MultiAgentChasingVecEnv(self.numEnvs, resetBatch, transitBatch, getReward, maxTimeStep, isTerminal)
+        return envSpec, vecEnv, resetBatch, transitOneEnv, getReward
+
+    @data((1, 0.0), (2, 0.2), (4, 0.1))
+    @unpack
+    def testStepMatchesPerEpisodeTransit(self, numSheeps, blockSize):
+        envSpec, vecEnv, resetBatch, transitOneEnv, getReward = self.buildEnv(numSheeps, blockSize, maxTimeStep=1000)
+        randomState = np.random.RandomState(11)
+        np.random.seed(11)
+        batchState = vecEnv.reset()
+        self.assertEqual(batchState.shape, (self.numEnvs, envSpec.numEntities, 5))
+        for _ in range(30):
+            batchActions = randomState.uniform(-5, 5, (self.numEnvs, envSpec.numAgents, 2))
+            batchReward, batchNextState, batchDone, batchContinueState = vecEnv(batchState, batchActions)
+            for state, actions, reward, nextState in zip(batchState, batchActions, batchReward, batchNextState):
+                trueNextState = transitOneEnv(state, actions)
+                self.assertTrue(np.allclose(nextState, trueNextState, atol=1e-6))
+                self.assertTrue(np.allclose(reward, getReward(state, actions, trueNextState)))
+            self.assertFalse(np.any(batchDone))
+            self.assertTrue(np.array_equal(batchContinueState, batchNextState))
+            batchState = batchContinueState
+
+    def testDoneEpisodesAreResetInPlace(self):
+        isTerminal = lambda state: state[0, 0] > 0
+        envSpec, vecEnv, resetBatch, transitOneEnv, getReward = self.buildEnv(2, 0.2, maxTimeStep=3, isTerminal=isTerminal)
+        np.random.seed(12)
+        batchState = vecEnv.reset()
+        batchActions = np.zeros((self.numEnvs, envSpec.numAgents, 2))
+        episodesTimeStep = np.zeros(self.numEnvs, dtype=int)
+        for timeStep in range(6):
+            np.random.seed(13 + timeStep)
+            batchReward, batchNextState, batchDone, batchContinueState = vecEnv(batchState, batchActions)
+            episodesTimeStep += 1
+            trueDone = np.array([isTerminal(nextState) for nextState in batchNextState]) | (episodesTimeStep >= 3)
+            self.assertTrue(np.array_equal(batchDone, trueDone))
+
+            np.random.seed(13 + timeStep)
+            resetState = resetBatch(int(np.sum(trueDone)))
+            self.assertTrue(np.array_equal(batchContinueState[trueDone], resetState))
+            self.assertTrue(np.array_equal(batchContinueState[~trueDone], batchNextState[~trueDone]))
+            episodesTimeStep[trueDone] = 0
+            self.assertTrue(np.array_equal(vecEnv.timeSteps, episodesTimeStep))
+            batchState = batchContinueState
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,7 @@ import random
 import copy
 import scipy.stats as stats
 from src.writer import loadFromPickle, saveToPickle
+from src.inference.intention import expandIntentionHistories
 from src.mathTools.distribution import sampleFromDistribution,  SoftDistribution, BuildGaussianFixCov, sampleFromContinuousSpace
 
 def createAllCertainFormatFileList(filePath,fileFormat):
@@ -72,7 +73,7 @@ class MeasureEntropy:
         self.priorIndex = priorIndex
 
     def __call__(self, oneTrialPickleData):
-        priors = oneTrialPickleData['intentionDistributions']
+        priors = expandIntentionHistories(oneTrialPickleData['intentionDistributions'])
         # import ipdb; ipdb.set_trace()
         meanEntropyWholeTrajectory = [np.mean([stats.entropy(list(prior[0][agentId].values())) for agentId in self.imaginedWeIds])
                 for prior in priors] 
@@ -85,7 +86,7 @@ class MeasureCrossEntropy:
         self.priorIndex = priorIndex
 
     def __call__(self, oneTrialPickleData):
-        priors = oneTrialPickleData['intentionDistributions']
+        priors = expandIntentionHistories(oneTrialPickleData['intentionDistributions'])
         baseDistributions = [list(prior[0][self.baseId].values())
                 for prior in priors] 
         nonBaseDistributionsAllNonBaseAgents = [[list(prior[0][nonBaseId].values()) 
@@ -113,7 +114,7 @@ class MeasureConvergeRate:
         # intentionSamplesTrajectory = [[[self.chooseIntention(prior[agentId])[0] for agentId in self.imaginedWeIds] 
             # for _ in range(50)] 
             # for prior in priors]
-        priors = oneTrialPickleData['intentionDistributions']
+        priors = expandIntentionHistories(oneTrialPickleData['intentionDistributions'])
         intentionSamplesTrajectory = [[[self.chooseIntention(prior[0][agentId])[0] for agentId in self.imaginedWeIds] 
             for _ in range(50)] 
             for prior in priors]
@@ -14,6 +14,7 @@ import random
 import copy
 import scipy.stats as stats
 from src.writer import loadFromPickle, saveToPickle
+from src.inference.intention import expandIntentionHistories
 from src.mathTools.distribution import sampleFromDistribution,  SoftDistribution, BuildGaussianFixCov, sampleFromContinuousSpace
 
 def createAllCertainFormatFileList(filePath,fileFormat):
@@ -72,7 +73,7 @@ class MeasureEntropy:
         self.priorIndex = priorIndex
 
     def __call__(self, oneTrialPickleData):
-        priors = oneTrialPickleData['intentionDistributions']
+        priors = expandIntentionHistories(oneTrialPickleData['intentionDistributions'])
         meanEntropyWholeTrajectory = [np.mean([stats.entropy(list(prior[0][agentId].values())) for agentId in self.imaginedWeIds])
                 for prior in priors] 
         return meanEntropyWholeTrajectory
@@ -84,7 +85,7 @@ class MeasureCrossEntropy:
         self.priorIndex = priorIndex
 
     def __call__(self, oneTrialPickleData):
-        priors = oneTrialPickleData['intentionDistributions']
+        priors = expandIntentionHistories(oneTrialPickleData['intentionDistributions'])
         baseDistributions = [list(prior[0][self.baseId].values())
                 for prior in priors] 
         nonBaseDistributionsAllNonBaseAgents = [[list(prior[0][nonBaseId].values()) 
@@ -108,7 +109,7 @@ class MeasureConvergeRate:
         self.chooseIntention = chooseIntention
 
     def __call__(self, oneTrialPickleData):
-        priors = oneTrialPickleData['intentionDistributions']
+        priors = expandIntentionHistories(oneTrialPickleData['intentionDistributions'])
         intentionSamplesTrajectory = [[[self.chooseIntention(prior[0][agentId])[0] for agentId in self.imaginedWeIds] 
             for _ in range(50)] 
             for prior in priors]
@@ -18,20 +18,24 @@ from src.writer import WriteDataFrameToCSV
 from src.trialCleaned import NewtonChaseTrialAllCondtionVariouSpeedForSharedAgency, isAnyKilled, CheckTerminationOfTrial, RecordEatenNumber
 from src.experiment import NewtonExperimentWithResetIntention
 from src.maddpg.trainer.myMADDPG import ActOneStep, BuildMADDPGModels, actByPolicyTrainNoisy, actByPolicyTrainNoNoisy
+from src.maddpg.trainer.numpyActor import exportNumpyActor, actByNumpyPolicyTrainNoNoisy
 from src.functionTools.loadSaveModel import saveToPickle, restoreVariables, GetSavePath
-from src.mathTools.distribution import sampleFromDistribution,  SoftDistribution, BuildGaussianFixCov, sampleFromContinuousSpace
+from src.mathTools.distribution import sampleFromDistribution,  SoftDistribution, BuildGaussianFixCov, BuildGaussianFixCovWithCholesky, sampleFromContinuousSpace
 # from src.sheepPolicy import RandomNewtonMovePolicy, chooseGreedyAction, sampleAction, SoftmaxAction, restoreVariables, ApproximatePolicy
-from env.multiAgentEnv import StayInBoundaryByReflectVelocity, TransitMultiAgentChasingForExpWithNoise, GetCollisionForce, ApplyActionForce, ApplyEnvironForce, IsCollision, \
-    IntegrateState, getPosFromAgentState, getVelFromAgentState, getCaughtHistoryFromAgentState, ObserveWithCaughtHistory, ReshapeHumanAction, ReshapeActionVariousForce, ResetMultiAgentNewtonChasingVariousSheep, \
+from env.multiAgentEnv import StayInBoundaryByReflectVelocity, StayInBoundaryByReflectVelocityVectorized, TransitMultiAgentChasingForExpWithNoise, GetCollisionForce, ApplyActionForce, ApplyEnvironForce, IsCollision, \
+    IntegrateState, getPosFromAgentState, getVelFromAgentState, getCaughtHistoryFromAgentState, ObserveWithCaughtHistory, ObserveAllAgentsWithCaughtHistory, ReshapeHumanAction, ReshapeActionVariousForce, ResetMultiAgentNewtonChasingVariousSheep, \
     ResetStateWithCaughtHistory, CalSheepCaughtHistory, IntegrateStateWithCaughtHistory, RewardWolfWithBiteAndKill, \
-    BuildGaussianFixCov, sampleFromContinuousSpace, ComposeCentralControlPolicyByGaussianOnDeterministicAction, ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks
+    BuildGaussianFixCov, BuildGaussianFixCovWithCholesky, sampleFromContinuousSpace, ComposeCentralControlPolicyByGaussianOnDeterministicAction, ComposeCentralControlMeansBatch, ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks, getEnvSpec
 from src.MDPChasing.policy import RandomPolicy
 from src.inference.intention import UpdateIntention
-from src.inference.percept import SampleNoisyAction, PerceptImaginedWeAction
-from src.inference.inference import CalUncommittedAgentsPolicyLikelihood, CalCommittedAgentsContinuousPolicyLikelihood, InferOneStep
+from src.inference.percept import PerceptImaginedWeActionVectorized
+from src.inference.inference import CalUncommittedAgentsPolicyLikelihood, CalCommittedAgentsContinuousPolicyLikelihood, \
+    CalCommittedAgentsContinuousPolicyLogLikelihoodBatch, InferOneStepLogSpace, InferOneStepOnBeam
 from src.MDPChasing.state import getStateOrActionFirstPersonPerspective, getStateOrActionThirdPersonPerspective
-from src.generateAction.imaginedWeSampleAction import PolicyForUncommittedAgent, PolicyForCommittedAgent, GetActionFromJointActionDistribution, SampleIndividualActionGivenIntention, SampleActionOnChangableIntention
-from src.sampleTrajectoryTools.resetObjectsForMultipleTrjaectory import RecordValuesForObjects, ResetObjects, GetObjectsValuesOfAttributes
+from src.generateAction.imaginedWeSampleAction import PolicyForUncommittedAgent, PolicyForCommittedAgent, BatchPolicyForCommittedAgent, CacheCommittedAgentsActionMeansPerTick, \
+    PolicyForCommittedAgentFromActionMeans, GetActionFromJointActionDistribution, SampleIndividualActionGivenIntention, \
+    SampleTeamActionOnChangableIntention
+from src.sampleTrajectoryTools.resetObjectsForMultipleTrjaectory import RecordValuesForObjects, ResetObjects, GetObjectsIntentionHistories
 
 
 def main(subIndex):
@@ -63,6 +67,8 @@ def main(subIndex):
     deviationFor2DAction = 1.0
     rationalityBetaInInference = 0.99
     valuePriorEndTime = -100
+    inferenceBeamSize = None # e.g. 4 scores only the most probable intentions between full re-expansions
+    beamReexpandInterval = 5
     trailNumEachCondition = 13
     trailNumEachConditionPractice = 0
 
@@ -123,25 +129,25 @@ def main(subIndex):
                     numBlocks = 0
                 numSheeps = len(targetColorIndex)
                 print('numSheeps', numSheeps)
-                numAgents = numWolves + numSheeps
-                numEntities = numAgents + numBlocks
-                wolvesID = list(range(numWolves))
-                sheepsID = list(range(numWolves, numAgents))
-                blocksID = list(range(numAgents, numEntities))
-                possibleWolvesIds = wolvesID
-                possibleSheepIds = sheepsID
-
-                entitiesSizeList = [wolfSize] * numWolves + [sheepSize] * numSheeps + [blockSize] * numBlocks
-                
                 wolfMaxSpeed = 1
                 blockMaxSpeed = None
+                envSpec = getEnvSpec(numWolves, numSheeps, numBlocks, wolfSize, sheepSize, blockSize, wolfMaxSpeed,
+                                     sheepMaxSpeed, blockMaxSpeed, killZoneRatio)
+                numEntities = envSpec.numEntities
+                wolvesID = envSpec.wolvesID
+                sheepsID = envSpec.sheepsID
+                blocksID = envSpec.blocksID
+                possibleWolvesIds = wolvesID
+                possibleSheepIds = sheepsID
 
-                entityMaxSpeedList = [wolfMaxSpeed] * numWolves + [sheepMaxSpeed] * numSheeps + [blockMaxSpeed] * numBlocks
-                entitiesMovableList = [True] * numAgents + [False] * numBlocks
-                massList = [1.0] * numEntities
+                entitiesSizeList = envSpec.entitiesSizeList
+                entityMaxSpeedList = envSpec.entityMaxSpeedList
+                entitiesMovableList = envSpec.entitiesMovableList
+                massList = envSpec.massList
                 reset = ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks(numWolves, numBlocks, mapSize, minDistance, minDistanceInitBlocks)
                 isCollision = IsCollision(getPosFromAgentState, killZoneRatio)
-                rewardWolf = RewardWolfWithBiteAndKill(wolvesID, sheepsID, entitiesSizeList, isCollision, getCaughtHistoryFromAgentState, sheepLife, biteReward, killReward)
+                collisionContext = envSpec.collisionContext
+                rewardWolf = RewardWolfWithBiteAndKill(wolvesID, sheepsID, entitiesSizeList, isCollision, getCaughtHistoryFromAgentState, sheepLife, biteReward, killReward, collisionContext)
                 allWolfRewardFun.update({(numSheeps, sheepMaxSpeed): rewardWolf})
                 
                 stayInBoundaryByReflectVelocity = StayInBoundaryByReflectVelocity([-displaySize, displaySize], [-displaySize, displaySize])
@@ -150,16 +156,9 @@ def main(subIndex):
                     newState = stayInBoundaryByReflectVelocity(getPosFromAgentState(agentState), getVelFromAgentState(agentState))
                     return newState
 
-                def checkBoudaryWithCaughtHistory(agentState):
-                    position = getPosFromAgentState(agentState)
-                    velocity = getVelFromAgentState(agentState)
-                    adjustedState = stayInBoundaryByReflectVelocity(position, velocity)
-                    if len(agentState) == 5:
-                        adjustedState = np.append(adjustedState, getCaughtHistoryFromAgentState(agentState))
-                    return adjustedState.copy()
 
                 # checkAllAgents = lambda states: [checkBoudary(agentState) for agentState in states]
-                checkAllAgents = lambda states: [checkBoudaryWithCaughtHistory(agentState) for agentState in states]
+                checkAllAgents = StayInBoundaryByReflectVelocityVectorized([-displaySize, displaySize], [-displaySize, displaySize])
                 # reshapeHumanAction = ReshapeHumanAction()
                 # reshapeSheepAction = ReshapeSheepAction()
                 reShapeWolfAction = lambda action, force: action
@@ -168,13 +167,13 @@ def main(subIndex):
                 applyActionForce = ApplyActionForce(wolvesID, sheepsID, entitiesMovableList)
                 applyEnvironForce = ApplyEnvironForce(numEntities, entitiesMovableList, entitiesSizeList, getCollisionForce,
                                                       getPosFromAgentState)
-                calSheepCaughtHistory = CalSheepCaughtHistory(wolvesID, numBlocks, entitiesSizeList, isCollision, sheepLife)
+                calSheepCaughtHistory = CalSheepCaughtHistory(wolvesID, numBlocks, entitiesSizeList, isCollision, sheepLife, collisionContext)
                 integrateState = IntegrateStateWithCaughtHistory(numEntities, entitiesMovableList, massList, entityMaxSpeedList,
                                                 getVelFromAgentState, getPosFromAgentState, calSheepCaughtHistory, damping=0.25, dt=physicsDT)
 
                 actionDimReshaped = 2
                 covSheep = [0.3 ** 2 for _ in range(actionDimReshaped)]
-                buildGaussianSheep = BuildGaussianFixCov(covSheep)
+                buildGaussianSheep = BuildGaussianFixCovWithCholesky(covSheep)
                 noiseActionSheep = lambda action: sampleFromContinuousSpace(buildGaussianSheep(tuple(action)))
                 transit = TransitMultiAgentChasingForExpWithNoise(reShapeWolfAction, reShapeSheepAction, applyActionForce,
                                                                   applyEnvironForce, integrateState, checkAllAgents,
@@ -190,9 +189,7 @@ def main(subIndex):
                     for allPossibleIntentionsOneWolf in intentionSpacesForAllWolves]
                 # Percept Action For Inference
                 # perceptAction = lambda action: action
-                perceptSelfAction = SampleNoisyAction(deviationFor2DAction)
-                perceptOtherAction = SampleNoisyAction(deviationFor2DAction)
-                perceptAction = PerceptImaginedWeAction(possibleWolvesIds, perceptSelfAction, perceptOtherAction)
+                perceptAction = PerceptImaginedWeActionVectorized(possibleWolvesIds, deviationFor2DAction, deviationFor2DAction)
 
                 # Policy Likelihood function: Wolf Centrol Control NN Policy Given Intention
                 # ------------ wolf model -------------
@@ -206,10 +203,8 @@ def main(subIndex):
                     wolvesIDForWolfObserve = list(range(numAgentInWe))
                     sheepsIDForWolfObserve = list(range(numAgentInWe, 1 + numAgentInWe))
                     blocksIDForWolfObserve = list(range(1 + numAgentInWe, 1 + numAgentInWe + numBlocksForWe))
-                    observeOneAgentForWolf = lambda agentID: ObserveWithCaughtHistory(agentID, wolvesIDForWolfObserve, sheepsIDForWolfObserve,
-                                                                     blocksIDForWolfObserve, getPosFromAgentState,
-                                                                     getVelFromAgentState, getCaughtHistoryFromAgentState)
-                    observeWolf = lambda state: [observeOneAgentForWolf(agentID)(state) for agentID in range(numAgentInWe + 1)]
+                    observeWolf = ObserveAllAgentsWithCaughtHistory(list(range(numAgentInWe + 1)), wolvesIDForWolfObserve, sheepsIDForWolfObserve,
+                                                                      blocksIDForWolfObserve)
                     observeListBaseOnNumInWe.append(observeWolf)
 
                     obsIDsForWolf = wolvesIDForWolfObserve + sheepsIDForWolfObserve + blocksIDForWolfObserve
@@ -238,7 +233,7 @@ def main(subIndex):
                 # For action inference
                 actionDimReshaped = 2
                 cov = [deviationFor2DAction ** 2 for _ in range(actionDimReshaped)]
-                buildGaussian = BuildGaussianFixCov(cov)
+                buildGaussian = BuildGaussianFixCovWithCholesky(cov)
                 actOneStepOneModelWolf = ActOneStep(actByPolicyTrainNoNoisy)
                 # actOneStepOneModelWolf = ActOneStep(actByPolicyTrainNoisy)
                 reshapeAction = ReshapeHumanAction()
@@ -261,6 +256,19 @@ def main(subIndex):
                 calCommittedAgentsPolicyLikelihood = CalCommittedAgentsContinuousPolicyLikelihood(concernedAgentsIds,
                                                                                                   policyForCommittedAgentsInInference,
                                                                                                   rationalityBetaInInference)
+                composeCentralControlMeans = lambda observe: ComposeCentralControlMeansBatch(reshapeAction, observe, actByNumpyPolicyTrainNoNoisy)
+                # restored actors run in numpy, no session call per batch of intentions
+                weNumpyActorsListBaseOnNumInWe = [[exportNumpyActor(model) for model in weModels] for weModels in weModelsListBaseOnNumInWe]
+                wolvesCentralControlMeans = [composeCentralControlMeans(observeListBaseOnNumInWe[numAgentsInWe - 3])(
+                    weNumpyActorsListBaseOnNumInWe[numAgentsInWe - 3], numAgentsInWe) for numAgentsInWe in range(numWolves, numWolves + 1)]
+                # means are shared by every wolf's inference and planning within a tick
+                getCommittedAgentsActionMeans = CacheCommittedAgentsActionMeansPerTick(
+                    BatchPolicyForCommittedAgent(wolvesCentralControlMeans, getStateThirdPersonPerspective))
+                policyForCommittedAgentsInInferenceBatch = getCommittedAgentsActionMeans
+                calCommittedAgentsPolicyLogLikelihoodBatch = CalCommittedAgentsContinuousPolicyLogLikelihoodBatch(concernedAgentsIds,
+                                                                                                                  policyForCommittedAgentsInInferenceBatch,
+                                                                                                                  buildGaussian.logpdf,
+                                                                                                                  rationalityBetaInInference)
 
                 randomActionSpace = [(5, 0), (3.5, 3.5), (0, 5), (-3.5, 3.5), (-5, 0), (-3.5, -3.5), (0, -5), (3.5, -3.5), (0, 0)]
                 randomPolicy = RandomPolicy(randomActionSpace)
@@ -275,6 +283,8 @@ def main(subIndex):
                 # Joint Likelihood
                 calJointLikelihood = lambda intention, state, perceivedAction: calCommittedAgentsPolicyLikelihood(intention, state, perceivedAction) * \
                                                                                calUncommittedAgentsPolicyLikelihood(intention, state, perceivedAction)
+                calJointLogLikelihoodBatch = lambda intentions, state, perceivedAction: calCommittedAgentsPolicyLogLikelihoodBatch(intentions, state, perceivedAction) + \
+                    np.log([calUncommittedAgentsPolicyLikelihood(intention, state, perceivedAction) for intention in intentions])
 
                 # Infer and update Intention
                 variablesForAllWolves = [[intentionSpace] for intentionSpace in intentionSpacesForAllWolves]
@@ -283,8 +293,12 @@ def main(subIndex):
                 concernedHypothesisVariable = ['intention']
                 # priorDecayRate = 1
                 softPrior = SoftDistribution(priorDecayRate)
-                inferIntentionOneStepList = [InferOneStep(jointHypothesisSpace, concernedHypothesisVariable, calJointLikelihood, softPrior) for jointHypothesisSpace in
+                inferIntentionOneStepList = [InferOneStepLogSpace(jointHypothesisSpace, concernedHypothesisVariable, calJointLikelihood, softPrior,
+                                                                  calJointLogLikelihoodBatch=calJointLogLikelihoodBatch) for jointHypothesisSpace in
                                              jointHypothesisSpaces]
+                if inferenceBeamSize is not None:
+                    inferIntentionOneStepList = [InferOneStepOnBeam(calJointLogLikelihoodBatch, softPrior, inferenceBeamSize, beamReexpandInterval)
+                                                 for jointHypothesisSpace in jointHypothesisSpaces]
 
                 if numSheeps == 1:
                     inferIntentionOneStepList = [lambda prior, state, action: prior] * 3
@@ -292,13 +306,13 @@ def main(subIndex):
                 adjustIntentionPriorGivenValueOfState = lambda state: 1
                 chooseIntention = sampleFromDistribution
                 updateIntentions = [UpdateIntention(intentionPrior, valuePriorEndTime, adjustIntentionPriorGivenValueOfState,
-                                                    perceptAction, inferIntentionOneStep, chooseIntention)
+                                                    perceptAction, inferIntentionOneStep, chooseIntention, maxSteps=maxTrialStep + 2)
                                     for intentionPrior, inferIntentionOneStep in
                                     zip(wolvesIntentionPriors, inferIntentionOneStepList)]
 
                 # Wolves Generate Action
                 covForPlanning = [0.03 ** 2 for _ in range(actionDimReshaped)]
-                buildGaussianForPlanning = BuildGaussianFixCov(covForPlanning)
+                buildGaussianForPlanning = BuildGaussianFixCovWithCholesky(covForPlanning)
                 composeCentralControlPolicyForPlanning = lambda \
                     observe: ComposeCentralControlPolicyByGaussianOnDeterministicAction \
                     (reshapeAction, observe, actOneStepOneModelWolf, buildGaussianForPlanning)
@@ -309,9 +323,8 @@ def main(subIndex):
 
                 centralControlPolicyListBasedOnNumAgentsInWeForPlanning = wolvesCentralControlPoliciesForPlanning  # 0 for two agents in We, 1 for three agents...
                 softPolicyInPlanning = lambda distribution: distribution
-                policyForCommittedAgentInPlanning = PolicyForCommittedAgent(
-                    centralControlPolicyListBasedOnNumAgentsInWeForPlanning, softPolicyInPlanning,
-                    getStateThirdPersonPerspective)
+                policyForCommittedAgentInPlanning = PolicyForCommittedAgentFromActionMeans(getCommittedAgentsActionMeans,
+                                                                                           buildGaussianForPlanning)
 
                 policyForUncommittedAgentInPlanning = PolicyForUncommittedAgent(possibleWolvesIds, randomPolicy,
                                                                                 softPolicyInPlanning,
@@ -331,9 +344,8 @@ def main(subIndex):
                     SampleIndividualActionGivenIntention(selfId, policyForCommittedAgentInPlanning,
                                                          policyForUncommittedAgentInPlanning, chooseCommittedAction,
                                                          chooseUncommittedAction) for selfId in possibleWolvesIds]
-                wolvesSampleActions = [SampleActionOnChangableIntention(updateIntention, wolvesSampleIndividualActionGivenIntention)
-                    for updateIntention, wolvesSampleIndividualActionGivenIntention in
-                    zip(updateIntentions, wolvesSampleIndividualActionGivenIntentionList)]
+                wolvesSampleActions = SampleTeamActionOnChangableIntention(updateIntentions, wolvesSampleIndividualActionGivenIntentionList,
+                                                                           getCommittedAgentsActionMeans, possibleWolvesIds)
 
                 # reset intention and adjuste intention prior attributes tools for multiple trajectory
                 intentionResetAttributes = ['timeStep', 'lastState', 'lastAction', 'intentionPrior', 'formerIntentionPriors']
@@ -342,7 +354,7 @@ def main(subIndex):
                     for intentionPrior in wolvesIntentionPriors]
                 resetIntentions = ResetObjects(intentionResetAttributeValues, updateIntentions)
                 returnAttributes = ['formerIntentionPriors']
-                getIntentionDistributions = GetObjectsValuesOfAttributes(returnAttributes, updateIntentions)
+                getIntentionDistributions = GetObjectsIntentionHistories(returnAttributes[0], updateIntentions)
                 attributesToRecord = ['lastAction']
                 recordActionForUpdateIntention = RecordValuesForObjects(attributesToRecord, updateIntentions)
                 allGetIntentionDistributions.update({(numSheeps, sheepMaxSpeed, blockSize): getIntentionDistributions})
@@ -368,10 +380,8 @@ def main(subIndex):
                     sheepObserve = ft.partial(observeOneForSheep, num=numWolves + numSheepToObserve)
                     sheepObsList = []
                     for sheepId in sheepsID:
-                        obsFunList = [ObserveWithCaughtHistory(agentID, wolvesIDForSheepObserve, [sheepId], blocksIDForSheepObserve,
-                                              getPosFromAgentState, getVelFromAgentState,  getCaughtHistoryFromAgentState) for agentID in list(range(numWolves)) + [sheepId]]
-                        sheepObsLambda = lambda state, obsList: list([obs(state) for obs in obsList])
-                        sheepObs = ft.partial(sheepObsLambda, obsList=obsFunList)
+                        sheepObs = ObserveAllAgentsWithCaughtHistory(list(range(numWolves)) + [sheepId], wolvesIDForSheepObserve, [sheepId],
+                                                                      blocksIDForSheepObserve)
                         sheepObsList.append(sheepObs)
                     initSheepObsForParams = sheepObserve(reset(numSheepToObserve, blockSize))
                     obsSheepShape = [initSheepObsForParams[obsID].shape[0] for obsID in range(len(initSheepObsForParams))]
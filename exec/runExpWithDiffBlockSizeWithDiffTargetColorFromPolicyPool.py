@@ -7,7 +7,6 @@ import collections as co
 import itertools as it
 import functools as ft
 
-import numpy as np
 import random
 import pygame as pg
 from pygame.color import THECOLORS
@@ -24,7 +23,10 @@ from env.multiAgentEnv import StayInBoundaryByReflectVelocity, TransitMultiAgent
     ApplyActionForce, ApplyEnvironForce, getPosFromAgentState, getVelFromAgentState, getCaughtHistoryFromAgentState,\
     ObserveWithCaughtHistory, ReshapeActionVariousForce, ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks, \
     ResetStateWithCaughtHistory, CalSheepCaughtHistory, IntegrateStateWithCaughtHistory, RewardWolfWithBiteAndKill, \
-    IsCollision, BuildGaussianFixCov, sampleFromContinuousSpace
+    IsCollision, BuildGaussianFixCov, BuildGaussianFixCovWithCholesky, sampleFromContinuousSpace, TransitMultiAgentChasingForExpWithNoiseVectorized, \
+    StayInBoundaryByReflectVelocityVectorized, GetCollisionForceVectorized, ApplyActionForceVectorized, ApplyEnvironForceVectorized, \
+    CalSheepCaughtHistoryVectorized, IntegrateStateWithCaughtHistoryVectorized, \
+    SampleMultiAgentNewtonChasingInitStatesWithDiffBlocks, ResetMultiAgentNewtonChasingFromInitStatePool, getEnvSpec
 from collections import OrderedDict
 
 
@@ -82,6 +84,8 @@ def main():
     wolfSize = 0.065
     sheepSize = 0.065
     killZoneRatio = 1.2
+    physicsEngine = 'vectorized' # 'perEntity' for the original per-entity loop, same trajectories
+    initStatePoolSeed = 20210714 # trial start states of every condition are derived from it, recorded with each trial
     
     numWolves = 3
     experimentValues["numWolves"] = numWolves
@@ -100,30 +104,26 @@ def main():
     for blockSize in manipulatedVariables['blockSize']:
         for targetColorIndex in manipulatedVariables['targetColorIndex']:
             for sheepMaxSpeed in manipulatedVariables['sheepMaxSpeed']:
-                if blockSize > 0:
-                    numBlocks = 2
-                else:
-                    numBlocks = 0
+                numBlocks = 2 if blockSize > 0 else 0
                 numSheeps = len(targetColorIndex)
                 print('numSheeps', numSheeps)
-                numAgents = numWolves + numSheeps
-                numEntities = numAgents + numBlocks
-                wolvesID = list(range(numWolves))
-                sheepsID = list(range(numWolves, numAgents))
-                blocksID = list(range(numAgents, numEntities))
-
-                entitiesSizeList = [wolfSize] * numWolves + [sheepSize] * numSheeps + [blockSize] * numBlocks
-
                 wolfMaxSpeed = 1.0
                 # sheepMaxSpeed = 1.1
                 blockMaxSpeed = None
-
-                entityMaxSpeedList = [wolfMaxSpeed] * numWolves + [sheepMaxSpeed] * numSheeps + [blockMaxSpeed] * numBlocks
-                entitiesMovableList = [True] * numAgents + [False] * numBlocks
-                massList = [1.0] * numEntities
+                envSpec = getEnvSpec(numWolves, numSheeps, numBlocks, wolfSize, sheepSize, blockSize, wolfMaxSpeed,
+                                     sheepMaxSpeed, blockMaxSpeed, killZoneRatio)
+                numAgents = envSpec.numAgents
+                numEntities = envSpec.numEntities
+                wolvesID = envSpec.wolvesID
+                sheepsID = envSpec.sheepsID
+                entitiesSizeList = envSpec.entitiesSizeList
+                entityMaxSpeedList = envSpec.entityMaxSpeedList
+                entitiesMovableList = envSpec.entitiesMovableList
+                massList = envSpec.massList
                 reset = ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks(numWolves, numBlocks, mapSize, minDistance, minDistanceInitBlocks)
                 isCollision = IsCollision(getPosFromAgentState, killZoneRatio)
-                rewardWolf = RewardWolfWithBiteAndKill(wolvesID, sheepsID, entitiesSizeList, isCollision, getCaughtHistoryFromAgentState, sheepLife, biteReward, killReward)
+                collisionContext = envSpec.collisionContext
+                rewardWolf = RewardWolfWithBiteAndKill(wolvesID, sheepsID, entitiesSizeList, isCollision, getCaughtHistoryFromAgentState, sheepLife, biteReward, killReward, collisionContext)
                 allWolfRewardFun.update({(numSheeps, sheepMaxSpeed): rewardWolf})
 
                 stayInBoundaryByReflectVelocity = StayInBoundaryByReflectVelocity([-displaySize, displaySize], [-displaySize, displaySize])
@@ -132,16 +132,9 @@ def main():
                     newState = stayInBoundaryByReflectVelocity(getPosFromAgentState(agentState), getVelFromAgentState(agentState))
                     return newState
 
-                def checkBoudaryWithCaughtHistory(agentState):
-                    position = getPosFromAgentState(agentState)
-                    velocity = getVelFromAgentState(agentState)
-                    adjustedState = stayInBoundaryByReflectVelocity(position, velocity)
-                    if len(agentState) == 5:
-                        adjustedState = np.append(adjustedState, getCaughtHistoryFromAgentState(agentState))
-                    return adjustedState.copy()
 
                 # checkAllAgents = lambda states: [checkBoudary(agentState) for agentState in states]
-                checkAllAgents = lambda states: [checkBoudaryWithCaughtHistory(agentState) for agentState in states]
+                checkAllAgents = StayInBoundaryByReflectVelocityVectorized([-displaySize, displaySize], [-displaySize, displaySize])
                 # reshapeHumanAction = ReshapeHumanAction()
                 # reshapeSheepAction = ReshapeSheepAction()
                 reShapeAction = ReshapeActionVariousForce()
@@ -149,17 +142,27 @@ def main():
                 applyActionForce = ApplyActionForce(wolvesID, sheepsID, entitiesMovableList)
                 applyEnvironForce = ApplyEnvironForce(numEntities, entitiesMovableList, entitiesSizeList, getCollisionForce,
                                                       getPosFromAgentState)
-                calSheepCaughtHistory = CalSheepCaughtHistory(wolvesID, numBlocks, entitiesSizeList, isCollision, sheepLife)
+                calSheepCaughtHistory = CalSheepCaughtHistory(wolvesID, numBlocks, entitiesSizeList, isCollision, sheepLife, collisionContext)
                 integrateState = IntegrateStateWithCaughtHistory(numEntities, entitiesMovableList, massList, entityMaxSpeedList,
                                                 getVelFromAgentState, getPosFromAgentState, calSheepCaughtHistory, damping=0.25, dt=physicsDT)
 
                 actionDimReshaped = 2
                 cov = [0.3 ** 2 for _ in range(actionDimReshaped)]
-                buildGaussian = BuildGaussianFixCov(cov)
+                buildGaussian = BuildGaussianFixCovWithCholesky(cov)
                 noiseAction = lambda action: sampleFromContinuousSpace(buildGaussian(tuple(action)))
                 transit = TransitMultiAgentChasingForExpWithNoise(reShapeAction, reShapeAction, applyActionForce,
                                                                   applyEnvironForce, integrateState, checkAllAgents,
                                                                   noiseAction)
+                if physicsEngine == 'vectorized':
+                    applyActionForce = ApplyActionForceVectorized(envSpec.entitiesMovable)
+                    applyEnvironForce = ApplyEnvironForceVectorized(envSpec.entitiesMovable, envSpec.entitiesSize, GetCollisionForceVectorized(),
+                                                                    envSpec.pairMinDistance)
+                    calSheepCaughtHistory = CalSheepCaughtHistoryVectorized(wolvesID, numBlocks, entitiesSizeList, killZoneRatio, sheepLife, collisionContext)
+                    integrateState = IntegrateStateWithCaughtHistoryVectorized(envSpec.entitiesMovable, envSpec.entitiesMass, envSpec.entitiesMaxSpeed,
+                                                                               calSheepCaughtHistory, damping=0.25, dt=physicsDT)
+                    transit = TransitMultiAgentChasingForExpWithNoiseVectorized(reShapeAction, reShapeAction, applyActionForce,
+                                                                                applyEnvironForce, integrateState, checkAllAgents,
+                                                                                noiseAction)
                 allTransitFun.update({(numSheeps, sheepMaxSpeed, blockSize): transit})
 
                 # transit = TransitMultiAgentChasingForExpVariousForce(reShapeAction, reShapeAction, applyActionForce, applyEnvironForce, integrateState, checkAllAgents)
@@ -273,13 +276,9 @@ def main():
                         wolfPolicyOneCondition = lambda state, models: humanControlPolicy()
                         wolfModelsList = list(range(numWolves * numTrainedWolfFolder))
                     else:
-                        observeOneAgent1 = lambda agentID, sId: ObserveWithCaughtHistory(agentID, wolvesID, sId, blocksID,
-                                                                                   getPosFromAgentState, getVelFromAgentState, getCaughtHistoryFromAgentState)
                         # observeOneAgent1 = lambda agentID, sId: Observe(agentID, wolvesID, sId, blocksID, getPosFromAgentState,
                         #                                                 getVelFromAgentState)
-                        observeOneAgent = ft.partial(observeOneAgent1, sId=sheepsID)
-                        observeOne = lambda state, num: [observeOneAgent(agentID)(state) for agentID in range(num)]
-                        observe = ft.partial(observeOne, num=numAgents)
+                        observe = envSpec.observe
                         initObsForParams = observe(reset(numSheeps, blockSize))
                         obsShape = [initObsForParams[obsID].shape[0] for obsID in range(len(initObsForParams))]
 
@@ -377,6 +376,13 @@ def main():
     hasRest = True
     # resetWithCaughtHistory = ResetStateWithCaughtHistory(reset, calSheepCaughtHistory)
 
+    # all trial start states are drawn here instead of in the inter-trial gap
+    experimentValues["initStatePoolSeed"] = initStatePoolSeed
+    sampleInitStates = SampleMultiAgentNewtonChasingInitStatesWithDiffBlocks(numWolves, mapSize, minDistance, minDistanceInitBlocks)
+    resetFromInitStatePool = ResetMultiAgentNewtonChasingFromInitStatePool(sampleInitStates, len(allConditions) + len(practiceConditions),
+                                                                           experimentValues["initStatePoolSeed"])
+    [resetFromInitStatePool.generatePool(len(condition['targetColorIndex']), condition['blockSize']) for condition in parametersAllCondtion]
+
     picturePath = os.path.abspath(os.path.join(os.path.join(dirName, '..'), 'pictures'))
     introductionImage = pg.image.load(os.path.join(picturePath, 'introduction-waitall-color.png'))
     restImage = pg.image.load(os.path.join(picturePath, 'rest-waitall.png'))
@@ -389,9 +395,9 @@ def main():
         drawStartAndRestImgExp = DrawImageWithJoysticksCheck(screen, humanControlPolicy.joystickList)
     if wolfControllerType == 'model':
         drawStartAndRestImgExp = drawImage
-    experimentPractice = NewtonExperimentWithDiffBlocks(restImage, hasRest, trial, writer, pickleWriter, experimentValues, reset,
+    experimentPractice = NewtonExperimentWithDiffBlocks(restImage, hasRest, trial, writer, pickleWriter, experimentValues, resetFromInitStatePool,
                                   drawStartAndRestImgExp)
-    experiment = NewtonExperimentWithDiffBlocks(restImage, hasRest, trial, writer, pickleWriter, experimentValues, reset,
+    experiment = NewtonExperimentWithDiffBlocks(restImage, hasRest, trial, writer, pickleWriter, experimentValues, resetFromInitStatePool,
                                   drawStartAndRestImgExp, writable = True)
     # giveExperimentFeedback = GiveExperimentFeedback(screen, textColorTuple, screenWidth, screenHeight)
     drawStartAndRestImgExp(introductionImage)
@@ -0,0 +1,219 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.join(os.path.dirname(__file__), '..')))
+import itertools as it
+from collections import OrderedDict
+import pandas as pd
+
+import numpy as np
+from src.maddpg.trainer.myMADDPG import BuildMADDPGModels
+from src.maddpg.trainer.numpyActor import exportNumpyActor, actByNumpyPolicyTrainNoNoisy
+from src.functionTools.loadSaveModel import restoreVariables
+from src.mathTools.distribution import sampleFromDistribution, SoftDistribution, BuildGaussianFixCovWithCholesky
+from env.multiAgentEnv import ObserveAllAgentsWithCaughtHistory, ReshapeWolfAction, ComposeCentralControlMeansBatch, \
+    ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks
+from src.MDPChasing.policy import RandomPolicy
+from src.inference.intention import UpdateIntention
+from src.inference.percept import PerceptImaginedWeActionVectorized
+from src.inference.inference import CalUncommittedAgentsPolicyLikelihood, CalCommittedAgentsContinuousPolicyLogLikelihoodBatch, InferOneStepLogSpace, InferOneStepOnBeam
+from src.inference.offlineInference import streamRecordedTrials, InferIntentionOnRecordedTrial, RunOfflineIntentionInference, mergeTrialResults
+from src.MDPChasing.state import getStateOrActionFirstPersonPerspective, getStateOrActionThirdPersonPerspective
+from src.generateAction.imaginedWeSampleAction import PolicyForUncommittedAgent, BatchPolicyForCommittedAgent, CacheCommittedAgentsActionMeansPerTick
+from src.sampleTrajectoryTools.resetObjectsForMultipleTrjaectory import RecordValuesForObjects, ResetObjects, GetObjectsIntentionHistories
+from src.writer import loadFromPickle, saveToPickle
+
+numWolves = 3
+inferenceInterval = 10
+priorDecayRate = 0.25
+deviationFor2DAction = 9.0
+rationalityBetaInInference = 0.5
+valuePriorEndTime = -100
+inferenceBeamSize = None # e.g. 4 scores only the most probable intentions between full re-expansions
+beamReexpandInterval = 5
+maxIntentionSteps = 64
+
+
+def buildUpdateIntentionsOneCondition(numSheeps, sheepMaxSpeed, blockSize):
+    # built in its own scope so the likelihood closures bind to this condition's models
+    dirName = os.path.dirname(__file__)
+    numTrainedWolfFolderPostfix = [5]
+    evaluateEpisodeWolf = 120000
+    rewardSharedOrIndividual = 'shared'
+    mapSize = 1.0
+    minDistance = mapSize * 1 / 3
+    minDistanceInitBlocks = blockSize * 1.5
+
+    if blockSize > 0:
+        numBlocks = 2
+    else:
+        numBlocks = 0
+    numAgents = numWolves + numSheeps
+    numEntities = numAgents + numBlocks
+    wolvesID = list(range(numWolves))
+    sheepsID = list(range(numWolves, numAgents))
+    blocksID = list(range(numAgents, numEntities))
+    possibleWolvesIds = wolvesID
+    possibleSheepIds = sheepsID
+    reset = ResetMultiAgentNewtonChasingVariousSheepWithCaughtHistoryWithDiffBlocks(numWolves, numBlocks, mapSize, minDistance, minDistanceInitBlocks)
+
+    # Inference Part
+    intentionSpacesForAllWolves = [tuple(it.product(possibleSheepIds, [tuple(possibleWolvesIds)]))
+                                   for wolfId in possibleWolvesIds]
+    wolvesIntentionPriors = [{tuple(intention): 1 / len(allPossibleIntentionsOneWolf) for intention in allPossibleIntentionsOneWolf}
+        for allPossibleIntentionsOneWolf in intentionSpacesForAllWolves]
+    perceptAction = PerceptImaginedWeActionVectorized(possibleWolvesIds, deviationFor2DAction, deviationFor2DAction)
+
+    # ------------ wolf model -------------
+    weModelsListBaseOnNumInWe = []
+    observeListBaseOnNumInWe = []
+    for numAgentInWe in range(numWolves, numWolves + 1):
+        worldDim = 2
+        actionDim = worldDim * 2 + 1
+        numSheepForWe = 1
+        numBlocksForWe = numBlocks
+        wolvesIDForWolfObserve = list(range(numAgentInWe))
+        sheepsIDForWolfObserve = list(range(numAgentInWe, 1 + numAgentInWe))
+        blocksIDForWolfObserve = list(range(1 + numAgentInWe, 1 + numAgentInWe + numBlocksForWe))
+        observeWolf = ObserveAllAgentsWithCaughtHistory(list(range(numAgentInWe + 1)), wolvesIDForWolfObserve, sheepsIDForWolfObserve,
+                                                        blocksIDForWolfObserve)
+        observeListBaseOnNumInWe.append(observeWolf)
+
+        obsIDsForWolf = wolvesIDForWolfObserve + sheepsIDForWolfObserve + blocksIDForWolfObserve
+        initObsForWolfParams = observeWolf(reset(numSheepForWe, blockSize)[obsIDsForWolf])
+        obsShapeWolf = [initObsForWolfParams[obsID].shape[0] for obsID in range(len(initObsForWolfParams))]
+        buildWolfModels = BuildMADDPGModels(actionDim, numAgentInWe + 1, obsShapeWolf)
+        layerWidthForWolf = [64 * (numAgentInWe - 1), 64 * (numAgentInWe - 1)]
+        wolfModelsList = [buildWolfModels(layerWidthForWolf, agentID) for agentID in range(numAgentInWe)]
+
+        modelFolderNameWolf = 'newRewardAllSheep1.2killZoneRatio' + str(numTrainedWolfFolderPostfix[0])
+        maxEpisodeWolf = 120000
+        maxTimeStepWolf = 75
+        modelSheepSpeedWolf1 = sheepMaxSpeed
+        wolfFileName = "maddpg{}wolves1sheep{}blocks{}episodes{}stepSheepSpeed{}".format(numWolves, numBlocks, maxEpisodeWolf,
+                                                                                         maxTimeStepWolf, modelSheepSpeedWolf1) + rewardSharedOrIndividual + "_agent"
+        wolfModelPaths = [os.path.join(dirName, '..', 'model', modelFolderNameWolf, wolfFileName + str(i) + str(evaluateEpisodeWolf) + 'eps') for i in
+                          range(numWolves)]
+        [restoreVariables(model, path) for model, path in zip(wolfModelsList, wolfModelPaths)]
+        weModelsListBaseOnNumInWe.append(wolfModelsList)
+
+    actionDimReshaped = 2
+    cov = [deviationFor2DAction ** 2 for _ in range(actionDimReshaped)]
+    buildGaussian = BuildGaussianFixCovWithCholesky(cov)
+    reshapeAction = ReshapeWolfAction()
+    getStateThirdPersonPerspective = lambda state, goalId, weIds: getStateOrActionThirdPersonPerspective(state, goalId, weIds, blocksID)
+    composeCentralControlMeans = lambda observe: ComposeCentralControlMeansBatch(reshapeAction, observe, actByNumpyPolicyTrainNoNoisy)
+    # restored actors run in numpy, no session call per batch of intentions
+    weNumpyActorsListBaseOnNumInWe = [[exportNumpyActor(model) for model in weModels] for weModels in weModelsListBaseOnNumInWe]
+    wolvesCentralControlMeans = [composeCentralControlMeans(observeListBaseOnNumInWe[numAgentsInWe - 3])(
+        weNumpyActorsListBaseOnNumInWe[numAgentsInWe - 3], numAgentsInWe) for numAgentsInWe in range(numWolves, numWolves + 1)]
+    getCommittedAgentsActionMeans = CacheCommittedAgentsActionMeansPerTick(
+        BatchPolicyForCommittedAgent(wolvesCentralControlMeans, getStateThirdPersonPerspective))
+    concernedAgentsIds = possibleWolvesIds
+    calCommittedAgentsPolicyLogLikelihoodBatch = CalCommittedAgentsContinuousPolicyLogLikelihoodBatch(concernedAgentsIds,
+                                                                                                      getCommittedAgentsActionMeans,
+                                                                                                      buildGaussian.logpdf,
+                                                                                                      rationalityBetaInInference)
+
+    randomActionSpace = [(5, 0), (3.5, 3.5), (0, 5), (-3.5, 3.5), (-5, 0), (-3.5, -3.5), (0, -5), (3.5, -3.5), (0, 0)]
+    randomPolicy = RandomPolicy(randomActionSpace)
+    softPolicyInInference = lambda distribution: distribution
+    getStateFirstPersonPerspective = lambda state, goalId, weIds, selfId: getStateOrActionFirstPersonPerspective(
+        state, goalId, weIds, selfId, blocksID)
+    policyForUncommittedAgentsInInference = PolicyForUncommittedAgent(possibleWolvesIds, randomPolicy,
+                                                                      softPolicyInInference,
+                                                                      getStateFirstPersonPerspective)
+    calUncommittedAgentsPolicyLikelihood = CalUncommittedAgentsPolicyLikelihood(possibleWolvesIds,
+                                                                                concernedAgentsIds,
+                                                                                policyForUncommittedAgentsInInference)
+    calJointLikelihood = lambda intention, state, perceivedAction: np.exp(
+        calJointLogLikelihoodBatch([intention], state, perceivedAction)[0])
+    calJointLogLikelihoodBatch = lambda intentions, state, perceivedAction: calCommittedAgentsPolicyLogLikelihoodBatch(intentions, state, perceivedAction) + \
+        np.log([calUncommittedAgentsPolicyLikelihood(intention, state, perceivedAction) for intention in intentions])
+
+    variablesForAllWolves = [[intentionSpace] for intentionSpace in intentionSpacesForAllWolves]
+    jointHypothesisSpaces = [pd.MultiIndex.from_product(variables, names=['intention']) for variables in
+                             variablesForAllWolves]
+    concernedHypothesisVariable = ['intention']
+    softPrior = SoftDistribution(priorDecayRate)
+    inferIntentionOneStepList = [InferOneStepLogSpace(jointHypothesisSpace, concernedHypothesisVariable, calJointLikelihood, softPrior,
+                                                      calJointLogLikelihoodBatch=calJointLogLikelihoodBatch) for jointHypothesisSpace in
+                                 jointHypothesisSpaces]
+    if inferenceBeamSize is not None:
+        inferIntentionOneStepList = [InferOneStepOnBeam(calJointLogLikelihoodBatch, softPrior, inferenceBeamSize, beamReexpandInterval)
+                                     for jointHypothesisSpace in jointHypothesisSpaces]
+
+    if numSheeps == 1:
+        inferIntentionOneStepList = [lambda prior, state, action: prior] * 3
+
+    adjustIntentionPriorGivenValueOfState = lambda state: 1
+    chooseIntention = sampleFromDistribution
+    updateIntentions = [UpdateIntention(intentionPrior, valuePriorEndTime, adjustIntentionPriorGivenValueOfState,
+                                        perceptAction, inferIntentionOneStep, chooseIntention, maxSteps=maxIntentionSteps)
+                        for intentionPrior, inferIntentionOneStep in
+                        zip(wolvesIntentionPriors, inferIntentionOneStepList)]
+
+    intentionResetAttributes = ['timeStep', 'lastState', 'lastAction', 'intentionPrior', 'formerIntentionPriors']
+    intentionResetAttributeValues = [
+        dict(zip(intentionResetAttributes, [0, None, None, intentionPrior, [intentionPrior]]))
+        for intentionPrior in wolvesIntentionPriors]
+    resetIntentions = ResetObjects(intentionResetAttributeValues, updateIntentions)
+    getIntentionDistributions = GetObjectsIntentionHistories('formerIntentionPriors', updateIntentions)
+    recordActionForUpdateIntention = RecordValuesForObjects(['lastAction'], updateIntentions)
+    return updateIntentions, getIntentionDistributions, recordActionForUpdateIntention, resetIntentions
+
+
+def buildInferIntentionOnRecordedTrial():
+    manipulatedVariables = OrderedDict()
+    manipulatedVariables['blockSize'] = [0]
+    manipulatedVariables['targetColorIndex'] = [[0], [0, 0], [0, 0, 0, 0]]
+    manipulatedVariables['sheepMaxSpeed'] = [0.7, 1.1, 1.5]
+
+    allUpdateIntentions = {}
+    allGetIntentionDistributions = {}
+    allRecordActionForUpdateIntention = {}
+    allResetIntenions = {}
+    for blockSize in manipulatedVariables['blockSize']:
+        for targetColorIndex in manipulatedVariables['targetColorIndex']:
+            for sheepMaxSpeed in manipulatedVariables['sheepMaxSpeed']:
+                numSheeps = len(targetColorIndex)
+                conditionKey = (numSheeps, sheepMaxSpeed, blockSize)
+                updateIntentions, getIntentionDistributions, recordActionForUpdateIntention, resetIntentions = \
+                    buildUpdateIntentionsOneCondition(numSheeps, sheepMaxSpeed, blockSize)
+                allUpdateIntentions.update({conditionKey: updateIntentions})
+                allGetIntentionDistributions.update({conditionKey: getIntentionDistributions})
+                allRecordActionForUpdateIntention.update({conditionKey: recordActionForUpdateIntention})
+                allResetIntenions.update({conditionKey: resetIntentions})
+
+    inferIntentionOnRecordedTrial = InferIntentionOnRecordedTrial(numWolves, inferenceInterval, allUpdateIntentions, allGetIntentionDistributions,
+                                                                  allRecordActionForUpdateIntention, allResetIntenions)
+    return inferIntentionOnRecordedTrial
+
+
+def main():
+    dirName = os.path.dirname(__file__)
+    fileFolder = os.path.join(dirName, '..', 'results', 'Expt 1 Data')
+    resultsDicPath = os.path.join(dirName, '..', 'results')
+    numWorkers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    experimentName = lambda prefix: prefix + '_deviationFor2DAction_' + str(deviationFor2DAction) \
+        + '_priorDecayRate_' + str(priorDecayRate) + '_betaInInference_' + str(rationalityBetaInInference)
+    trialResultsPath = os.path.join(resultsDicPath, 'offlineInferenceTrials')
+    if not os.path.exists(trialResultsPath):
+        os.makedirs(trialResultsPath)
+    getTrialSavePath = lambda prefix, trialIndex: os.path.join(trialResultsPath, experimentName(prefix) + '_trial' + str(trialIndex) + '.pickle')
+
+    runOfflineIntentionInference = RunOfflineIntentionInference(buildInferIntentionOnRecordedTrial, getTrialSavePath, numWorkers)
+    runOfflineIntentionInference(streamRecordedTrials(fileFolder))
+
+    # one pickle per subject, in the same list-of-trials layout the pygame replay wrote
+    for fileName in sorted(os.listdir(fileFolder)):
+        prefix, extension = os.path.splitext(fileName)
+        if extension == '.pickle':
+            numTrials = len(loadFromPickle(os.path.join(fileFolder, fileName)))
+            picklePath = os.path.join(resultsDicPath, experimentName(prefix)) + '.pickle'
+            saveToPickle(mergeTrialResults(getTrialSavePath, prefix, numTrials), picklePath)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-import numpy as np
 import random
+from src.mathTools.distribution import Categorical
 
 
 class MultiAgentSampleTrajectory:
@@ -107,21 +107,11 @@ class SampleTrajectoryTerminationProbability:
 
 
 def chooseGreedyAction(actionDist):
-    actions = list(actionDist.keys())
-    probs = list(actionDist.values())
-    maxIndices = np.argwhere(probs == np.max(probs)).flatten()
-    selectedIndex = np.random.choice(maxIndices)
-    selectedAction = actions[selectedIndex]
-    return selectedAction
+    return Categorical.fromDict(actionDist).argmax()
 
 
 def sampleAction(actionDist):
-    actions = list(actionDist.keys())
-    probs = list(actionDist.values())
-    normlizedProbs = [prob / sum(probs) for prob in probs]
-    selectedIndex = list(np.random.multinomial(1, normlizedProbs)).index(1)
-    selectedAction = actions[selectedIndex]
-    return selectedAction
+    return Categorical.fromDict(actionDist).sample()
 
 
 def getPairedTrajectory(agentsTrajectory):
@@ -16,26 +16,31 @@ class IsCollision:
         return True if dist < minDist + 0.0 else False
 
 
+class CollisionByChecker:
+    # wolf x sheep collision matrix from the injected isCollision; a collisionContext passed to the rewards replaces it
+    def __init__(self, isCollision, entitiesSizeList):
+        self.isCollision = isCollision
+        self.entitiesSizeList = entitiesSizeList
+
+    def __call__(self, nextState, wolvesID, sheepsID):
+        return np.array([[self.isCollision(nextState[wolfID], nextState[sheepID], self.entitiesSizeList[wolfID],
+                                           self.entitiesSizeList[sheepID]) for sheepID in sheepsID] for wolfID in wolvesID],
+                        dtype=bool).reshape(len(wolvesID), len(sheepsID))
+
+
 class RewardWolf:
-    def __init__(self, wolvesID, sheepsID, entitiesSizeList, isCollision, collisionReward):
+    def __init__(self, wolvesID, sheepsID, entitiesSizeList, isCollision, collisionReward, collisionContext=None):
         self.wolvesID = wolvesID
         self.sheepsID = sheepsID
         self.entitiesSizeList = entitiesSizeList
         self.isCollision = isCollision
         self.collisionReward = collisionReward
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            CollisionByChecker(isCollision, entitiesSizeList)
 
     def __call__(self, state, action, nextState):
-        wolfReward = 0
-
-        for wolfID in self.wolvesID:
-            wolfSize = self.entitiesSizeList[wolfID]
-            wolfNextState = nextState[wolfID]
-            for sheepID in self.sheepsID:
-                sheepSize = self.entitiesSizeList[sheepID]
-                sheepNextState = nextState[sheepID]
-
-                if self.isCollision(wolfNextState, sheepNextState, wolfSize, sheepSize):
-                    wolfReward += self.collisionReward
+        collision = self.collisionContext(nextState, self.wolvesID, self.sheepsID)
+        wolfReward = self.collisionReward * np.sum(collision)
         reward = [wolfReward] * len(self.wolvesID)
         if wolfReward > self.collisionReward:
             print(wolfReward)
@@ -64,7 +69,7 @@ class PunishForOutOfBound:
 
 class RewardSheep:
     def __init__(self, wolvesID, sheepsID, entitiesSizeList, getPosFromState, isCollision, punishForOutOfBound,
-                 collisionPunishment):
+                 collisionPunishment, collisionContext=None):
         self.wolvesID = wolvesID
         self.getPosFromState = getPosFromState
         self.entitiesSizeList = entitiesSizeList
@@ -72,28 +77,22 @@ class RewardSheep:
         self.isCollision = isCollision
         self.collisionPunishment = collisionPunishment
         self.punishForOutOfBound = punishForOutOfBound
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            CollisionByChecker(isCollision, entitiesSizeList)
 
     def __call__(self, state, action, nextState): #state, action not used
+        sheepsNumCollisions = np.sum(self.collisionContext(nextState, self.wolvesID, self.sheepsID), axis=0)
         reward = []
-        for sheepID in self.sheepsID:
-            sheepReward = 0
-            sheepNextState = nextState[sheepID]
-            sheepNextPos = self.getPosFromState(sheepNextState)
-            sheepSize = self.entitiesSizeList[sheepID]
-
-            sheepReward -= self.punishForOutOfBound(sheepNextPos)
-            for wolfID in self.wolvesID:
-                wolfSize = self.entitiesSizeList[wolfID]
-                wolfNextState = nextState[wolfID]
-                if self.isCollision(wolfNextState, sheepNextState, wolfSize, sheepSize):
-                    sheepReward -= self.collisionPunishment
+        for sheepID, sheepNumCollisions in zip(self.sheepsID, sheepsNumCollisions):
+            sheepNextPos = self.getPosFromState(nextState[sheepID])
+            sheepReward = 0 - self.punishForOutOfBound(sheepNextPos) - self.collisionPunishment * sheepNumCollisions
             reward.append(sheepReward)
 
         return reward
 
 class RewardCentralControlPunishBond:
     def __init__(self, agentsIDInCentralControl, competitorsID, entitiesSizeList, getPosFromState, isCollision, punishForOutOfBound,
-                 collisionReward):
+                 collisionReward, collisionContext=None):
         self.agentsIDInCentralControl = agentsIDInCentralControl
         self.getPosFromState = getPosFromState
         self.entitiesSizeList = entitiesSizeList
@@ -101,21 +100,15 @@ class RewardCentralControlPunishBond:
         self.isCollision = isCollision
         self.collisionReward = collisionReward
         self.punishForOutOfBound = punishForOutOfBound
+        self.collisionContext = collisionContext if collisionContext is not None else \
+            CollisionByChecker(isCollision, entitiesSizeList)
 
     def __call__(self, state, action, nextState): #state, action not used
+        agentsNumCollisions = np.sum(self.collisionContext(nextState, self.competitorsID, self.agentsIDInCentralControl), axis=0)
         reward = 0
-        for agentID in self.agentsIDInCentralControl:
-            agentReward = 0
-            agentNextState = nextState[agentID]
-            agentNextPos = self.getPosFromState(agentNextState)
-            agentSize = self.entitiesSizeList[agentID]
-
-            agentReward -= self.punishForOutOfBound(agentNextPos)
-            for competitorID in self.competitorsID:
-                competitorSize = self.entitiesSizeList[competitorID]
-                competitorNextState = nextState[competitorID]
-                if self.isCollision(competitorNextState, agentNextState, competitorSize, agentSize):
-                    agentReward += self.collisionReward
+        for agentID, agentNumCollisions in zip(self.agentsIDInCentralControl, agentsNumCollisions):
+            agentNextPos = self.getPosFromState(nextState[agentID])
+            agentReward = 0 - self.punishForOutOfBound(agentNextPos) + self.collisionReward * agentNumCollisions
             reward += agentReward
 
         return reward
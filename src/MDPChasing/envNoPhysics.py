@@ -144,3 +144,83 @@ class StayInBoundaryAndOutObstacleByReflectVelocity():
         checkedVelocity = np.array([adjustedVelX, adjustedVelY])
         return checkedPosition, checkedVelocity
 
+
+class StayInBoundaryAndOutObstacleByReflectVelocityVectorized():
+    def __init__(self, xBoundary, yBoundary, xObstacles=(), yObstacles=()):
+        self.boundaryMin = np.array([xBoundary[0], yBoundary[0]], dtype=float)
+        self.boundaryMax = np.array([xBoundary[1], yBoundary[1]], dtype=float)
+        self.obstaclesMin = np.array([[xObstacle[0], yObstacle[0]] for xObstacle, yObstacle in zip(xObstacles, yObstacles)], dtype=float).reshape(-1, 2)
+        self.obstaclesMax = np.array([[xObstacle[1], yObstacle[1]] for xObstacle, yObstacle in zip(xObstacles, yObstacles)], dtype=float).reshape(-1, 2)
+
+    def __call__(self, positions, velocities):
+        # positions, velocities: (..., numAgents, 2); later checks override earlier ones as in the per-agent version
+        positions = np.asarray(positions, dtype=float)
+        velocities = np.asarray(velocities, dtype=float)
+        checkedPositions, checkedVelocities = positions, velocities
+
+        def reflect(mask, mirror):
+            return np.where(mask, 2 * mirror - positions, checkedPositions), np.where(mask, -velocities, checkedVelocities)
+
+        checkedPositions, checkedVelocities = reflect(positions >= self.boundaryMax, self.boundaryMax)
+        checkedPositions, checkedVelocities = reflect(positions <= self.boundaryMin, self.boundaryMin)
+
+        if len(self.obstaclesMin) == 0:
+            return checkedPositions, checkedVelocities
+        inObstacles = np.all((positions[..., None, :] >= self.obstaclesMin) & (positions[..., None, :] <= self.obstaclesMax), axis=-1)
+        if not np.any(inObstacles):
+            return checkedPositions, checkedVelocities
+
+        previousPositions = positions - velocities
+        for obstacleIndex, (obstacleMin, obstacleMax) in enumerate(zip(self.obstaclesMin, self.obstaclesMax)):
+            inObstacle = inObstacles[..., obstacleIndex, None]
+            checkedPositions, checkedVelocities = reflect(inObstacle & (previousPositions <= obstacleMin), obstacleMin)
+            checkedPositions, checkedVelocities = reflect(inObstacle & (previousPositions >= obstacleMax), obstacleMax)
+
+        return checkedPositions, checkedVelocities
+
+class InterpolateOneFrameVectorized():
+    def __init__(self, stayInBoundaryByReflectVelocity):
+        self.stayInBoundaryByReflectVelocity = stayInBoundaryByReflectVelocity
+
+    def __call__(self, positions, velocities):
+        newPositions = np.asarray(positions, dtype=float) + np.asarray(velocities, dtype=float)
+        return self.stayInBoundaryByReflectVelocity(newPositions, velocities)
+
+class TransitWithTerminalCheckOfInterpolationVectorized:
+    def __init__(self, numFramesToInterpolate, interpolateOneFrame, isTerminal):
+        self.numFramesToInterpolate = numFramesToInterpolate
+        self.interpolateOneFrame = interpolateOneFrame
+        self.isTerminal = isTerminal
+
+    def __call__(self, state, action):
+        # state, action: (..., numAgents, 2); every batch element keeps the frame it first turned terminal on
+        state = np.asarray(state, dtype=float)
+        actionForInterpolation = np.asarray(action, dtype=float) / (self.numFramesToInterpolate + 1)
+        nextState = state
+        finished = np.zeros(state.shape[:-2], dtype=bool)
+        for frameIndex in range(self.numFramesToInterpolate + 1):
+            frameState, frameActionForInterpolation = self.interpolateOneFrame(state, actionForInterpolation)
+            nextState = np.where(finished[..., None, None], nextState, frameState)
+            finished = finished | self.isTerminal(frameState)
+            if np.all(finished):
+                break
+            state = frameState
+            actionForInterpolation = frameActionForInterpolation
+        return nextState
+
+class IsTerminalVectorized():
+    def __init__(self, minDistance, getPreyPos, getPredatorPos):
+        self.minDistance = minDistance
+        self.getPredatorPos = getPredatorPos
+        self.getPreyPos = getPreyPos
+
+    def __call__(self, state):
+        # one broadcast (..., numPreys, numPredators) distance matrix instead of a norm per pair
+        preyPositions = np.asarray(self.getPreyPos(state))
+        predatorPositions = np.asarray(self.getPredatorPos(state))
+        preyPositions = preyPositions[None] if preyPositions.ndim == 1 else preyPositions
+        predatorPositions = predatorPositions[None] if predatorPositions.ndim == 1 else predatorPositions
+        positionDiff = preyPositions[..., :, None, :] - predatorPositions[..., None, :, :]
+        L2NormDistance = np.sqrt(np.sum(positionDiff * positionDiff, axis=-1))
+        terminal = np.any(L2NormDistance <= self.minDistance, axis=(-2, -1))
+        return bool(terminal) if terminal.ndim == 0 else terminal
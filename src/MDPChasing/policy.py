@@ -2,6 +2,7 @@ import numpy as np
 import random
 import copy
 from scipy import stats
+from src.mathTools.distribution import Categorical
 
 def stationaryAgentPolicy(state):
     return {(0, 0): 1}
@@ -10,9 +11,10 @@ def stationaryAgentPolicy(state):
 class RandomPolicy:
     def __init__(self, actionSpace):
         self.actionSpace = actionSpace
+        self.actionDist = Categorical(actionSpace, np.full(len(actionSpace), 1 / len(actionSpace)))
 
     def __call__(self, state):
-        actionDist = {action: 1 / len(self.actionSpace) for action in self.actionSpace}
+        actionDist = self.actionDist.copy()
         return actionDist
 
 
@@ -64,7 +66,7 @@ class HeatSeekingDiscreteStochasticPolicy:
         heatseekingDirection = self.vecToAngle(heatseekingVector)
         pdf = np.array([stats.vonmises.pdf(heatseekingDirection - degree, self.assumePrecision) * 2 for degree in self.degreeList])
         normProb = pdf / pdf.sum()
-        actionDict = {action: prob for action, prob in zip(self.actionSpace, normProb)}
+        actionDict = Categorical(self.actionSpace, normProb)
         return actionDict
 
 
@@ -0,0 +1,122 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..'))
+
+import numpy as np
+import unittest
+from ddt import ddt, data, unpack
+
+from src.MDPChasing.envNoPhysics import StayInBoundaryAndOutObstacleByReflectVelocity, \
+    StayInBoundaryAndOutObstacleByReflectVelocityVectorized, InterpolateOneFrame, InterpolateOneFrameVectorized, \
+    TransitWithTerminalCheckOfInterpolation, TransitWithTerminalCheckOfInterpolationVectorized, IsTerminal, IsTerminalVectorized
+
+
+@ddt
+class TestNoPhysicsVectorizedParity(unittest.TestCase):
+    def setUp(self):
+        self.xBoundary = [0, 10]
+        self.yBoundary = [0, 10]
+        self.xObstacles = [[2, 4], [6, 8]]
+        self.yObstacles = [[2, 8], [3, 5]]
+        self.numStates = 3000
+        self.numAgents = 3
+        self.preyID = [0]
+        self.predatorsID = [1, 2]
+        self.minDistance = 0.5
+
+        getPreyPos = lambda state: np.asarray(state)[..., self.preyID, :]
+        getPredatorPos = lambda state: np.asarray(state)[..., self.predatorsID, :]
+        self.isTerminal = IsTerminal(self.minDistance, getPreyPos, getPredatorPos)
+        self.isTerminalVectorized = IsTerminalVectorized(self.minDistance, getPreyPos, getPredatorPos)
+
+    def buildStayInBoundaries(self, withObstacles):
+        xObstacles, yObstacles = (self.xObstacles, self.yObstacles) if withObstacles else ([], [])
+        stayInBoundary = StayInBoundaryAndOutObstacleByReflectVelocity(self.xBoundary, self.yBoundary, xObstacles, yObstacles)
+        stayInBoundaryVectorized = StayInBoundaryAndOutObstacleByReflectVelocityVectorized(self.xBoundary, self.yBoundary,
+                                                                                           xObstacles, yObstacles)
+        return stayInBoundary, stayInBoundaryVectorized
+
+    def buildTransits(self, numFramesToInterpolate):
+        stayInBoundary, stayInBoundaryVectorized = self.buildStayInBoundaries(withObstacles=True)
+        transit = TransitWithTerminalCheckOfInterpolation(numFramesToInterpolate, InterpolateOneFrame(stayInBoundary), self.isTerminal)
+        transitVectorized = TransitWithTerminalCheckOfInterpolationVectorized(numFramesToInterpolate,
+                                                                              InterpolateOneFrameVectorized(stayInBoundaryVectorized),
+                                                                              self.isTerminalVectorized)
+        return transit, transitVectorized
+
+    def sampleStatesAndActions(self, seed):
+        randomState = np.random.RandomState(seed)
+        states = randomState.uniform(0, 10, (self.numStates, self.numAgents, 2))
+        actions = randomState.uniform(-3, 3, (self.numStates, self.numAgents, 2))
+        return states, actions
+
+    @data((True, ), (False, ))
+    @unpack
+    def testStayInBoundaryMatchesPerAgentReflection(self, withObstacles):
+        stayInBoundary, stayInBoundaryVectorized = self.buildStayInBoundaries(withObstacles)
+        randomState = np.random.RandomState(21)
+        # positions after the move, partly outside the map and partly inside the obstacles
+        positions = randomState.uniform(-1, 11, (self.numStates, self.numAgents, 2))
+        velocities = randomState.uniform(-3, 3, (self.numStates, self.numAgents, 2))
+        checkedPositions, checkedVelocities = stayInBoundaryVectorized(positions, velocities)
+        self.assertEqual(checkedPositions.shape, positions.shape)
+
+        numInObstacles = 0
+        for statePositions, stateVelocities, stateCheckedPositions, stateCheckedVelocities in \
+                zip(positions, velocities, checkedPositions, checkedVelocities):
+            trueCheckedPositions, trueCheckedVelocities = zip(*[stayInBoundary(position, velocity)
+                                                                for position, velocity in zip(statePositions, stateVelocities)])
+            self.assertTrue(np.array_equal(stateCheckedPositions, np.array(trueCheckedPositions)))
+            self.assertTrue(np.array_equal(stateCheckedVelocities, np.array(trueCheckedVelocities)))
+            self.assertTrue(np.array_equal(stayInBoundaryVectorized(statePositions, stateVelocities)[0], stateCheckedPositions))
+            numInObstacles += sum([any(xMin <= x <= xMax and yMin <= y <= yMax for (xMin, xMax), (yMin, yMax)
+                                       in zip(self.xObstacles, self.yObstacles)) for x, y in statePositions])
+        self.assertGreater(numInObstacles, 100)
+
+    def testIsTerminalMatchesPairwiseNorm(self):
+        states, actions = self.sampleStatesAndActions(22)
+        trueTerminals = np.array([self.isTerminal(state) for state in states])
+        self.assertTrue(0 < np.sum(trueTerminals) < self.numStates)
+        self.assertEqual([self.isTerminalVectorized(state) for state in states], list(trueTerminals))
+        self.assertTrue(np.array_equal(self.isTerminalVectorized(states), trueTerminals))
+        self.assertTrue(np.array_equal(self.isTerminalVectorized(states.reshape(30, 100, self.numAgents, 2)), trueTerminals.reshape(30, 100)))
+
+    @data((0, ), (3, ), (8, ))
+    @unpack
+    def testTransitMatchesLoopTransit(self, numFramesToInterpolate):
+        transit, transitVectorized = self.buildTransits(numFramesToInterpolate)
+        states, actions = self.sampleStatesAndActions(23)
+        trueNextStates = np.array([transit(state, action) for state, action in zip(states, actions)])
+
+        for state, action, trueNextState in zip(states[:300], actions[:300], trueNextStates[:300]):
+            self.assertTrue(np.array_equal(transitVectorized(state, action), trueNextState))
+        self.assertTrue(np.array_equal(transitVectorized(states, actions), trueNextStates))
+        self.assertTrue(np.array_equal(transitVectorized(states.reshape(30, 100, self.numAgents, 2), actions.reshape(30, 100, self.numAgents, 2)),
+                                       trueNextStates.reshape(30, 100, self.numAgents, 2)))
+
+    def testBatchElementsStayAtTheirFirstTerminalFrame(self):
+        numFramesToInterpolate = 8
+        transit, transitVectorized = self.buildTransits(numFramesToInterpolate)
+        interpolateOneFrame = InterpolateOneFrameVectorized(StayInBoundaryAndOutObstacleByReflectVelocityVectorized(self.xBoundary, self.yBoundary,
+                                                                                                                  self.xObstacles, self.yObstacles))
+        states, actions = self.sampleStatesAndActions(24)
+        framesState = []
+        state, actionForInterpolation = states, actions / (numFramesToInterpolate + 1)
+        for frameIndex in range(numFramesToInterpolate + 1):
+            state, actionForInterpolation = interpolateOneFrame(state, actionForInterpolation)
+            framesState.append(state)
+        framesTerminal = np.array([self.isTerminalVectorized(frameState) for frameState in framesState])
+        firstTerminalFrames = np.where(np.any(framesTerminal, axis=0), np.argmax(framesTerminal, axis=0), numFramesToInterpolate)
+        trueNextStates = np.array([framesState[frameIndex][stateIndex] for stateIndex, frameIndex in enumerate(firstTerminalFrames)])
+
+        stoppedEarly = firstTerminalFrames < numFramesToInterpolate
+        self.assertGreater(np.sum(stoppedEarly), 0)
+        self.assertGreater(np.sum(~stoppedEarly), 0)
+        nextStates = transitVectorized(states, actions)
+        self.assertTrue(np.array_equal(nextStates, trueNextStates))
+        self.assertFalse(np.array_equal(nextStates[stoppedEarly], framesState[-1][stoppedEarly]))
+
+
+if __name__ == '__main__':
+    unittest.main()
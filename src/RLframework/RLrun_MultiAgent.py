@@ -3,6 +3,7 @@ import random
 import os
 os.environ['KMP_DUPLICATE_LIB_OK']='True'
 from collections import  deque
+from src.maddpg.trainer.agentsBatch import AgentsBatch
 
 def resetTargetParamToTrainParam(modelList):
     updatedModels = []
@@ -69,13 +70,28 @@ class SampleFromMemory:
         return sample
 
 
+class SampleBatchFromArrayBuffer:
+    def __init__(self, minibatchSize):
+        self.minibatchSize = minibatchSize
+
+    def __call__(self, arrayBuffer):
+        sampleIndex = np.random.randint(0, len(arrayBuffer), self.minibatchSize)
+        sample = arrayBuffer.getBatch(sampleIndex)
+
+        return sample
+
+
 class LearnFromBuffer:
     def __init__(self, learningStartBufferSize, sampleFromMemory, trainModels, learnInterval = 1):
         self.learningStartBufferSize = learningStartBufferSize
         self.sampleFromMemory = sampleFromMemory
         self.trainModels = trainModels
         self.learnInterval = learnInterval
-        self.getAgentBuffer = lambda buffer, id: [[bufferElement[id] for bufferElement in timeStepBuffer] for timeStepBuffer in buffer]
+
+    def getAgentBuffer(self, replayBuffer, agentID):
+        if isinstance(replayBuffer, ArrayReplayBuffer):
+            return replayBuffer.getAgentBuffer(agentID)
+        return [[bufferElement[agentID] for bufferElement in timeStepBuffer] for timeStepBuffer in replayBuffer]
 
     def __call__(self, replayBuffer, runTime, agentID = None):
         if runTime >= self.learningStartBufferSize and runTime % self.learnInterval == 0:
@@ -109,6 +125,66 @@ def getBuffer(bufferSize):
     return replayBuffer
 
 
+class ArrayReplayBuffer:
+    def __init__(self, bufferSize):
+        self.bufferSize = int(bufferSize)
+        self.columns = None
+        self.nextIndex = 0
+        self.size = 0
+
+    def allocate(self, timeStepBuffer):
+        # one (bufferSize, ...) column per field and agent, float32 like the model placeholders
+        self.columns = [[np.zeros((self.bufferSize, ) + np.shape(agentElement), dtype=np.float32) for agentElement in bufferElement]
+                        for bufferElement in timeStepBuffer]
+
+    def append(self, timeStepBuffer):
+        if self.columns is None:
+            self.allocate(timeStepBuffer)
+        for fieldColumns, bufferElement in zip(self.columns, timeStepBuffer):
+            for agentColumn, agentElement in zip(fieldColumns, bufferElement):
+                agentColumn[self.nextIndex] = agentElement
+        self.nextIndex = (self.nextIndex + 1) % self.bufferSize
+        self.size = min(self.size + 1, self.bufferSize)
+
+    def __len__(self):
+        return self.size
+
+    def getPosition(self, index):
+        # index 0 is the oldest time step, as in a full deque
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('replay buffer index out of range')
+        return (self.nextIndex - self.size + index) % self.bufferSize
+
+    def __getitem__(self, index):
+        position = self.getPosition(index)
+        return tuple([agentColumn[position] for agentColumn in fieldColumns] for fieldColumns in self.columns)
+
+    def getBatch(self, sampleIndex):
+        # sampling is uniform over the filled slots, so storage positions are sampled directly
+        return tuple(AgentsBatch(agentColumn[sampleIndex] for agentColumn in fieldColumns) for fieldColumns in self.columns)
+
+    def getAgentBuffer(self, agentID):
+        return AgentArrayReplayBufferView(self, agentID)
+
+
+class AgentArrayReplayBufferView:
+    def __init__(self, arrayBuffer, agentID):
+        self.arrayBuffer = arrayBuffer
+        self.agentID = agentID
+
+    def __len__(self):
+        return len(self.arrayBuffer)
+
+    def __getitem__(self, index):
+        position = self.arrayBuffer.getPosition(index)
+        return tuple(fieldColumns[self.agentID][position] for fieldColumns in self.arrayBuffer.columns)
+
+    def getBatch(self, sampleIndex):
+        return tuple(fieldColumns[self.agentID][sampleIndex] for fieldColumns in self.arrayBuffer.columns)
+
+
 class RunTimeStep:
     def __init__(self, actOneStep, sampleOneStep, learnFromBuffer, observe = None):
         self.actOneStep = actOneStep
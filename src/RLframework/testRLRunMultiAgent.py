@@ -0,0 +1,84 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..'))
+
+import numpy as np
+import unittest
+from ddt import ddt, data, unpack
+
+from src.RLframework.RLrun_MultiAgent import getBuffer, LearnFromBuffer, ArrayReplayBuffer, SampleBatchFromArrayBuffer
+from src.maddpg.trainer.agentsBatch import AgentsBatch
+
+
+@ddt
+class TestArrayReplayBuffer(unittest.TestCase):
+    def setUp(self):
+        self.numAgents = 3
+        self.obsDim = 4
+        self.getAgentBuffer = LearnFromBuffer(0, None, None).getAgentBuffer
+
+    def sampleTimeStep(self, randomState):
+        # (observations, actions, rewards, nextObservations), one element per agent, as appended by RunTimeStep
+        observations = list(randomState.uniform(-1, 1, (self.numAgents, self.obsDim)).astype(np.float32))
+        actions = list(randomState.uniform(0, 1, (self.numAgents, 5)).astype(np.float32))
+        rewards = list(randomState.uniform(-1, 1, self.numAgents).astype(np.float32))
+        nextObservations = list(randomState.uniform(-1, 1, (self.numAgents, self.obsDim)).astype(np.float32))
+        return (observations, actions, rewards, nextObservations)
+
+    def fillBuffers(self, bufferSize, numTimeSteps):
+        randomState = np.random.RandomState(9)
+        dequeBuffer = getBuffer(bufferSize)
+        arrayBuffer = ArrayReplayBuffer(bufferSize)
+        for _ in range(numTimeSteps):
+            timeStep = self.sampleTimeStep(randomState)
+            dequeBuffer.append(timeStep)
+            arrayBuffer.append(timeStep)
+        return dequeBuffer, arrayBuffer
+
+    @data((5, 3), (5, 5), (5, 12), (100, 257))
+    @unpack
+    def testTimeStepsMatchDequeBuffer(self, bufferSize, numTimeSteps):
+        dequeBuffer, arrayBuffer = self.fillBuffers(bufferSize, numTimeSteps)
+        self.assertEqual(len(arrayBuffer), len(dequeBuffer))
+        for index in list(range(len(dequeBuffer))) + [-1]:
+            for arrayField, dequeField in zip(arrayBuffer[index], dequeBuffer[index]):
+                self.assertTrue(np.array_equal(np.array(arrayField), np.array(dequeField)))
+
+    @data((5, 3), (5, 12), (100, 257))
+    @unpack
+    def testAgentBufferMatchesDequeAgentBuffer(self, bufferSize, numTimeSteps):
+        dequeBuffer, arrayBuffer = self.fillBuffers(bufferSize, numTimeSteps)
+        for agentID in range(self.numAgents):
+            dequeAgentBuffer = self.getAgentBuffer(dequeBuffer, agentID)
+            arrayAgentBuffer = self.getAgentBuffer(arrayBuffer, agentID)
+            self.assertEqual(len(arrayAgentBuffer), len(dequeAgentBuffer))
+            for index in range(len(dequeAgentBuffer)):
+                for arrayElement, dequeElement in zip(arrayAgentBuffer[index], dequeAgentBuffer[index]):
+                    self.assertTrue(np.array_equal(arrayElement, dequeElement))
+
+    @data((5, 3), (5, 12), (100, 257))
+    @unpack
+    def testBatchStacksDequeTimeStepsPerAgent(self, bufferSize, numTimeSteps):
+        dequeBuffer, arrayBuffer = self.fillBuffers(bufferSize, numTimeSteps)
+        np.random.seed(10)
+        miniBatch = SampleBatchFromArrayBuffer(32)(arrayBuffer)
+        np.random.seed(10)
+        sampleIndex = np.random.randint(0, len(arrayBuffer), 32)
+        # storage positions map to deque indexes by the ring offset
+        dequeIndex = [(position - arrayBuffer.getPosition(0)) % bufferSize for position in sampleIndex]
+        for fieldID, fieldBatch in enumerate(miniBatch):
+            self.assertIsInstance(fieldBatch, AgentsBatch)
+            self.assertEqual(len(fieldBatch), self.numAgents)
+            for agentID, agentBatch in enumerate(fieldBatch):
+                trueAgentBatch = np.array([dequeBuffer[index][fieldID][agentID] for index in dequeIndex])
+                self.assertTrue(np.array_equal(agentBatch, trueAgentBatch))
+
+    def testIndexOutOfRange(self):
+        dequeBuffer, arrayBuffer = self.fillBuffers(5, 3)
+        with self.assertRaises(IndexError):
+            arrayBuffer[3]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,7 +24,8 @@ class GetSavePath:
 def saveVariables(model, path):
     graph = model.graph
     saver = graph.get_collection_ref("saver")[0]
-    saver.save(model, path)
+    # tf.train.Saver only accepts a real session, not an agent model of a shared session
+    saver.save(getattr(model, 'sharedSession', model), path)
     print("Model saved in {}".format(path))
 
 
@@ -42,7 +43,7 @@ def loadFromPickle(path):
 def restoreVariables(model, path):
     graph = model.graph
     saver = graph.get_collection_ref("saver")[0]
-    saver.restore(model, path)
+    saver.restore(getattr(model, 'sharedSession', model), path)
     print("Model restored from {}".format(path))
     return model
 
@@ -1,4 +1,5 @@
 import numpy as np
+import collections as co
 
 class PolicyForUncommittedAgent:
     def __init__(self, allAgentsIdsWholeGroup, uncommittedPolicy, softDistribution, getAgentsStatesForPolicy):
@@ -32,6 +33,68 @@ class PolicyForCommittedAgent:
         #print(actionDistribution[0].mean, actionDistribution[1].mean)
         return softenActionDistribution
 
+class BatchPolicyForCommittedAgent:
+    def __init__(self, policyMeansListBasedOnNumAgentsInWe, getAgentsStatesForPolicy, numOfAgentInPolicyFunctionList = [3]):
+        self.policyMeansListBasedOnNumAgentsInWe = policyMeansListBasedOnNumAgentsInWe
+        self.getAgentsStatesForPolicy = getAgentsStatesForPolicy
+        self.numOfAgentInPolicyFunctionList = numOfAgentInPolicyFunctionList
+
+    def calMeansOfStateIntentionPairs(self, stateIntentionPairs):
+        # pairs sharing a we-size are stacked into one batch, so each actor runs once per size
+        pairIndexesBasedOnNumAgentsInWe = {}
+        for pairIndex, (state, (goalId, weIds)) in enumerate(stateIntentionPairs):
+            pairIndexesBasedOnNumAgentsInWe.setdefault(len(weIds), []).append(pairIndex)
+
+        jointActionMeans = [None] * len(stateIntentionPairs)
+        for numAgentsInWe, pairIndexes in pairIndexesBasedOnNumAgentsInWe.items():
+            policyFunctionIndexInList = self.numOfAgentInPolicyFunctionList.index(numAgentsInWe)
+            policyMeans = self.policyMeansListBasedOnNumAgentsInWe[policyFunctionIndexInList]
+            relativeAgentsStatesForPolicy = np.array([self.getAgentsStatesForPolicy(stateIntentionPairs[pairIndex][0], *stateIntentionPairs[pairIndex][1])
+                                                      for pairIndex in pairIndexes])
+            for pairIndex, means in zip(pairIndexes, policyMeans(relativeAgentsStatesForPolicy)):
+                jointActionMeans[pairIndex] = means
+        return jointActionMeans
+
+    def __call__(self, state, intentions):
+        return self.calMeansOfStateIntentionPairs([(state, intention) for intention in intentions])
+
+    def onTrajectory(self, states, intentions):
+        # every (timestep, intention) pair goes through the actors together; returns means indexed [timestep][intention]
+        jointActionMeans = self.calMeansOfStateIntentionPairs([(state, intention) for state in states for intention in intentions])
+        return [jointActionMeans[timeStep * len(intentions): (timeStep + 1) * len(intentions)] for timeStep in range(len(states))]
+
+class CacheCommittedAgentsActionMeansPerTick:
+    def __init__(self, policyMeansForCommittedAgentBatch, numStatesToKeep = 2):
+        self.policyMeansForCommittedAgentBatch = policyMeansForCommittedAgentBatch
+        self.numStatesToKeep = numStatesToKeep
+        self.actionMeansBasedOnState = co.OrderedDict()
+
+    def __call__(self, state, intentions):
+        # inference scores the last tick's state while planning acts on the current one, so the two newest states are kept
+        stateArray = np.asarray(state)
+        stateKey = (stateArray.shape, stateArray.tobytes())
+        if stateKey not in self.actionMeansBasedOnState:
+            self.actionMeansBasedOnState[stateKey] = {}
+            while len(self.actionMeansBasedOnState) > self.numStatesToKeep:
+                self.actionMeansBasedOnState.popitem(last = False)
+        actionMeansBasedOnIntention = self.actionMeansBasedOnState[stateKey]
+
+        intentionKeys = [(goalId, tuple(weIds)) for goalId, weIds in intentions]
+        missingIntentionKeys = list(dict.fromkeys([key for key in intentionKeys if key not in actionMeansBasedOnIntention]))
+        if len(missingIntentionKeys) > 0:
+            missingActionMeans = self.policyMeansForCommittedAgentBatch(state, missingIntentionKeys)
+            actionMeansBasedOnIntention.update(zip(missingIntentionKeys, missingActionMeans))
+        return [actionMeansBasedOnIntention[key] for key in intentionKeys]
+
+class PolicyForCommittedAgentFromActionMeans:
+    def __init__(self, getCommittedAgentsActionMeans, buildGaussian):
+        self.getCommittedAgentsActionMeans = getCommittedAgentsActionMeans
+        self.buildGaussian = buildGaussian
+
+    def __call__(self, state, goalId, weIds):
+        jointActionMeans = self.getCommittedAgentsActionMeans(state, [(goalId, weIds)])[0]
+        return [self.buildGaussian(tuple(actionMean)) for actionMean in jointActionMeans]
+
 class GetActionFromJointActionDistribution:
     def __init__(self, chooseActionMethod, getActionIndex):
         self.chooseActionMethod = chooseActionMethod
@@ -104,6 +167,25 @@ class SampleActionOnChangableIntention:
         return individualAction
 
 
+class SampleTeamActionOnChangableIntention:
+    def __init__(self, updateIntentions, sampleIndividualActionGivenIntentionList, getCommittedAgentsActionMeans, selfIds):
+        self.updateIntentions = updateIntentions
+        self.sampleIndividualActionGivenIntentionList = sampleIndividualActionGivenIntentionList
+        self.getCommittedAgentsActionMeans = getCommittedAgentsActionMeans
+        self.selfIds = selfIds
+
+    def __call__(self, state):
+        intentions = [updateIntention(state) for updateIntention in self.updateIntentions]
+        # distinct committed intentions of the whole team go through the actors in one stacked batch;
+        # the per-wolf samplers then read their means from the same per-tick cache
+        committedIntentions = [intention for selfId, intention in zip(self.selfIds, intentions) if selfId in list(intention[1])]
+        if len(committedIntentions) > 0:
+            self.getCommittedAgentsActionMeans(state, committedIntentions)
+        teamAction = [sampleIndividualActionGivenIntention(state, intention) for sampleIndividualActionGivenIntention, intention
+                      in zip(self.sampleIndividualActionGivenIntentionList, intentions)]
+        return teamAction
+
+
 class GetIntensionOnChangableIntention:
     def __init__(self, updateIntention, sampleIndividualActionGivenIntention):
         self.updateIntention= updateIntention
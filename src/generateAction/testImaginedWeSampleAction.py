@@ -0,0 +1,112 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..'))
+
+import numpy as np
+import itertools as it
+import unittest
+from ddt import ddt, data, unpack
+
+from src.generateAction.imaginedWeSampleAction import PolicyForCommittedAgent, BatchPolicyForCommittedAgent, \
+    CacheCommittedAgentsActionMeansPerTick, PolicyForCommittedAgentFromActionMeans
+from src.inference.inference import CalCommittedAgentsContinuousPolicyLikelihood, CalCommittedAgentsContinuousPolicyLogLikelihoodBatch
+from src.maddpg.trainer.numpyActor import NumpyActor, actByNumpyPolicyTrainNoNoisy
+from src.mathTools.distribution import BuildGaussianFixCovWithCholesky
+from src.MDPChasing.state import getStateOrActionThirdPersonPerspective
+from env.multiAgentEnv import ObserveAllAgentsWithCaughtHistory, ReshapeHumanAction, \
+    ComposeCentralControlPolicyByGaussianOnDeterministicAction, ComposeCentralControlMeansBatch
+
+
+@ddt
+class TestCacheCommittedAgentsActionMeansPerTick(unittest.TestCase):
+    def setUp(self):
+        self.wolvesID = [0, 1, 2]
+        self.sheepsID = [3, 4, 5, 6]
+        self.intentions = list(it.product(self.sheepsID, [tuple(self.wolvesID)]))
+        randomState = np.random.RandomState(51)
+        # the we is observed in the third-person frame: wolves 0, 1, 2 and the goal sheep
+        observe = ObserveAllAgentsWithCaughtHistory(self.wolvesID, self.wolvesID, [3], [])
+        layersDims = [13, 16, 5]
+        actors = [NumpyActor(agentID, [randomState.normal(0, 0.5, dims).astype(np.float32) for dims in zip(layersDims[:-1], layersDims[1:])],
+                             [randomState.normal(0, 0.1, outputDim).astype(np.float32) for outputDim in layersDims[1:]], 1)
+                  for agentID in self.wolvesID]
+        reshapeAction = ReshapeHumanAction()
+        self.buildGaussian = BuildGaussianFixCovWithCholesky([0.5 ** 2, 0.5 ** 2])
+        getStateThirdPersonPerspective = lambda state, goalId, weIds: getStateOrActionThirdPersonPerspective(state, goalId, weIds)
+
+        actOneStepOneModel = lambda actor, observation: actByNumpyPolicyTrainNoNoisy(actor, np.array(observation)[None])[0]
+        centralControlPolicy = ComposeCentralControlPolicyByGaussianOnDeterministicAction(reshapeAction, observe, actOneStepOneModel,
+                                                                                          self.buildGaussian)(actors, len(self.wolvesID))
+        self.policyForCommittedAgent = PolicyForCommittedAgent([centralControlPolicy], lambda distribution: distribution,
+                                                               getStateThirdPersonPerspective)
+
+        centralControlMeans = ComposeCentralControlMeansBatch(reshapeAction, observe, actByNumpyPolicyTrainNoNoisy)(actors, len(self.wolvesID))
+        batchPolicyForCommittedAgent = BatchPolicyForCommittedAgent([centralControlMeans], getStateThirdPersonPerspective)
+        self.requestedIntentions = []
+
+        def policyMeansForCommittedAgentBatch(state, intentions):
+            self.requestedIntentions.append(list(intentions))
+            return batchPolicyForCommittedAgent(state, intentions)
+        self.getCommittedAgentsActionMeans = CacheCommittedAgentsActionMeansPerTick(policyMeansForCommittedAgentBatch)
+        self.states = [self.sampleState(randomState) for _ in range(6)]
+
+    def sampleState(self, randomState):
+        state = randomState.uniform(-1, 1, (len(self.wolvesID) + len(self.sheepsID), 5))
+        state[:, 4] = randomState.randint(0, 7, len(state))
+        return state.astype(np.float32)
+
+    def testPlanningGaussiansMatchUncachedPolicy(self):
+        policyFromActionMeans = PolicyForCommittedAgentFromActionMeans(self.getCommittedAgentsActionMeans, self.buildGaussian)
+        for state, (goalId, weIds) in it.product(self.states, self.intentions):
+            jointActionDistribution = policyFromActionMeans(state, goalId, weIds)
+            trueJointActionDistribution = self.policyForCommittedAgent(state, goalId, weIds)
+            self.assertEqual(len(jointActionDistribution), len(trueJointActionDistribution))
+            for distribution, trueDistribution in zip(jointActionDistribution, trueJointActionDistribution):
+                self.assertTrue(np.allclose(distribution.mean, trueDistribution.mean, rtol=1e-5, atol=1e-6))
+                self.assertTrue(np.allclose(distribution.pdf(trueDistribution.mean), trueDistribution.pdf(trueDistribution.mean)))
+
+    @data((1, ), (0.5, ))
+    @unpack
+    def testInferenceLikelihoodMatchesUncachedPolicy(self, rationalityBeta):
+        concernedAgentsIds = [1, 2]
+        calLikelihood = CalCommittedAgentsContinuousPolicyLikelihood(concernedAgentsIds, self.policyForCommittedAgent, rationalityBeta)
+        calLogLikelihoodBatch = CalCommittedAgentsContinuousPolicyLogLikelihoodBatch(concernedAgentsIds, self.getCommittedAgentsActionMeans,
+                                                                                     self.buildGaussian.logpdf, rationalityBeta)
+        randomState = np.random.RandomState(52)
+        for state in self.states:
+            perceivedAction = randomState.uniform(-5, 5, (len(self.wolvesID), 2))
+            logLikelihoods = calLogLikelihoodBatch(self.intentions, state, perceivedAction)
+            trueLikelihoods = [calLikelihood(intention, state, perceivedAction) for intention in self.intentions]
+            self.assertTrue(np.allclose(logLikelihoods, np.log(trueLikelihoods), rtol=1e-5, atol=1e-5))
+
+    def testMeansAreComputedOncePerStateAndIntention(self):
+        state, nextState = self.states[:2]
+        # every wolf infers on the last state and plans on the current one within a tick
+        for wolfId in self.wolvesID:
+            self.getCommittedAgentsActionMeans(state, self.intentions)
+            self.getCommittedAgentsActionMeans(nextState, self.intentions[::-1])
+        self.assertEqual(self.requestedIntentions, [self.intentions, self.intentions[::-1]])
+
+        self.getCommittedAgentsActionMeans(state, self.intentions[:1] * 3)
+        self.assertEqual(len(self.requestedIntentions), 2)
+        self.assertEqual(len(self.getCommittedAgentsActionMeans(state, self.intentions[:1] * 3)), 3)
+
+    def testOldestStateIsEvicted(self):
+        cachedMeans = self.getCommittedAgentsActionMeans(self.states[0], self.intentions)
+        self.getCommittedAgentsActionMeans(self.states[1], self.intentions[:2])
+        self.getCommittedAgentsActionMeans(self.states[2], self.intentions[:2])
+        self.assertEqual(len(self.getCommittedAgentsActionMeans.actionMeansBasedOnState), 2)
+        self.requestedIntentions.clear()
+        recomputedMeans = self.getCommittedAgentsActionMeans(self.states[0], self.intentions)
+        self.assertEqual(self.requestedIntentions, [self.intentions])
+        self.assertTrue(np.array_equal(np.array(recomputedMeans), np.array(cachedMeans)))
+
+        # a state equal in value to a cached one hits the cache
+        self.requestedIntentions.clear()
+        self.getCommittedAgentsActionMeans(self.states[0].copy(), self.intentions)
+        self.assertEqual(self.requestedIntentions, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ import os
 import sys
 sys.path.append(os.path.join(os.path.join(os.path.dirname(__file__), '..')))
 from src.sheepPolicy import GenerateModel, ApproximatePolicy, restoreVariables
+from src.mathTools.distribution import IndexedJointActionSpace
 
 
 class StayInBoundaryByReflectVelocity():
@@ -153,6 +154,21 @@ class GetCenterControlPolicyLikelihood:
         return likelihoodList
 
 
+class GetCenterControlPolicyLikelihoodMatrix:
+    def __init__(self, centerControlPolicy, indexedWeActionSpace):
+        self.centerControlPolicy = centerControlPolicy
+        self.indexedWeActionSpace = indexedWeActionSpace
+
+    def __call__(self, state):
+        # (numGoals, numWeActions), columns in the order of indexedWeActionSpace.jointActionSpace
+        sheepStates, wolvesState = state
+        wolfState1, wolfState2 = wolvesState
+
+        likelihoodMatrix = np.array([self.indexedWeActionSpace.toProbabilities(self.centerControlPolicy[sheepState, wolfState1, wolfState2])
+                                     for sheepState in sheepStates])
+        return likelihoodMatrix
+
+
 class InferWeWithoutAction:
     def __init__(self, getTransitionLikelihood, getPolicyLikelihoodList, weActionSpace):
         self.getTransitionLikelihood = getTransitionLikelihood
@@ -171,6 +187,24 @@ class InferWeWithoutAction:
         return posterior
 
 
+class InferWeWithoutActionIndexed:
+    def __init__(self, getTransitionLikelihood, getPolicyLikelihoodMatrix, indexedWeActionSpace):
+        self.getTransitionLikelihood = getTransitionLikelihood
+        self.getPolicyLikelihoodMatrix = getPolicyLikelihoodMatrix
+        self.indexedWeActionSpace = indexedWeActionSpace
+
+    def __call__(self, state, nextState, prior):
+        # same posterior as InferWeWithoutAction, the policy is read once per goal instead of once per goal and action
+        transitionLikelihoods = np.array([self.getTransitionLikelihood(state, action, nextState) for action in self.indexedWeActionSpace.jointActionSpace])
+        likelihoodActionsIntegratedOut = self.getPolicyLikelihoodMatrix(state) @ transitionLikelihoods
+
+        posteriorUnnormalized = np.array(prior) * likelihoodActionsIntegratedOut
+        evidence = np.sum(posteriorUnnormalized)
+
+        posterior = list(posteriorUnnormalized / evidence)
+        return posterior
+
+
 class InferCommitmentAndDraw:
     def __init__(self,):
         self.inferOneStep = inferOneStep
@@ -233,8 +267,9 @@ if __name__ == '__main__':
     unpackCenterControlAction = UnpackCenterControlAction(centerControlIndexList)
     transitAgents = TransiteForNoPhysicsWithCenterControlAction(stayInBoundaryByReflectVelocity, unpackCenterControlAction)
     getTransitionLikelihood = GetTransitionLikelihood(transitAgents)
-    getPolicyLikelihoodList = GetCenterControlPolicyLikelihood(centerControlPolicy)
-    inferGoalWithoutAction = InferWeWithoutAction(getTransitionLikelihood, getPolicyLikelihoodList, wolvesActionSpace)
+    indexedWolvesActionSpace = IndexedJointActionSpace(wolvesActionSpace)
+    getPolicyLikelihoodMatrix = GetCenterControlPolicyLikelihoodMatrix(centerControlPolicy, indexedWolvesActionSpace)
+    inferGoalWithoutAction = InferWeWithoutActionIndexed(getTransitionLikelihood, getPolicyLikelihoodMatrix, indexedWolvesActionSpace)
 
     import numpy as np
     import matplotlib.pyplot as plt
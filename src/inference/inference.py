@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+from scipy.special import logsumexp
 
 class CalUncommittedAgentsPolicyLikelihood:
     def __init__(self, allAgentsIdsWholeGroup, concernedAgentsIds, policyForUncommittedAgent):
@@ -17,7 +18,7 @@ class CalUncommittedAgentsPolicyLikelihood:
         else:
             uncommittedActionDistributions = [self.policyForUncommittedAgent(state, goalId, uncommittedAgentIds[index]) 
                     for index in range(len(uncommittedAgentIds))]
-            uncommittedAgentsPolicyLikelihood = np.product([actionDistribution[tuple(percivedAction[Id])]
+            uncommittedAgentsPolicyLikelihood = np.prod([actionDistribution[tuple(percivedAction[Id])]
                     for actionDistribution, Id in zip(uncommittedActionDistributions, uncommittedAgentIds)])
         return uncommittedAgentsPolicyLikelihood
 
@@ -46,6 +47,30 @@ class CalCommittedAgentsPolicyLikelihood:
             committedAgentsPolicyLikelihood = marginalLikelihood[jointAction]
         return committedAgentsPolicyLikelihood
 
+class CalCommittedAgentsPolicyLikelihoodIndexed:
+    def __init__(self, concernedAgentsIds, policyForCommittedAgent, indexedJointActionSpaceList, numOfAgentInPolicyFunctionList = [3]):
+        self.concernedAgentsIds = concernedAgentsIds
+        self.policyForCommittedAgent = policyForCommittedAgent
+        self.indexedJointActionSpaceList = indexedJointActionSpaceList
+        self.numOfAgentInPolicyFunctionList = numOfAgentInPolicyFunctionList
+
+    def __call__(self, intention, state, percivedAction):
+        goalId, weIds = intention
+        committedAgentIds = [Id for Id in list(weIds) if Id in self.concernedAgentsIds]
+
+        if len(committedAgentIds) == 0:
+            committedAgentsPolicyLikelihood = 1
+        else:
+            indexedJointActionSpace = self.indexedJointActionSpaceList[self.numOfAgentInPolicyFunctionList.index(len(weIds))]
+            committedAgentPositions = tuple(list(weIds).index(Id) for Id in committedAgentIds)
+            jointActionDistribution = self.policyForCommittedAgent(state, goalId, weIds)
+            jointProbabilities = indexedJointActionSpace.toProbabilities(jointActionDistribution)
+            marginalLikelihood = indexedJointActionSpace.marginalize(jointProbabilities, committedAgentPositions)
+            committedActions = [percivedAction[Id] for Id in committedAgentIds]
+            committedAgentsPolicyLikelihood = marginalLikelihood[
+                indexedJointActionSpace.getMarginalActionIndex(committedActions, committedAgentPositions)]
+        return committedAgentsPolicyLikelihood
+
 class CalCommittedAgentsContinuousPolicyLikelihood:
     def __init__(self, concernedAgentsIds, policyForCommittedAgent, rationalityBeta):
         self.concernedAgentsIds = concernedAgentsIds
@@ -62,9 +87,34 @@ class CalCommittedAgentsContinuousPolicyLikelihood:
             jointActionDistribution = self.policyForCommittedAgent(state, goalId, weIds)
             jointAction = np.array(percivedAction)[list(committedAgentIds)]
             pdfs = [individualDistribution.pdf(action) for individualDistribution, action in zip(jointActionDistribution, jointAction)]
-            committedAgentsPolicyLikelihood = np.power(np.product(pdfs), self.rationalityBeta)
+            committedAgentsPolicyLikelihood = np.power(np.prod(pdfs), self.rationalityBeta)
         return committedAgentsPolicyLikelihood
 
+class CalCommittedAgentsContinuousPolicyLogLikelihoodBatch:
+    def __init__(self, concernedAgentsIds, policyForCommittedAgentBatch, calGaussianLogPdf, rationalityBeta):
+        self.concernedAgentsIds = concernedAgentsIds
+        self.policyForCommittedAgentBatch = policyForCommittedAgentBatch
+        self.calGaussianLogPdf = calGaussianLogPdf
+        self.rationalityBeta = rationalityBeta
+
+    def __call__(self, intentions, state, percivedAction):
+        committedAgentIdsList = [[Id for Id in list(weIds) if Id in self.concernedAgentsIds] for goalId, weIds in intentions]
+        committedIntentionIndexes = [index for index, committedAgentIds in enumerate(committedAgentIdsList) if len(committedAgentIds) > 0]
+        logLikelihoods = np.zeros(len(intentions))
+        if len(committedIntentionIndexes) == 0:
+            return logLikelihoods
+
+        jointActionMeans = self.policyForCommittedAgentBatch(state, [intentions[index] for index in committedIntentionIndexes])
+        # as in the per-intention version, the k-th committed agent is scored by the k-th action distribution
+        percivedAction = np.array(percivedAction)
+        actions = np.concatenate([percivedAction[committedAgentIdsList[index]] for index in committedIntentionIndexes])
+        means = np.concatenate([jointMeans[:len(committedAgentIdsList[index])]
+                                for index, jointMeans in zip(committedIntentionIndexes, jointActionMeans)])
+        pairIntentionIndexes = np.concatenate([[index] * len(committedAgentIdsList[index]) for index in committedIntentionIndexes])
+        logPdfs = self.calGaussianLogPdf(actions, means)
+        logLikelihoods += self.rationalityBeta * np.bincount(pairIntentionIndexes, weights=logPdfs, minlength=len(intentions))
+        return logLikelihoods
+
 class InferOneStep:
     def __init__(self, jointHypothesisSpace, concernedHypothesisVariable, calJointLikelihood, softPrior):
         self.jointHypothesisSpace = jointHypothesisSpace
@@ -111,11 +161,216 @@ class InferOneStepWithActionNoise:
         #print(normalizedPosterior)
         return normalizedPosterior
 
+class MarginalizeHypothesisSpace:
+    def __init__(self, jointHypothesisSpace, concernedHypothesisVariable):
+        self.levelValues = {name: list(jointHypothesisSpace.get_level_values(name)) for name in jointHypothesisSpace.names}
+        self.numJointHypotheses = len(jointHypothesisSpace)
+        if len(concernedHypothesisVariable) == 1:
+            concernedKeys = self.levelValues[concernedHypothesisVariable[0]]
+        else:
+            concernedKeys = list(zip(*[self.levelValues[name] for name in concernedHypothesisVariable]))
+        self.concernedKeys = concernedKeys
+        self.marginalIndexCache = {}
+
+    def getMarginalIndex(self, keys):
+        # index of every joint hypothesis into the given ordering of the concerned keys, built once per ordering
+        keys = tuple(keys)
+        if keys not in self.marginalIndexCache:
+            keyIndex = {key: index for index, key in enumerate(keys)}
+            self.marginalIndexCache[keys] = np.array([keyIndex[key] for key in self.concernedKeys])
+        return self.marginalIndexCache[keys]
+
+    def __call__(self, jointLogLikelihood, keys):
+        marginalIndex = self.getMarginalIndex(keys)
+        maxLogLikelihood = np.max(jointLogLikelihood)
+        if not np.isfinite(maxLogLikelihood):
+            return np.full(len(keys), maxLogLikelihood)
+        with np.errstate(divide='ignore'):
+            marginalLogLikelihood = np.log(np.bincount(marginalIndex, weights=np.exp(jointLogLikelihood - maxLogLikelihood),
+                                                       minlength=len(keys))) + maxLogLikelihood
+        return marginalLogLikelihood
+
+
+def logSoftenPrior(logPrior, softParameter):
+    softenLogPrior = softParameter * logPrior
+    return softenLogPrior - logsumexp(softenLogPrior)
+
+
+def normalizeLogProbabilities(unnormalizedLogProbabilities):
+    return unnormalizedLogProbabilities - logsumexp(unnormalizedLogProbabilities)
+
+
+class InferOneStepLogSpace:
+    def __init__(self, jointHypothesisSpace, concernedHypothesisVariable, calJointLikelihood, softPrior, priorFloor=1e-4,
+                 calJointLogLikelihoodBatch=None):
+        self.marginalize = MarginalizeHypothesisSpace(jointHypothesisSpace, concernedHypothesisVariable)
+        self.intentions = self.marginalize.levelValues['intention']
+        self.calJointLikelihood = calJointLikelihood
+        self.calJointLogLikelihoodBatch = calJointLogLikelihoodBatch
+        self.softParameter = softPrior.softParameter
+        self.logPriorFloor = np.log(priorFloor)
+
+    def calJointLogLikelihood(self, state, perceivedAction):
+        if self.calJointLogLikelihoodBatch is not None:
+            return np.asarray(self.calJointLogLikelihoodBatch(self.intentions, state, perceivedAction), dtype=float)
+        with np.errstate(divide='ignore'):
+            return np.log(np.array([self.calJointLikelihood(intention, state, perceivedAction) for intention in self.intentions], dtype=float))
+
+    def inferLogPosterior(self, logPrior, keys, state, perceivedAction):
+        oneStepLogLikelihood = self.marginalize(self.calJointLogLikelihood(state, perceivedAction), keys)
+        softenLogPrior = np.logaddexp(logSoftenPrior(logPrior, self.softParameter), self.logPriorFloor)
+        return normalizeLogProbabilities(softenLogPrior + oneStepLogLikelihood)
+
+    def __call__(self, intentionPrior, state, perceivedAction):
+        keys = list(intentionPrior.keys())
+        with np.errstate(divide='ignore'):
+            logPrior = np.log(np.array(list(intentionPrior.values()), dtype=float))
+        logPosterior = self.inferLogPosterior(logPrior, keys, state, perceivedAction)
+        return dict(zip(keys, np.exp(logPosterior)))
+
+
+class InferOneStepWithActionNoiseLogSpace(InferOneStepLogSpace):
+    def __init__(self, jointHypothesisSpace, concernedHypothesisVariable, calJointLikelihood, softPrior, priorFloor=1e-4):
+        super().__init__(jointHypothesisSpace, concernedHypothesisVariable, calJointLikelihood, softPrior, priorFloor)
+        self.actions = self.marginalize.levelValues['action']
+
+    def calJointLogLikelihood(self, state, perceivedAction):
+        with np.errstate(divide='ignore'):
+            return np.log(np.array([self.calJointLikelihood(intention, state, action, perceivedAction)
+                                    for intention, action in zip(self.intentions, self.actions)], dtype=float))
+
+class InferOneStepOnBeam:
+    def __init__(self, calJointLogLikelihoodBatch, softPrior, beamSize, reexpandInterval, explorationFloor=1e-4, priorFloor=1e-4):
+        self.calJointLogLikelihoodBatch = calJointLogLikelihoodBatch
+        self.softParameter = softPrior.softParameter
+        self.beamSize = beamSize
+        self.reexpandInterval = reexpandInterval
+        self.explorationFloor = explorationFloor
+        self.logPriorFloor = np.log(priorFloor)
+        self.reset()
+
+    def reset(self):
+        # called by ResetObjects between trials; the first step of a trial scores every hypothesis
+        self.numStepsSinceExpansion = self.reexpandInterval
+        # prior mass outside the beam at each step, not posterior mass
+        self.droppedProbabilityMasses = []
+
+    def getBeamIndexes(self, logPrior):
+        if self.numStepsSinceExpansion >= self.reexpandInterval or self.beamSize >= len(logPrior):
+            self.numStepsSinceExpansion = 0
+            return np.arange(len(logPrior))
+        self.numStepsSinceExpansion += 1
+        return np.sort(np.argpartition(-logPrior, self.beamSize - 1)[:self.beamSize])
+
+    def __call__(self, intentionPrior, state, perceivedAction):
+        keys = list(intentionPrior.keys())
+        with np.errstate(divide='ignore'):
+            logPrior = normalizeLogProbabilities(np.log(np.array(list(intentionPrior.values()), dtype=float)))
+        softenLogPrior = np.logaddexp(logSoftenPrior(logPrior, self.softParameter), self.logPriorFloor)
+
+        beamIndexes = self.getBeamIndexes(logPrior)
+        isPruned = np.ones(len(keys), dtype=bool)
+        isPruned[beamIndexes] = False
+        droppedProbabilityMass = float(np.exp(logsumexp(logPrior[isPruned]))) if np.any(isPruned) else 0.0
+        self.droppedProbabilityMasses.append(droppedProbabilityMass)
+
+        beamLogLikelihood = np.asarray(self.calJointLogLikelihoodBatch([keys[index] for index in beamIndexes], state, perceivedAction), dtype=float)
+        logPosterior = np.empty(len(keys))
+        if np.any(isPruned):
+            # pruned hypotheses keep at least the prior mass they held, split in proportion to their prior, so no mass
+            # is dropped without a likelihood and a later expansion can revive them
+            prunedMass = min(max(self.explorationFloor, droppedProbabilityMass), 1 - self.explorationFloor)
+            logPosterior[beamIndexes] = np.log1p(-prunedMass) + normalizeLogProbabilities(softenLogPrior[beamIndexes] + beamLogLikelihood)
+            logPosterior[isPruned] = np.log(prunedMass) + normalizeLogProbabilities(softenLogPrior[isPruned])
+        else:
+            logPosterior[beamIndexes] = normalizeLogProbabilities(softenLogPrior[beamIndexes] + beamLogLikelihood)
+        return dict(zip(keys, np.exp(logPosterior)))
+
+
+class CalCommittedAgentsContinuousPolicyLogLikelihoodOnTrajectory:
+    def __init__(self, concernedAgentsIds, policyForCommittedAgentOnTrajectory, calGaussianLogPdf, rationalityBeta):
+        self.concernedAgentsIds = concernedAgentsIds
+        self.policyForCommittedAgentOnTrajectory = policyForCommittedAgentOnTrajectory
+        self.calGaussianLogPdf = calGaussianLogPdf
+        self.rationalityBeta = rationalityBeta
+
+    def __call__(self, intentions, states, percivedActions):
+        # (T, numIntentions); with rationalityBeta = 1 the matrix can be cached and rescaled for any other beta
+        numTimeSteps, numIntentions = len(states), len(intentions)
+        committedAgentIdsList = [[Id for Id in list(weIds) if Id in self.concernedAgentsIds] for goalId, weIds in intentions]
+        committedIntentionIndexes = [index for index, committedAgentIds in enumerate(committedAgentIdsList) if len(committedAgentIds) > 0]
+        logLikelihoods = np.zeros(numTimeSteps * numIntentions)
+        if len(committedIntentionIndexes) == 0 or numTimeSteps == 0:
+            return logLikelihoods.reshape(numTimeSteps, numIntentions)
+
+        jointActionMeansOnTrajectory = self.policyForCommittedAgentOnTrajectory(states, [intentions[index] for index in committedIntentionIndexes])
+        actions, means, pairIndexes = [], [], []
+        for timeStep, (percivedAction, jointActionMeans) in enumerate(zip(percivedActions, jointActionMeansOnTrajectory)):
+            percivedAction = np.array(percivedAction)
+            for index, jointMeans in zip(committedIntentionIndexes, jointActionMeans):
+                numCommittedAgents = len(committedAgentIdsList[index])
+                actions.append(percivedAction[committedAgentIdsList[index]])
+                means.append(jointMeans[:numCommittedAgents])
+                pairIndexes.append([timeStep * numIntentions + index] * numCommittedAgents)
+        logPdfs = self.calGaussianLogPdf(np.concatenate(actions), np.concatenate(means))
+        logLikelihoods += self.rationalityBeta * np.bincount(np.concatenate(pairIndexes), weights=logPdfs, minlength=len(logLikelihoods))
+        return logLikelihoods.reshape(numTimeSteps, numIntentions)
+
+
+class InferOnTrajectoryLogSpace:
+    def __init__(self, jointHypothesisSpace, concernedHypothesisVariable, calJointLogLikelihoodOnTrajectory, softPrior, priorFloor=1e-4):
+        self.marginalize = MarginalizeHypothesisSpace(jointHypothesisSpace, concernedHypothesisVariable)
+        self.intentions = self.marginalize.levelValues['intention']
+        self.calJointLogLikelihoodOnTrajectory = calJointLogLikelihoodOnTrajectory
+        self.softParameter = softPrior.softParameter
+        self.priorFloor = priorFloor
+
+    def calLogLikelihoodMatrix(self, states, perceivedActions, keys):
+        jointLogLikelihoodMatrix = np.asarray(self.calJointLogLikelihoodOnTrajectory(self.intentions, states, perceivedActions), dtype=float)
+        marginalIndex = self.marginalize.getMarginalIndex(keys)
+        marginalizeMatrix = np.zeros((len(marginalIndex), len(keys)))
+        marginalizeMatrix[np.arange(len(marginalIndex)), marginalIndex] = 1
+        maxLogLikelihoods = np.max(jointLogLikelihoodMatrix, axis=1, keepdims=True)
+        maxLogLikelihoods[~np.isfinite(maxLogLikelihoods)] = 0
+        with np.errstate(divide='ignore'):
+            return np.log(np.exp(jointLogLikelihoodMatrix - maxLogLikelihoods) @ marginalizeMatrix) + maxLogLikelihoods
+
+    def filterLogPosteriors(self, logPrior, logLikelihoodMatrix, softParameter=None):
+        # rows are the prior followed by the posterior after every timestep, as in UpdateIntention.formerIntentionPriors
+        softParameter = self.softParameter if softParameter is None else softParameter
+        logPrior = normalizeLogProbabilities(np.asarray(logPrior, dtype=float))
+        if self.priorFloor is None:
+            # without the floor the recursion is linear in log space: u_t = s * u_{t-1} + L_t, up to per-step constants
+            numTimeSteps = len(logLikelihoodMatrix)
+            timeSteps = np.arange(numTimeSteps + 1)
+            decayExponents = timeSteps[:, None] - timeSteps[None, 1:]
+            decayWeights = np.where(decayExponents >= 0, np.power(float(softParameter), np.maximum(decayExponents, 0)), 0)
+            # impossible hypotheses are kept finite so zero weights do not turn them into nan
+            finiteLogPrior = np.maximum(logPrior, -1e300)
+            finiteLogLikelihoodMatrix = np.maximum(logLikelihoodMatrix, -1e300)
+            unnormalizedLogPosteriors = np.power(float(softParameter), timeSteps)[:, None] * finiteLogPrior + decayWeights @ finiteLogLikelihoodMatrix
+            return unnormalizedLogPosteriors - logsumexp(unnormalizedLogPosteriors, axis=1, keepdims=True)
+
+        logPriorFloor = np.log(self.priorFloor)
+        logPosteriors = [logPrior]
+        for logLikelihood in logLikelihoodMatrix:
+            softenLogPrior = np.logaddexp(logSoftenPrior(logPosteriors[-1], softParameter), logPriorFloor)
+            logPosteriors.append(normalizeLogProbabilities(softenLogPrior + logLikelihood))
+        return np.array(logPosteriors)
+
+    def __call__(self, intentionPrior, states, perceivedActions):
+        keys = list(intentionPrior.keys())
+        with np.errstate(divide='ignore'):
+            logPrior = np.log(np.array(list(intentionPrior.values()), dtype=float))
+        logLikelihoodMatrix = self.calLogLikelihoodMatrix(states, perceivedActions, keys)
+        return np.exp(self.filterLogPosteriors(logPrior, logLikelihoodMatrix))
+
+
 class InferOnTrajectory:
     def __init__(self, prior, observe, inferOneStepLik, visualize):
         self.prior = prior
         self.observe = observe
-        self.updateOneStepLik = updateOneStepLik        
+        self.inferOneStepLik = inferOneStepLik
         self.visualize = visualize
 
     def __call__(self, trajectory):
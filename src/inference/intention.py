@@ -49,13 +49,67 @@ class AdjustIntentionPriorGivenValueOfState:
                 for intention, probability in zip(intentions, normalizedProbabilities)}
         return adjustedIntentionPrior
 
+class IntentionHistory:
+    def __init__(self, intentions, maxSteps):
+        self.intentions = list(intentions)
+        self.probabilities = np.zeros((max(maxSteps, 1), len(self.intentions)))
+        self.numRecorded = 0
+
+    def append(self, intentionDistribution):
+        # read by key, so a distribution listing its intentions in another order is still recorded under the right ones
+        if len(intentionDistribution) != len(self.intentions):
+            raise ValueError('intention distribution does not cover the recorded intention space')
+        if self.numRecorded == len(self.probabilities):
+            self.probabilities = np.concatenate([self.probabilities, np.zeros_like(self.probabilities)])
+        self.probabilities[self.numRecorded] = [intentionDistribution[intention] for intention in self.intentions]
+        self.numRecorded += 1
+
+    def rewind(self, intentionDistributions=()):
+        self.numRecorded = 0
+        for intentionDistribution in intentionDistributions:
+            self.append(intentionDistribution)
+
+    def toArray(self):
+        return self.probabilities[:self.numRecorded].copy()
+
+    def copy(self):
+        copiedHistory = IntentionHistory(self.intentions, self.numRecorded)
+        copiedHistory.probabilities[:self.numRecorded] = self.probabilities[:self.numRecorded]
+        copiedHistory.numRecorded = self.numRecorded
+        return copiedHistory
+
+    def __len__(self):
+        return self.numRecorded
+
+    def __getitem__(self, timeStep):
+        return dict(zip(self.intentions, self.probabilities[:self.numRecorded][timeStep]))
+
+    def __iter__(self):
+        return (self[timeStep] for timeStep in range(self.numRecorded))
+
+
+def expandIntentionHistories(intentionHistories):
+    # compact {'intentions', 'probabilities'} records back to the per-step [(agentsDistributions, )] layout; old lists pass through
+    if not isinstance(intentionHistories, dict):
+        return intentionHistories
+    intentions = intentionHistories['intentions']
+    probabilities = intentionHistories['probabilities']
+    return [(tuple(dict(zip(intentions, agentProbabilities)) for agentProbabilities in probabilities[:, timeStep]), )
+            for timeStep in range(probabilities.shape[1])]
+
+
 class UpdateIntention:
-    def __init__(self, intentionPrior, endAdjustedPriorTimeStep, adjustIntentionPrior, perceptAction, inferIntentionOneStep, chooseIntention):
+    def __init__(self, intentionPrior, endAdjustedPriorTimeStep, adjustIntentionPrior, perceptAction, inferIntentionOneStep, chooseIntention,
+                 maxSteps = None):
         self.timeStep = 0
         self.lastState = None
         self.lastAction = None
         self.intentionPrior = intentionPrior
-        self.formerIntentionPriors = [intentionPrior]
+        if maxSteps is None:
+            self.formerIntentionPriors = [intentionPrior]
+        else:
+            self.formerIntentionPriors = IntentionHistory(list(intentionPrior.keys()), maxSteps)
+            self.formerIntentionPriors.append(intentionPrior)
         self.endAdjustedTimeStep = endAdjustedPriorTimeStep
         self.adjustIntentionPrior = adjustIntentionPrior
         self.perceptAction = perceptAction
@@ -79,9 +133,10 @@ class UpdateIntention:
         # print('adjustedIntentionPrior', adjustedIntentionPrior)
         intention = self.chooseIntention(intentionPosterior)
 
+        # the posterior is a fresh distribution that is never edited in place, so it is kept without copying
         self.lastState = state.copy()
-        self.intentionPrior = intentionPosterior.copy()
-        self.formerIntentionPriors.append(self.intentionPrior.copy())
+        self.intentionPrior = intentionPosterior
+        self.formerIntentionPriors.append(self.intentionPrior)
         # print(self.formerIntentionPriors, '!!!')
         self.timeStep = self.timeStep + 1
         # print(self.timeStep,intention)
@@ -0,0 +1,92 @@
+import os
+import collections as co
+import multiprocessing as mp
+import numpy as np
+from src.writer import loadFromPickle, saveToPickle
+
+
+def streamRecordedTrials(fileFolder):
+    # one result pickle is held in memory at a time
+    for fileName in sorted(os.listdir(fileFolder)):
+        prefix, extension = os.path.splitext(fileName)
+        if extension == '.pickle':
+            for trialIndex, trailPickleData in enumerate(loadFromPickle(os.path.join(fileFolder, fileName))):
+                yield prefix, trialIndex, trailPickleData
+
+
+def getConditionKey(condition):
+    if 'targetColorIndex' in condition.keys():
+        sheepNums = len(condition['targetColorIndex'])
+    else:
+        sheepNums = condition['sheepNums']
+    return sheepNums, condition['sheepMaxSpeed'], condition['blockSize']
+
+
+class InferIntentionOnRecordedTrial:
+    def __init__(self, numOfWolves, inferenceInterval, allUpdateIntentions, allGetIntentionDistributions,
+                 allRecordActionForUpdateIntention, allResetIntenions):
+        self.numOfWolves = numOfWolves
+        self.inferenceInterval = inferenceInterval
+        self.allUpdateIntentions = allUpdateIntentions
+        self.allGetIntentionDistributions = allGetIntentionDistributions
+        self.allRecordActionForUpdateIntention = allRecordActionForUpdateIntention
+        self.allResetIntenions = allResetIntenions
+
+    def __call__(self, trailPickleData):
+        condition = trailPickleData['condition']
+        conditionKey = getConditionKey(condition)
+        sheepNums = conditionKey[0]
+        updateIntentions = self.allUpdateIntentions[conditionKey]
+        recordActionForUpdateIntention = self.allRecordActionForUpdateIntention[conditionKey]
+        self.allResetIntenions[conditionKey]()
+
+        # same step order as NewtonChaseTrialInference, on the recorded states instead of a re-simulated replay
+        for trialStep, (state, actionHumanTrial, nextState) in enumerate(trailPickleData['trajectory']):
+            actionWolfHumanTrial = [tuple(act) for act in actionHumanTrial[0 : self.numOfWolves]]
+            actionSheepHumanTrial = actionHumanTrial[self.numOfWolves : self.numOfWolves + sheepNums]
+            action = list(actionWolfHumanTrial) + list(actionSheepHumanTrial)
+            recordActionForUpdateIntention([action])
+            if np.mod(trialStep, self.inferenceInterval) == 0:
+                [updateIntention(state) for updateIntention in updateIntentions]
+
+        pickleResults = co.OrderedDict()
+        pickleResults['condition'] = condition
+        pickleResults['intentionDistributions'] = self.allGetIntentionDistributions[conditionKey]()
+        return pickleResults
+
+
+inferTrialInWorker = None
+
+def initializeInferenceWorker(buildInferTrial):
+    # models are built and restored once per worker process, not once per trial
+    global inferTrialInWorker
+    inferTrialInWorker = buildInferTrial()
+
+
+def inferOneRecordedTrialInWorker(recordedTrial):
+    prefix, trialIndex, trailPickleData = recordedTrial
+    pickleResults = inferTrialInWorker(trailPickleData)
+    pickleResults['trialIndex'] = trialIndex
+    return prefix, trialIndex, pickleResults
+
+
+class RunOfflineIntentionInference:
+    def __init__(self, buildInferTrial, getTrialSavePath, numWorkers=None):
+        self.buildInferTrial = buildInferTrial
+        self.getTrialSavePath = getTrialSavePath
+        self.numWorkers = numWorkers
+
+    def __call__(self, recordedTrials):
+        # trials already written by an earlier run are skipped, so an interrupted analysis can resume
+        pendingTrials = (recordedTrial for recordedTrial in recordedTrials
+                         if not os.path.isfile(self.getTrialSavePath(recordedTrial[0], recordedTrial[1])))
+        # tensorflow sessions are not fork safe, workers start from a fresh interpreter
+        context = mp.get_context('spawn')
+        with context.Pool(self.numWorkers, initializer=initializeInferenceWorker, initargs=(self.buildInferTrial, )) as pool:
+            for prefix, trialIndex, pickleResults in pool.imap_unordered(inferOneRecordedTrialInWorker, pendingTrials):
+                saveToPickle(pickleResults, self.getTrialSavePath(prefix, trialIndex))
+                print(prefix, trialIndex)
+
+
+def mergeTrialResults(getTrialSavePath, prefix, numTrials):
+    return [loadFromPickle(getTrialSavePath(prefix, trialIndex)) for trialIndex in range(numTrials)]
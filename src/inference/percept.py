@@ -43,3 +43,34 @@ class PerceptImaginedWeAction:
         perceivedImaginedWeAction = [self.perceptSelfAction(np.array(objectiveTokenAction)[self.imaginedWeId[0]])] + \
             [self.perceptOtherAction(action) for action in np.array(objectiveTokenAction)[self.imaginedWeId[1:]]]
         return np.array(perceivedImaginedWeAction)
+
+class SampleNoisyActionBatch:
+    def __init__(self, noise):
+        self.noise = noise
+
+    def __call__(self, acturalActions, randomState=np.random):
+        # actions (..., actionDim), one isotropic draw for the whole batch
+        acturalActions = np.asarray(acturalActions, dtype=float)
+        return acturalActions + self.noise * randomState.standard_normal(acturalActions.shape)
+
+class MappingActionToAnotherSpaceBatch:
+    def __init__(self, anotherSpace):
+        self.anotherSpace = np.array(anotherSpace, dtype=float)
+
+    def __call__(self, acturalActions, randomState=np.random):
+        # actions (..., actionDim) -> nearest actions of anotherSpace, ties broken at random as in MappingActionToAnotherSpace
+        acturalActions = np.asarray(acturalActions, dtype=float)
+        actionDistance = np.linalg.norm(acturalActions[..., None, :] - self.anotherSpace, axis=-1)
+        isNearest = actionDistance == np.min(actionDistance, axis=-1, keepdims=True)
+        perceivedActionIndex = np.argmax(isNearest * randomState.random_sample(isNearest.shape), axis=-1)
+        return self.anotherSpace[perceivedActionIndex]
+
+class PerceptImaginedWeActionVectorized:
+    def __init__(self, imaginedWeId, selfNoise, otherNoise):
+        self.imaginedWeId = list(imaginedWeId)
+        self.noiseOfAgents = np.array([selfNoise] + [otherNoise] * (len(self.imaginedWeId) - 1), dtype=float)[:, None]
+
+    def __call__(self, objectiveTokenAction, randomState=np.random):
+        # (numAgents, actionDim) or a (T, numAgents, actionDim) batch of timesteps; rows follow imaginedWeId like PerceptImaginedWeAction
+        imaginedWeAction = np.asarray(objectiveTokenAction, dtype=float)[..., self.imaginedWeId, :]
+        return imaginedWeAction + self.noiseOfAgents * randomState.standard_normal(imaginedWeAction.shape)
@@ -0,0 +1,348 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..'))
+
+import numpy as np
+import pandas as pd
+import itertools as it
+import unittest
+from ddt import ddt, data, unpack
+
+from src.inference.inference import CalCommittedAgentsPolicyLikelihood, CalCommittedAgentsPolicyLikelihoodIndexed, \
+    CalCommittedAgentsContinuousPolicyLikelihood, CalCommittedAgentsContinuousPolicyLogLikelihoodBatch, \
+    InferOneStep, InferOneStepWithActionNoise, InferOneStepWithActionNoiseLogSpace, \
+    CalCommittedAgentsContinuousPolicyLogLikelihoodOnTrajectory, InferOneStepLogSpace, InferOnTrajectoryLogSpace, InferOneStepOnBeam
+from src.inference.intention import UpdateIntention
+from src.sampleTrajectoryTools.resetObjectsForMultipleTrjaectory import ResetObjects
+from src.generateAction.imaginedWeSampleAction import PolicyForCommittedAgent, BatchPolicyForCommittedAgent
+from src.mathTools.distribution import Categorical, SoftDistribution, BuildGaussianFixCovWithCholesky, IndexedJointActionSpace, \
+    maxFromDistribution
+from src.MDPChasing.state import getStateOrActionThirdPersonPerspective
+
+
+class LinearCentralControlMeans:
+    # a fixed random actor standing in for the restored wolf models: (B, numRelativeEntities, 4) -> (B, numAgentsInWe, 2)
+    def __init__(self, numAgentsInWe, seed):
+        randomState = np.random.RandomState(seed)
+        self.numAgentsInWe = numAgentsInWe
+        self.weights = randomState.normal(0, 0.3, ((numAgentsInWe + 1) * 4, numAgentsInWe * 2))
+
+    def __call__(self, batchState):
+        batchState = np.asarray(batchState, dtype=float)
+        flatState = batchState.reshape(len(batchState), -1)
+        return 3 * np.tanh(flatState @ self.weights).reshape(len(batchState), self.numAgentsInWe, 2)
+
+
+class WolvesTeamSetting:
+    def __init__(self, numSheeps=4, rationalityBeta=0.8, seed=30):
+        self.wolvesID = [0, 1, 2]
+        self.sheepsID = list(range(3, 3 + numSheeps))
+        self.numEntities = len(self.wolvesID) + numSheeps
+        # inferred by wolf 0, so it is never scored as a committed agent
+        self.concernedAgentsIds = [1, 2]
+        self.intentions = list(it.product(self.sheepsID, [(0, 1, 2), (0, 1), (1, 2)]))
+        self.numOfAgentInPolicyFunctionList = [2, 3]
+        self.centralControlMeansList = [LinearCentralControlMeans(numAgentsInWe, seed + numAgentsInWe)
+                                        for numAgentsInWe in self.numOfAgentInPolicyFunctionList]
+        getStateThirdPersonPerspective = lambda state, goalId, weIds: getStateOrActionThirdPersonPerspective(state, goalId, weIds)
+        self.policyForCommittedAgentBatch = BatchPolicyForCommittedAgent(self.centralControlMeansList, getStateThirdPersonPerspective,
+                                                                         self.numOfAgentInPolicyFunctionList)
+        self.buildGaussian = BuildGaussianFixCovWithCholesky([1.0, 1.0])
+        self.rationalityBeta = rationalityBeta
+
+        centralControlPolicyList = [lambda relativeState, means=means: [self.buildGaussian(mean) for mean in means([relativeState])[0]]
+                                    for means in self.centralControlMeansList]
+        self.policyForCommittedAgent = PolicyForCommittedAgent(centralControlPolicyList, lambda distribution: distribution,
+                                                               getStateThirdPersonPerspective, self.numOfAgentInPolicyFunctionList)
+        self.calJointLikelihood = CalCommittedAgentsContinuousPolicyLikelihood(self.concernedAgentsIds, self.policyForCommittedAgent,
+                                                                               rationalityBeta)
+        self.calJointLogLikelihoodBatch = CalCommittedAgentsContinuousPolicyLogLikelihoodBatch(
+            self.concernedAgentsIds, self.policyForCommittedAgentBatch, self.buildGaussian.logpdf, rationalityBeta)
+        self.jointHypothesisSpace = pd.MultiIndex.from_product([self.intentions], names=['intention'])
+
+    def sampleTrajectory(self, numTimeSteps, seed):
+        randomState = np.random.RandomState(seed)
+        states = list(randomState.uniform(-1, 1, (numTimeSteps, self.numEntities, 4)))
+        perceivedActions = list(randomState.uniform(-3, 3, (numTimeSteps, len(self.wolvesID), 2)))
+        return states, perceivedActions
+
+    def samplePrior(self, seed, numZeros=0):
+        randomState = np.random.RandomState(seed)
+        probabilities = randomState.uniform(0.1, 1, len(self.intentions))
+        probabilities[:numZeros] = 0
+        return dict(zip(self.intentions, probabilities / np.sum(probabilities)))
+
+
+@ddt
+class TestInferOnTrajectoryLogSpace(unittest.TestCase):
+    def setUp(self):
+        self.setting = WolvesTeamSetting()
+        self.numTimeSteps = 15
+        self.states, self.perceivedActions = self.setting.sampleTrajectory(self.numTimeSteps, 31)
+        self.calJointLogLikelihoodOnTrajectory = CalCommittedAgentsContinuousPolicyLogLikelihoodOnTrajectory(
+            self.setting.concernedAgentsIds, self.setting.policyForCommittedAgentBatch.onTrajectory, self.setting.buildGaussian.logpdf,
+            self.setting.rationalityBeta)
+
+    def testLogLikelihoodOnTrajectoryMatchesPerStepBatch(self):
+        logLikelihoodMatrix = self.calJointLogLikelihoodOnTrajectory(self.setting.intentions, self.states, self.perceivedActions)
+        trueLogLikelihoodMatrix = np.array([self.setting.calJointLogLikelihoodBatch(self.setting.intentions, state, perceivedAction)
+                                            for state, perceivedAction in zip(self.states, self.perceivedActions)])
+        self.assertEqual(logLikelihoodMatrix.shape, (self.numTimeSteps, len(self.setting.intentions)))
+        self.assertTrue(np.allclose(logLikelihoodMatrix, trueLogLikelihoodMatrix, rtol=1e-12, atol=1e-12))
+
+    def testLogLikelihoodOnTrajectoryWithoutCommittedAgents(self):
+        intentions = [(3, (0, )), (4, (0, ))]
+        logLikelihoodMatrix = self.calJointLogLikelihoodOnTrajectory(intentions, self.states, self.perceivedActions)
+        self.assertTrue(np.array_equal(logLikelihoodMatrix, np.zeros((self.numTimeSteps, 2))))
+        self.assertEqual(self.calJointLogLikelihoodOnTrajectory(self.setting.intentions, [], []).shape, (0, len(self.setting.intentions)))
+
+    @data((1e-4, 0.7, 0), (1e-4, 1, 2), (None, 0.7, 0), (None, 1, 2), (None, 0, 0))
+    @unpack
+    def testFilterMatchesSteppingOneStepInference(self, priorFloor, softParameter, numZeroPriors):
+        softPrior = SoftDistribution(softParameter)
+        inferOnTrajectory = InferOnTrajectoryLogSpace(self.setting.jointHypothesisSpace, ['intention'],
+                                                      self.calJointLogLikelihoodOnTrajectory, softPrior, priorFloor)
+        # a zero floor steps the same recursion as the closed-form scan used when there is no floor
+        with np.errstate(divide='ignore'):
+            inferOneStep = InferOneStepLogSpace(self.setting.jointHypothesisSpace, ['intention'], None, softPrior,
+                                                0 if priorFloor is None else priorFloor, self.setting.calJointLogLikelihoodBatch)
+        intentionPrior = self.setting.samplePrior(32, numZeroPriors)
+
+        posteriors = inferOnTrajectory(intentionPrior, self.states, self.perceivedActions)
+        truePosteriors = [list(intentionPrior.values())]
+        with np.errstate(divide='ignore'):
+            for state, perceivedAction in zip(self.states, self.perceivedActions):
+                intentionPrior = inferOneStep(intentionPrior, state, perceivedAction)
+                truePosteriors.append(list(intentionPrior.values()))
+        self.assertEqual(posteriors.shape, (self.numTimeSteps + 1, len(self.setting.intentions)))
+        self.assertTrue(np.allclose(posteriors, truePosteriors, rtol=1e-10, atol=1e-14))
+        self.assertTrue(np.allclose(np.sum(posteriors, axis=1), 1))
+
+
+@ddt
+class TestInferOneStepOnBeam(unittest.TestCase):
+    def setUp(self):
+        self.setting = WolvesTeamSetting()
+        self.numIntentions = len(self.setting.intentions)
+        self.softPrior = SoftDistribution(0.7)
+        self.states, self.perceivedActions = self.setting.sampleTrajectory(10, 33)
+        self.scoredIntentions = []
+
+    def calJointLogLikelihoodBatch(self, intentions, state, perceivedAction):
+        self.scoredIntentions.append(list(intentions))
+        return self.setting.calJointLogLikelihoodBatch(intentions, state, perceivedAction)
+
+    @data((12, 1), (20, 3))
+    @unpack
+    def testBeamCoveringAllHypothesesMatchesOneStepInference(self, beamSize, reexpandInterval):
+        inferOnBeam = InferOneStepOnBeam(self.calJointLogLikelihoodBatch, self.softPrior, beamSize, reexpandInterval)
+        inferOneStep = InferOneStepLogSpace(self.setting.jointHypothesisSpace, ['intention'], None, self.softPrior,
+                                            calJointLogLikelihoodBatch=self.setting.calJointLogLikelihoodBatch)
+        beamPrior = truePrior = self.setting.samplePrior(34)
+        for state, perceivedAction in zip(self.states, self.perceivedActions):
+            beamPrior = inferOnBeam(beamPrior, state, perceivedAction)
+            truePrior = inferOneStep(truePrior, state, perceivedAction)
+            self.assertEqual(list(beamPrior.keys()), list(truePrior.keys()))
+            self.assertTrue(np.allclose(list(beamPrior.values()), list(truePrior.values()), rtol=1e-12, atol=1e-15))
+        self.assertTrue(all(len(intentions) == self.numIntentions for intentions in self.scoredIntentions))
+        self.assertEqual(inferOnBeam.droppedProbabilityMasses, [0.0] * len(self.states))
+
+    @data((0.5, 1e-4), (1e-6, 1e-3), (0.0, 1e-3))
+    @unpack
+    def testPrunedHypothesesKeepTheirMassInProportionToSoftenPrior(self, prunedPriorProbability, explorationFloor):
+        beamSize = 4
+        inferOnBeam = InferOneStepOnBeam(self.calJointLogLikelihoodBatch, self.softPrior, beamSize, reexpandInterval=5,
+                                         explorationFloor=explorationFloor)
+        inferOnBeam(self.setting.samplePrior(35), self.states[0], self.perceivedActions[0])
+
+        randomState = np.random.RandomState(36)
+        probabilities = np.concatenate([randomState.uniform(1, 2, beamSize), prunedPriorProbability * randomState.uniform(1, 2, self.numIntentions - beamSize)])
+        randomState.shuffle(probabilities)
+        probabilities = probabilities / np.sum(probabilities)
+        intentionPrior = dict(zip(self.setting.intentions, probabilities))
+        posterior = np.array(list(inferOnBeam(intentionPrior, self.states[1], self.perceivedActions[1]).values()))
+
+        isInBeam = np.isin(np.arange(self.numIntentions), np.argsort(-probabilities)[:beamSize])
+        self.assertEqual(self.scoredIntentions[-1], [intention for intention, inBeam in zip(self.setting.intentions, isInBeam) if inBeam])
+        droppedProbabilityMass = np.sum(probabilities[~isInBeam])
+        self.assertAlmostEqual(inferOnBeam.droppedProbabilityMasses[-1], droppedProbabilityMass)
+        prunedMass = max(explorationFloor, droppedProbabilityMass)
+        self.assertAlmostEqual(np.sum(posterior[~isInBeam]), prunedMass)
+
+        softenPrior = np.power(probabilities, 0.7) / np.sum(np.power(probabilities, 0.7)) + 1e-4
+        self.assertTrue(np.allclose(posterior[~isInBeam] / prunedMass, softenPrior[~isInBeam] / np.sum(softenPrior[~isInBeam])))
+        beamLikelihood = np.exp(self.setting.calJointLogLikelihoodBatch(self.scoredIntentions[-1], self.states[1], self.perceivedActions[1]))
+        beamPosterior = softenPrior[isInBeam] * beamLikelihood
+        self.assertTrue(np.allclose(posterior[isInBeam] / (1 - prunedMass), beamPosterior / np.sum(beamPosterior)))
+
+    @data((1, ), (3, ))
+    @unpack
+    def testBeamIsReexpandedEveryInterval(self, reexpandInterval):
+        beamSize = 4
+        inferOnBeam = InferOneStepOnBeam(self.calJointLogLikelihoodBatch, self.softPrior, beamSize, reexpandInterval)
+        intentionPrior = self.setting.samplePrior(37)
+        priors = []
+        for state, perceivedAction in zip(self.states, self.perceivedActions):
+            priors.append(intentionPrior)
+            intentionPrior = inferOnBeam(intentionPrior, state, perceivedAction)
+
+        isExpanded = [timeStep % (reexpandInterval + 1) == 0 for timeStep in range(len(self.states))]
+        self.assertEqual([len(intentions) for intentions in self.scoredIntentions],
+                         [self.numIntentions if expanded else beamSize for expanded in isExpanded])
+        for prior, intentions, expanded in zip(priors, self.scoredIntentions, isExpanded):
+            if not expanded:
+                topIntentions = sorted(prior, key=prior.get, reverse=True)[:beamSize]
+                self.assertEqual(set(intentions), set(topIntentions))
+
+    def testResetObjectsResetsTheBeam(self):
+        inferOnBeam = InferOneStepOnBeam(self.calJointLogLikelihoodBatch, self.softPrior, beamSize=4, reexpandInterval=3)
+        intentionPrior = self.setting.samplePrior(38)
+        updateIntention = UpdateIntention(intentionPrior, -1, None, lambda action: action, inferOnBeam, maxFromDistribution)
+        intentionResetAttributes = ['timeStep', 'lastState', 'lastAction', 'intentionPrior', 'formerIntentionPriors']
+        resetIntentions = ResetObjects([dict(zip(intentionResetAttributes, [0, None, None, intentionPrior, [intentionPrior]]))],
+                                       [updateIntention])
+
+        def runTrial():
+            self.scoredIntentions.clear()
+            for state, perceivedAction in zip(self.states[:4], self.perceivedActions[:4]):
+                updateIntention(state)
+                updateIntention.lastAction = perceivedAction
+            return list(self.scoredIntentions)
+
+        firstTrialScoredIntentions = runTrial()
+        self.assertEqual([len(intentions) for intentions in firstTrialScoredIntentions], [self.numIntentions, 4, 4])
+        self.assertEqual(len(inferOnBeam.droppedProbabilityMasses), 3)
+        resetIntentions()
+        self.assertEqual(inferOnBeam.numStepsSinceExpansion, inferOnBeam.reexpandInterval)
+        self.assertEqual(inferOnBeam.droppedProbabilityMasses, [])
+        self.assertEqual(runTrial(), firstTrialScoredIntentions)
+
+
+@ddt
+class TestInferOneStepLogSpace(unittest.TestCase):
+    def setUp(self):
+        self.setting = WolvesTeamSetting()
+        self.states, self.perceivedActions = self.setting.sampleTrajectory(10, 39)
+
+    @data((0.7, False), (1, False), (0.7, True), (0, True))
+    @unpack
+    def testMatchesInferOneStep(self, softParameter, useLogLikelihoodBatch):
+        softPrior = SoftDistribution(softParameter)
+        inferOneStep = InferOneStep(self.setting.jointHypothesisSpace, ['intention'], self.setting.calJointLikelihood, softPrior)
+        calJointLogLikelihoodBatch = self.setting.calJointLogLikelihoodBatch if useLogLikelihoodBatch else None
+        inferOneStepLogSpace = InferOneStepLogSpace(self.setting.jointHypothesisSpace, ['intention'], self.setting.calJointLikelihood,
+                                                    softPrior, calJointLogLikelihoodBatch=calJointLogLikelihoodBatch)
+        prior = truePrior = self.setting.samplePrior(40)
+        for state, perceivedAction in zip(self.states, self.perceivedActions):
+            prior = inferOneStepLogSpace(prior, state, perceivedAction)
+            truePrior = inferOneStep(truePrior, state, perceivedAction)
+            self.assertEqual(list(prior.keys()), list(truePrior.keys()))
+            self.assertTrue(np.allclose(list(prior.values()), list(truePrior.values()), rtol=1e-9, atol=1e-15))
+
+    def testKeysInAnotherOrderThanTheHypothesisSpace(self):
+        softPrior = SoftDistribution(0.7)
+        inferOneStep = InferOneStep(self.setting.jointHypothesisSpace, ['intention'], self.setting.calJointLikelihood, softPrior)
+        inferOneStepLogSpace = InferOneStepLogSpace(self.setting.jointHypothesisSpace, ['intention'], self.setting.calJointLikelihood, softPrior)
+        intentionPrior = self.setting.samplePrior(41)
+        reversedPrior = dict(reversed(list(intentionPrior.items())))
+        posterior = inferOneStepLogSpace(reversedPrior, self.states[0], self.perceivedActions[0])
+        truePosterior = inferOneStep(reversedPrior, self.states[0], self.perceivedActions[0])
+        self.assertEqual(list(posterior.keys()), list(reversedPrior.keys()))
+        self.assertTrue(np.allclose([posterior[key] for key in truePosterior], list(truePosterior.values()), rtol=1e-9))
+
+    def testWithActionNoiseMatchesInferOneStepWithActionNoise(self):
+        softPrior = SoftDistribution(0.7)
+        actionSpace = [(3, 0), (0, 3), (-3, 0), (0, -3)]
+        jointHypothesisSpace = pd.MultiIndex.from_product([self.setting.intentions, actionSpace], names=['intention', 'action'])
+        # the perceived action of wolf 1 is the hypothesized action blurred by a Gaussian
+        calJointLikelihood = lambda intention, state, action, perceivedAction: self.setting.calJointLikelihood(intention, state, perceivedAction) * \
+            self.setting.buildGaussian(action).pdf(perceivedAction[1])
+        inferOneStep = InferOneStepWithActionNoise(jointHypothesisSpace, ['intention'], calJointLikelihood, softPrior)
+        inferOneStepLogSpace = InferOneStepWithActionNoiseLogSpace(jointHypothesisSpace, ['intention'], calJointLikelihood, softPrior)
+        prior = truePrior = self.setting.samplePrior(42)
+        for state, perceivedAction in zip(self.states[:5], self.perceivedActions[:5]):
+            prior = inferOneStepLogSpace(prior, state, perceivedAction)
+            truePrior = inferOneStep(truePrior, state, perceivedAction)
+            self.assertTrue(np.allclose(list(prior.values()), list(truePrior.values()), rtol=1e-9, atol=1e-15))
+
+
+@ddt
+class TestCalCommittedAgentsContinuousPolicyLogLikelihoodBatch(unittest.TestCase):
+    @data((1, ), (0.8, ), (3, ))
+    @unpack
+    def testMatchesPerIntentionLikelihood(self, rationalityBeta):
+        setting = WolvesTeamSetting(rationalityBeta=rationalityBeta)
+        # wolf 0 alone has no committed agent to score
+        intentions = setting.intentions + [(3, (0, )), (5, (0, ))]
+        states, perceivedActions = setting.sampleTrajectory(20, 43)
+        for state, perceivedAction in zip(states, perceivedActions):
+            logLikelihoods = setting.calJointLogLikelihoodBatch(intentions, state, perceivedAction)
+            trueLikelihoods = [setting.calJointLikelihood(intention, state, perceivedAction) for intention in intentions]
+            self.assertTrue(np.allclose(logLikelihoods, np.log(trueLikelihoods), rtol=1e-10, atol=1e-12))
+            self.assertTrue(np.array_equal(logLikelihoods[-2:], [0, 0]))
+
+    def testNoCommittedAgents(self):
+        setting = WolvesTeamSetting()
+        states, perceivedActions = setting.sampleTrajectory(1, 44)
+        logLikelihoods = setting.calJointLogLikelihoodBatch([(3, (0, )), (4, (0, ))], states[0], perceivedActions[0])
+        self.assertTrue(np.array_equal(logLikelihoods, [0, 0]))
+
+
+@ddt
+class TestCalCommittedAgentsPolicyLikelihoodIndexed(unittest.TestCase):
+    def setUp(self):
+        self.individualActionSpace = [(10, 0), (0, 10), (-10, 0), (0, -10), (0, 0)]
+        self.numOfAgentInPolicyFunctionList = [2, 3]
+        self.jointActionSpaceList = [list(it.product(self.individualActionSpace, repeat=numAgentsInWe))
+                                     for numAgentsInWe in self.numOfAgentInPolicyFunctionList]
+        self.concernedAgentsIds = [1, 2]
+        self.intentions = list(it.product([3, 4], [(0, 1, 2), (0, 1), (1, 2), (0, 2)])) + [(3, (0, ))]
+
+    def buildPolicyForCommittedAgent(self, distributionType, seed):
+        randomState = np.random.RandomState(seed)
+        jointActionDistributions = {}
+        for goalId, weIds in self.intentions:
+            jointActionSpace = self.jointActionSpaceList[self.numOfAgentInPolicyFunctionList.index(len(weIds))] if len(weIds) > 1 else []
+            probabilities = randomState.dirichlet(np.ones(len(jointActionSpace))) if len(jointActionSpace) > 0 else []
+            # some joint actions are impossible under the policy
+            probabilities = np.where(randomState.uniform(size=len(probabilities)) < 0.2, 0, probabilities)
+            probabilities = probabilities / np.sum(probabilities) if len(probabilities) > 0 else probabilities
+            jointActions = list(jointActionSpace)
+            if distributionType == 'shuffledDict':
+                order = randomState.permutation(len(jointActions))
+                jointActions, probabilities = [jointActions[index] for index in order], probabilities[order]
+            jointActionDistribution = dict(zip(jointActions, probabilities))
+            if distributionType == 'categorical':
+                jointActionDistribution = Categorical.fromDict(jointActionDistribution)
+            jointActionDistributions[(goalId, weIds)] = jointActionDistribution
+        return lambda state, goalId, weIds: jointActionDistributions[(goalId, tuple(weIds))]
+
+    @data(('dict', ), ('shuffledDict', ), ('categorical', ))
+    @unpack
+    def testMatchesDataFrameMarginalLikelihood(self, distributionType):
+        policyForCommittedAgent = self.buildPolicyForCommittedAgent(distributionType, 45)
+        calLikelihood = CalCommittedAgentsPolicyLikelihood(self.concernedAgentsIds, policyForCommittedAgent)
+        indexedJointActionSpaceList = [IndexedJointActionSpace(jointActionSpace) for jointActionSpace in self.jointActionSpaceList]
+        calLikelihoodIndexed = CalCommittedAgentsPolicyLikelihoodIndexed(self.concernedAgentsIds, policyForCommittedAgent,
+                                                                          indexedJointActionSpaceList, self.numOfAgentInPolicyFunctionList)
+        randomState = np.random.RandomState(46)
+        state = randomState.uniform(-1, 1, (5, 4))
+        for _ in range(30):
+            perceivedAction = [self.individualActionSpace[index] for index in randomState.randint(len(self.individualActionSpace), size=3)]
+            likelihoods = [calLikelihoodIndexed(intention, state, perceivedAction) for intention in self.intentions]
+            trueLikelihoods = [calLikelihood(intention, state, perceivedAction) for intention in self.intentions]
+            self.assertTrue(np.allclose(likelihoods, trueLikelihoods, rtol=1e-12, atol=1e-15))
+            self.assertEqual(likelihoods[-1], 1)
+
+    def testActionOutsideTheSpaceRaises(self):
+        policyForCommittedAgent = lambda state, goalId, weIds: {((10, 0), (0, 10), (1, 1)): 1.0}
+        indexedJointActionSpaceList = [IndexedJointActionSpace(jointActionSpace) for jointActionSpace in self.jointActionSpaceList]
+        calLikelihoodIndexed = CalCommittedAgentsPolicyLikelihoodIndexed(self.concernedAgentsIds, policyForCommittedAgent,
+                                                                          indexedJointActionSpaceList, self.numOfAgentInPolicyFunctionList)
+        with self.assertRaises(KeyError):
+            calLikelihoodIndexed((3, (0, 1, 2)), None, [(10, 0), (0, 10), (0, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..'))
+
+import numpy as np
+import itertools as it
+import unittest
+from ddt import ddt, data, unpack
+
+from src.inference.intention import UpdateIntention, IntentionHistory, expandIntentionHistories
+from src.sampleTrajectoryTools.resetObjectsForMultipleTrjaectory import ResetObjects, GetObjectsValuesOfAttributes, \
+    GetObjectsIntentionHistories
+from src.mathTools.distribution import maxFromDistribution
+
+
+@ddt
+class TestIntentionHistoryMatchesListHistory(unittest.TestCase):
+    def setUp(self):
+        self.intentions = list(it.product([3, 4, 5], [(0, 1, 2)]))
+        self.wolvesID = [0, 1, 2]
+        self.intentionResetAttributes = ['timeStep', 'lastState', 'lastAction', 'intentionPrior', 'formerIntentionPriors']
+
+    def inferIntentionOneStep(self, intentionPrior, state, perceivedAction):
+        # favours the goal nearest to the acting wolf; every other step the posterior lists its intentions in reverse
+        distances = np.array([np.linalg.norm(state[goalId] - perceivedAction) for goalId, weIds in intentionPrior])
+        unnormalizedPosterior = np.array(list(intentionPrior.values())) * np.exp(-distances)
+        posterior = dict(zip(intentionPrior.keys(), unnormalizedPosterior / np.sum(unnormalizedPosterior)))
+        return dict(reversed(list(posterior.items()))) if len(state) % 2 == 0 else posterior
+
+    def buildUpdateIntentions(self, priors, maxSteps):
+        return [UpdateIntention(prior, -1, None, lambda action: action, self.inferIntentionOneStep, maxFromDistribution, maxSteps)
+                for prior in priors]
+
+    def runTrial(self, updateIntentions, numSteps, seed):
+        randomState = np.random.RandomState(seed)
+        np.random.seed(seed)
+        for timeStep in range(numSteps):
+            state = randomState.uniform(-1, 1, (6 + timeStep % 2, 2))
+            [updateIntention(state) for updateIntention in updateIntentions]
+            for updateIntention in updateIntentions:
+                updateIntention.lastAction = randomState.uniform(-1, 1, 2)
+
+    @data((3, 10), (10, 10), (4, 25))
+    @unpack
+    def testRecordedPosteriorsMatchListHistory(self, maxSteps, numSteps):
+        randomState = np.random.RandomState(53)
+        priors = [dict(zip(self.intentions, randomState.dirichlet(np.ones(len(self.intentions))))) for _ in self.wolvesID]
+        listUpdateIntentions = self.buildUpdateIntentions(priors, None)
+        arrayUpdateIntentions = self.buildUpdateIntentions(priors, maxSteps)
+        self.runTrial(listUpdateIntentions, numSteps, 54)
+        self.runTrial(arrayUpdateIntentions, numSteps, 54)
+
+        for listUpdateIntention, arrayUpdateIntention in zip(listUpdateIntentions, arrayUpdateIntentions):
+            listHistory, arrayHistory = listUpdateIntention.formerIntentionPriors, arrayUpdateIntention.formerIntentionPriors
+            self.assertIsInstance(arrayHistory, IntentionHistory)
+            self.assertEqual(len(arrayHistory), len(listHistory))
+            for intentionDistribution, trueIntentionDistribution in zip(arrayHistory, listHistory):
+                self.assertEqual(set(intentionDistribution), set(trueIntentionDistribution))
+                self.assertTrue(np.allclose([intentionDistribution[intention] for intention in self.intentions],
+                                            [trueIntentionDistribution[intention] for intention in self.intentions], rtol=1e-15, atol=0))
+
+        listRecord = GetObjectsValuesOfAttributes(['formerIntentionPriors'], listUpdateIntentions)()
+        arrayRecord = expandIntentionHistories(GetObjectsIntentionHistories('formerIntentionPriors', arrayUpdateIntentions)())
+        self.assertEqual(len(arrayRecord), len(listRecord))
+        for (agentsDistributions, ), (trueAgentsDistributions, ) in zip(arrayRecord, listRecord):
+            self.assertEqual(len(agentsDistributions), len(trueAgentsDistributions))
+            for distribution, trueDistribution in zip(agentsDistributions, trueAgentsDistributions):
+                self.assertTrue(np.allclose([distribution[intention] for intention in self.intentions],
+                                            [trueDistribution[intention] for intention in self.intentions]))
+
+    def testResetStartsEveryTrialFromThePrior(self):
+        priors = [dict(zip(self.intentions, [0.2, 0.3, 0.5])) for _ in self.wolvesID]
+        listUpdateIntentions = self.buildUpdateIntentions(priors, None)
+        arrayUpdateIntentions = self.buildUpdateIntentions(priors, 5)
+        resetAttributeValues = [dict(zip(self.intentionResetAttributes, [0, None, None, prior, [prior]])) for prior in priors]
+        resetListIntentions = ResetObjects(resetAttributeValues, listUpdateIntentions)
+        resetArrayIntentions = ResetObjects(resetAttributeValues, arrayUpdateIntentions)
+        arrayHistories = [updateIntention.formerIntentionPriors for updateIntention in arrayUpdateIntentions]
+
+        for trialIndex, numSteps in enumerate([8, 3]):
+            resetListIntentions()
+            resetArrayIntentions()
+            self.runTrial(listUpdateIntentions, numSteps, 55 + trialIndex)
+            self.runTrial(arrayUpdateIntentions, numSteps, 55 + trialIndex)
+            for listUpdateIntention, arrayUpdateIntention, arrayHistory in zip(listUpdateIntentions, arrayUpdateIntentions, arrayHistories):
+                # the array history is rewound in place, not replaced
+                self.assertIs(arrayUpdateIntention.formerIntentionPriors, arrayHistory)
+                self.assertEqual(len(arrayHistory), numSteps + 1)
+                trueProbabilities = [[distribution[intention] for intention in self.intentions] for distribution in listUpdateIntention.formerIntentionPriors]
+                self.assertTrue(np.allclose(arrayHistory.toArray(), trueProbabilities, rtol=1e-15, atol=0))
+        self.assertEqual(priors[0], dict(zip(self.intentions, [0.2, 0.3, 0.5])))
+
+
+class TestGetObjectsIntentionHistories(unittest.TestCase):
+    def setUp(self):
+        self.intentions = list(it.product([3, 4], [(0, 1, 2)]))
+
+    def buildObject(self, intentions, probabilities):
+        updateIntention = UpdateIntention(dict(zip(intentions, probabilities[0])), -1, None, None, None, None, maxSteps=4)
+        [updateIntention.formerIntentionPriors.append(dict(zip(intentions, stepProbabilities))) for stepProbabilities in probabilities[1:]]
+        return updateIntention
+
+    def testStacksHistoriesOverSharedIntentions(self):
+        objects = [self.buildObject(self.intentions, [[0.5, 0.5], [0.2, 0.8]]), self.buildObject(self.intentions, [[0.5, 0.5], [0.9, 0.1]])]
+        intentionHistories = GetObjectsIntentionHistories('formerIntentionPriors', objects)()
+        self.assertEqual(intentionHistories['intentions'], self.intentions)
+        self.assertTrue(np.array_equal(intentionHistories['probabilities'], [[[0.5, 0.5], [0.2, 0.8]], [[0.5, 0.5], [0.9, 0.1]]]))
+
+    def testDifferentIntentionsRaise(self):
+        objects = [self.buildObject(self.intentions, [[0.2, 0.8]]), self.buildObject(self.intentions[::-1], [[0.8, 0.2]])]
+        with self.assertRaises(ValueError):
+            GetObjectsIntentionHistories('formerIntentionPriors', objects)()
+        objects[1] = self.buildObject([(3, (0, 1, 2)), (5, (0, 1, 2))], [[0.2, 0.8]])
+        with self.assertRaises(ValueError):
+            GetObjectsIntentionHistories('formerIntentionPriors', objects)()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..'))
+
+import numpy as np
+import unittest
+from ddt import ddt, data, unpack
+
+from src.inference.percept import SampleNoisyAction, MappingActionToAnotherSpace, PerceptImaginedWeAction, \
+    SampleNoisyActionBatch, MappingActionToAnotherSpaceBatch, PerceptImaginedWeActionVectorized
+
+
+@ddt
+class TestMappingActionToAnotherSpaceBatch(unittest.TestCase):
+    def setUp(self):
+        self.actionSpace = [(10, 0), (7, 7), (0, 10), (-7, 7), (-10, 0), (-7, -7), (0, -10), (7, -7), (0, 0)]
+        self.mappingAction = MappingActionToAnotherSpace(self.actionSpace)
+        self.mappingActionBatch = MappingActionToAnotherSpaceBatch(self.actionSpace)
+
+    @data((1, ), (6, ), (50, ))
+    @unpack
+    def testBatchMatchesPerActionMapping(self, numActions):
+        randomState = np.random.RandomState(4)
+        actions = randomState.uniform(-12, 12, (numActions, 2))
+        perceivedActions = np.array([self.mappingAction(action) for action in actions])
+        self.assertTrue(np.array_equal(self.mappingActionBatch(actions, randomState), perceivedActions))
+
+    def testBatchOfTimesteps(self):
+        randomState = np.random.RandomState(5)
+        actions = randomState.uniform(-12, 12, (20, 3, 2))
+        perceivedActions = np.array([[self.mappingAction(action) for action in timeStep] for timeStep in actions])
+        self.assertTrue(np.array_equal(self.mappingActionBatch(actions, randomState), perceivedActions))
+
+    @data(((8.5, 3.5), [(10, 0), (7, 7)]), ((0, 5), [(0, 10), (0, 0)]))
+    @unpack
+    def testTiesAreBrokenAtRandomAmongNearest(self, action, nearestActions):
+        randomState = np.random.RandomState(6)
+        perceivedActions = self.mappingActionBatch([action] * 200, randomState)
+        self.assertEqual(set(map(tuple, perceivedActions)), set(nearestActions))
+
+
+@ddt
+class TestPerceptImaginedWeActionVectorized(unittest.TestCase):
+    @data(([0, 1, 2], ), ([2, 0], ), ([1, 2, 0], ))
+    @unpack
+    def testNoiselessPerceptMatchesPerAgentPercept(self, imaginedWeId):
+        objectiveTokenAction = np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+        perceptAction = PerceptImaginedWeAction(imaginedWeId, SampleNoisyAction(0), SampleNoisyAction(0))
+        perceptActionVectorized = PerceptImaginedWeActionVectorized(imaginedWeId, 0, 0)
+        self.assertTrue(np.array_equal(perceptActionVectorized(objectiveTokenAction), perceptAction(objectiveTokenAction)))
+
+    @data((0.5, 2.0), (1.0, 1.0))
+    @unpack
+    def testNoiseOfSelfAndOthers(self, selfNoise, otherNoise):
+        randomState = np.random.RandomState(7)
+        objectiveTokenAction = np.tile([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], (20000, 1, 1))
+        perceptActionVectorized = PerceptImaginedWeActionVectorized([1, 0, 2], selfNoise, otherNoise)
+        perceivedAction = perceptActionVectorized(objectiveTokenAction, randomState)
+        self.assertTrue(np.allclose(np.mean(perceivedAction, axis=0), objectiveTokenAction[0, [1, 0, 2]], atol=0.05))
+        self.assertTrue(np.allclose(np.std(perceivedAction, axis=0), [[selfNoise] * 2, [otherNoise] * 2, [otherNoise] * 2], rtol=0.05))
+
+    def testNoisyActionBatchMatchesPerActionDistribution(self):
+        randomState = np.random.RandomState(8)
+        perceivedActions = SampleNoisyActionBatch(0.3)(np.tile([2.0, -1.0], (20000, 1)), randomState)
+        self.assertTrue(np.allclose(np.mean(perceivedActions, axis=0), [2.0, -1.0], atol=0.02))
+        self.assertTrue(np.allclose(np.std(perceivedActions, axis=0), [0.3, 0.3], rtol=0.05))
+
+
+if __name__ == '__main__':
+    unittest.main()
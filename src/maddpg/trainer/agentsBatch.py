@@ -0,0 +1,3 @@
+class AgentsBatch(list):
+    # one stacked array per agent, fed to that agent's placeholder as is
+    pass
@@ -4,181 +4,261 @@ import os
 os.environ['KMP_DUPLICATE_LIB_OK']='True'
 import tensorflow.contrib.layers as layers
 import src.maddpg.common.tf_util as U
+from src.maddpg.trainer.agentsBatch import AgentsBatch
 
 from scipy.special import softmax
 
+class AgentGraphInSharedGraph:
+    def __init__(self, graph, agentIndex):
+        self.graph = graph
+        self.agentIndex = agentIndex
+
+    def get_collection_ref(self, name):
+        # every agent built into the shared graph adds one entry to each collection, in build order
+        return [self.graph.get_collection_ref(name)[self.agentIndex]]
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+
+class AgentModelInSharedSession:
+    def __init__(self, sharedSession, agentIndex):
+        self.sharedSession = sharedSession
+        self.graph = AgentGraphInSharedGraph(sharedSession.graph, agentIndex)
+
+    def run(self, *args, **kwargs):
+        return self.sharedSession.run(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.sharedSession, name)
+
+
 class BuildMADDPGModels:
-    def __init__(self, actionDim, numAgents, obsShapeList, actionRange = 1):
+    def __init__(self, actionDim, numAgents, obsShapeList, actionRange = 1, shareSession = False):
         self.actionDim = actionDim
         self.numAgents = numAgents
         self.obsShapeList = obsShapeList
         self.actionRange = actionRange
         self.gradNormClipping = 0.5
+        self.shareSession = shareSession
+        self.sharedGraph = None
+        self.sharedSession = None
+        self.numAgentsInSharedGraph = 0
 
     def __call__(self, layersWidths, agentID):
-        agentStr = 'Agent' + str(agentID)
+        if self.shareSession:
+            return self.buildAgentInSharedSession(layersWidths, agentID)
+
         graph = tf.Graph()
         with graph.as_default():
-            with tf.variable_scope("inputs/"+ agentStr):
-                allAgentsStates_ = [tf.placeholder(dtype=tf.float32, shape=[None, agentObsDim], name="state"+str(i)) for i, agentObsDim in enumerate(self.obsShapeList)]
-                allAgentsNextStates_ =  [tf.placeholder(dtype=tf.float32, shape=[None, agentObsDim], name="nextState"+str(i)) for i, agentObsDim in enumerate(self.obsShapeList)]
+            self.buildAgentOps(layersWidths, agentID)
 
-                allAgentsActions_ = [tf.placeholder(dtype=tf.float32, shape=[None, self.actionDim], name="action"+str(i)) for i in range(self.numAgents)]
-                allAgentsNextActionsByTargetNet_ = [tf.placeholder(dtype=tf.float32, shape=[None, self.actionDim], name= "actionTarget"+str(i)) for i in range(self.numAgents)]
+            saver = tf.train.Saver(max_to_keep=None)
+            tf.add_to_collection("saver", saver)
 
-                agentReward_ = tf.placeholder(tf.float32, [None, 1], name='reward_')
+            model = tf.Session(graph=graph)
+            model.run(tf.global_variables_initializer())
 
-                tf.add_to_collection("allAgentsStates_", allAgentsStates_)
-                tf.add_to_collection("allAgentsNextStates_", allAgentsNextStates_)
-                tf.add_to_collection("allAgentsActions_", allAgentsActions_)
-                tf.add_to_collection("allAgentsNextActionsByTargetNet_", allAgentsNextActionsByTargetNet_)
-                tf.add_to_collection("agentReward_", agentReward_)
+            # writer = tf.summary.FileWriter('tensorBoard/onlineDDPG/'+ agentStr, graph= graph)
+            # tf.add_to_collection("writer", writer)
 
-            with tf.variable_scope("trainingParams" + agentStr):
-                learningRate_ = tf.constant(0, dtype=tf.float32)
-                tau_ = tf.constant(0, dtype=tf.float32)
-                gamma_ = tf.constant(0, dtype=tf.float32)
+        return model
 
-                tf.add_to_collection("learningRate_", learningRate_)
-                tf.add_to_collection("tau_", tau_)
-                tf.add_to_collection("gamma_", gamma_)
+    def buildAgentInSharedSession(self, layersWidths, agentID):
+        # all agents of one builder live in one graph and one session, so their ops can go in a single run
+        if self.sharedGraph is None:
+            self.sharedGraph = tf.Graph()
+            self.sharedSession = tf.Session(graph=self.sharedGraph)
 
-            with tf.variable_scope("actor/trainHidden/"+ agentStr): # act by personal observation
-                currentAgentState_ = allAgentsStates_[agentID]
-                actorTrainActivation_ = currentAgentState_
+        with self.sharedGraph.as_default():
+            numVariablesBefore = len(tf.global_variables())
+            self.buildAgentOps(layersWidths, agentID)
+            agentVariables = tf.global_variables()[numVariablesBefore:]
 
-                for i in range(len(layersWidths)):
-                    actorTrainActivation_ = layers.fully_connected(actorTrainActivation_, num_outputs= layersWidths[i],
-                                                                   activation_fn=tf.nn.relu)
+            # variables are all under Agent{id} scopes, so the names match a separately built model (see testMyMADDPG)
+            saver = tf.train.Saver({variable.op.name: variable for variable in agentVariables}, max_to_keep=None)
+            tf.add_to_collection("saver", saver)
 
-                actorTrainActivation_ = layers.fully_connected(actorTrainActivation_, num_outputs= self.actionDim,
-                                                               activation_fn= None)
+            self.sharedSession.run(tf.variables_initializer(agentVariables))
 
-            with tf.variable_scope("actor/targetHidden/"+ agentStr):
-                currentAgentNextState_ = allAgentsNextStates_[agentID]
-                actorTargetActivation_ = currentAgentNextState_
+        model = AgentModelInSharedSession(self.sharedSession, self.numAgentsInSharedGraph)
+        self.numAgentsInSharedGraph += 1
+        return model
 
-                for i in range(len(layersWidths)):
-                    actorTargetActivation_ = layers.fully_connected(actorTargetActivation_, num_outputs= layersWidths[i],
-                                                                    activation_fn=tf.nn.relu)
+    def buildAgentOps(self, layersWidths, agentID):
+        agentStr = 'Agent' + str(agentID)
+        with tf.variable_scope("inputs/"+ agentStr):
+            allAgentsStates_ = [tf.placeholder(dtype=tf.float32, shape=[None, agentObsDim], name="state"+str(i)) for i, agentObsDim in enumerate(self.obsShapeList)]
+            allAgentsNextStates_ =  [tf.placeholder(dtype=tf.float32, shape=[None, agentObsDim], name="nextState"+str(i)) for i, agentObsDim in enumerate(self.obsShapeList)]
 
-                actorTargetActivation_ = layers.fully_connected(actorTargetActivation_, num_outputs= self.actionDim,
-                                                                activation_fn=None)
+            allAgentsActions_ = [tf.placeholder(dtype=tf.float32, shape=[None, self.actionDim], name="action"+str(i)) for i in range(self.numAgents)]
+            allAgentsNextActionsByTargetNet_ = [tf.placeholder(dtype=tf.float32, shape=[None, self.actionDim], name= "actionTarget"+str(i)) for i in range(self.numAgents)]
 
-            with tf.variable_scope("actorNetOutput/"+ agentStr):
-                trainAction_ = tf.multiply(actorTrainActivation_, self.actionRange, name='trainAction_')
-                targetAction_ = tf.multiply(actorTargetActivation_, self.actionRange, name='targetAction_')
+            agentReward_ = tf.placeholder(tf.float32, [None, 1], name='reward_')
 
-                sampleNoiseTrain_ = tf.random_uniform(tf.shape(trainAction_))
-                noisyTrainAction_ = U.softmax(trainAction_ - tf.log(-tf.log(sampleNoiseTrain_)), axis=-1) # give this to q input
+            tf.add_to_collection("allAgentsStates_", allAgentsStates_)
+            tf.add_to_collection("allAgentsNextStates_", allAgentsNextStates_)
+            tf.add_to_collection("allAgentsActions_", allAgentsActions_)
+            tf.add_to_collection("allAgentsNextActionsByTargetNet_", allAgentsNextActionsByTargetNet_)
+            tf.add_to_collection("agentReward_", agentReward_)
 
-                sampleNoiseTarget_ = tf.random_uniform(tf.shape(targetAction_))
-                noisyTargetAction_ = U.softmax(targetAction_ - tf.log(-tf.log(sampleNoiseTarget_)), axis=-1)
+        with tf.variable_scope("trainingParams" + agentStr):
+            learningRate_ = tf.constant(0, dtype=tf.float32)
+            tau_ = tf.constant(0, dtype=tf.float32)
+            gamma_ = tf.constant(0, dtype=tf.float32)
 
-                tf.add_to_collection("trainAction_", trainAction_)
-                tf.add_to_collection("targetAction_", targetAction_)
+            tf.add_to_collection("learningRate_", learningRate_)
+            tf.add_to_collection("tau_", tau_)
+            tf.add_to_collection("gamma_", gamma_)
 
-                tf.add_to_collection("noisyTrainAction_", noisyTrainAction_)
-                tf.add_to_collection("noisyTargetAction_", noisyTargetAction_)
+        with tf.variable_scope("actor/trainHidden/"+ agentStr): # act by personal observation
+            currentAgentState_ = allAgentsStates_[agentID]
+            actorTrainActivation_ = currentAgentState_
 
+            for i in range(len(layersWidths)):
+                actorTrainActivation_ = layers.fully_connected(actorTrainActivation_, num_outputs= layersWidths[i],
+                                                               activation_fn=tf.nn.relu)
 
-            with tf.variable_scope("critic/trainHidden/"+ agentStr):
-                criticTrainActivationOfGivenAction_ = tf.concat(allAgentsStates_ + allAgentsActions_, axis=1)
+            actorTrainActivation_ = layers.fully_connected(actorTrainActivation_, num_outputs= self.actionDim,
+                                                           activation_fn= None)
 
-                for i in range(len(layersWidths)):
-                    criticTrainActivationOfGivenAction_ = layers.fully_connected(criticTrainActivationOfGivenAction_, num_outputs= layersWidths[i], activation_fn=tf.nn.relu)
+        with tf.variable_scope("actor/targetHidden/"+ agentStr):
+            currentAgentNextState_ = allAgentsNextStates_[agentID]
+            actorTargetActivation_ = currentAgentNextState_
 
-                criticTrainActivationOfGivenAction_ = layers.fully_connected(criticTrainActivationOfGivenAction_, num_outputs= 1, activation_fn= None)
+            for i in range(len(layersWidths)):
+                actorTargetActivation_ = layers.fully_connected(actorTargetActivation_, num_outputs= layersWidths[i],
+                                                                activation_fn=tf.nn.relu)
 
-            with tf.variable_scope("critic/trainHidden/" + agentStr, reuse= True):
-                criticInputActionList = allAgentsActions_ + []
-                criticInputActionList[agentID] = noisyTrainAction_
-                criticTrainActivation_ = tf.concat(allAgentsStates_ + criticInputActionList, axis=1)
+            actorTargetActivation_ = layers.fully_connected(actorTargetActivation_, num_outputs= self.actionDim,
+                                                            activation_fn=None)
 
-                for i in range(len(layersWidths)):
-                    criticTrainActivation_ = layers.fully_connected(criticTrainActivation_, num_outputs=layersWidths[i], activation_fn=tf.nn.relu)
+        with tf.variable_scope("actorNetOutput/"+ agentStr):
+            actionRange_ = tf.constant(self.actionRange, dtype=tf.float32, name='actionRange_')
+            tf.add_to_collection("actionRange_", actionRange_)
 
-                criticTrainActivation_ = layers.fully_connected(criticTrainActivation_, num_outputs=1, activation_fn=None)
+            trainAction_ = tf.multiply(actorTrainActivation_, actionRange_, name='trainAction_')
+            targetAction_ = tf.multiply(actorTargetActivation_, actionRange_, name='targetAction_')
 
-            with tf.variable_scope("critic/targetHidden/"+ agentStr):
-                criticTargetActivation_ = tf.concat(allAgentsNextStates_ + allAgentsNextActionsByTargetNet_, axis=1)
-                for i in range(len(layersWidths)):
-                    criticTargetActivation_ = layers.fully_connected(criticTargetActivation_, num_outputs= layersWidths[i],activation_fn=tf.nn.relu)
+            sampleNoiseTrain_ = tf.random_uniform(tf.shape(trainAction_))
+            noisyTrainAction_ = U.softmax(trainAction_ - tf.log(-tf.log(sampleNoiseTrain_)), axis=-1) # give this to q input
 
-                criticTargetActivation_ = layers.fully_connected(criticTargetActivation_, num_outputs= 1,activation_fn=None)
+            sampleNoiseTarget_ = tf.random_uniform(tf.shape(targetAction_))
+            noisyTargetAction_ = U.softmax(targetAction_ - tf.log(-tf.log(sampleNoiseTarget_)), axis=-1)
 
-            with tf.variable_scope("updateParameters/"+ agentStr):
-                actorTrainParams_ = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='actor/trainHidden/'+ agentStr)
-                actorTargetParams_ = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='actor/targetHidden/'+ agentStr)
-                actorUpdateParam_ = [actorTargetParams_[i].assign((1 - tau_) * actorTargetParams_[i] + tau_ * actorTrainParams_[i]) for i in range(len(actorTargetParams_))]
+            tf.add_to_collection("trainAction_", trainAction_)
+            tf.add_to_collection("targetAction_", targetAction_)
 
-                tf.add_to_collection("actorTrainParams_", actorTrainParams_)
-                tf.add_to_collection("actorTargetParams_", actorTargetParams_)
-                tf.add_to_collection("actorUpdateParam_", actorUpdateParam_)
+            tf.add_to_collection("noisyTrainAction_", noisyTrainAction_)
+            tf.add_to_collection("noisyTargetAction_", noisyTargetAction_)
 
-                hardReplaceActorTargetParam_ = [tf.assign(trainParam, targetParam) for trainParam, targetParam in zip(actorTrainParams_, actorTargetParams_)]
-                tf.add_to_collection("hardReplaceActorTargetParam_", hardReplaceActorTargetParam_)
 
-                criticTrainParams_ = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='critic/trainHidden/'+ agentStr)
-                criticTargetParams_ = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='critic/targetHidden/'+ agentStr)
+        with tf.variable_scope("critic/trainHidden/"+ agentStr):
+            criticTrainActivationOfGivenAction_ = tf.concat(allAgentsStates_ + allAgentsActions_, axis=1)
 
-                criticUpdateParam_ = [criticTargetParams_[i].assign((1 - tau_) * criticTargetParams_[i] + tau_ * criticTrainParams_[i]) for i in range(len(criticTargetParams_))]
+            for i in range(len(layersWidths)):
+                criticTrainActivationOfGivenAction_ = layers.fully_connected(criticTrainActivationOfGivenAction_, num_outputs= layersWidths[i], activation_fn=tf.nn.relu)
 
-                tf.add_to_collection("criticTrainParams_", criticTrainParams_)
-                tf.add_to_collection("criticTargetParams_", criticTargetParams_)
-                tf.add_to_collection("criticUpdateParam_", criticUpdateParam_)
+            criticTrainActivationOfGivenAction_ = layers.fully_connected(criticTrainActivationOfGivenAction_, num_outputs= 1, activation_fn= None)
 
-                hardReplaceCriticTargetParam_ = [tf.assign(trainParam, targetParam) for trainParam, targetParam in zip(criticTrainParams_, criticTargetParams_)]
-                tf.add_to_collection("hardReplaceCriticTargetParam_", hardReplaceCriticTargetParam_)
+        with tf.variable_scope("critic/trainHidden/" + agentStr, reuse= True):
+            criticInputActionList = allAgentsActions_ + []
+            criticInputActionList[agentID] = noisyTrainAction_
+            criticTrainActivation_ = tf.concat(allAgentsStates_ + criticInputActionList, axis=1)
 
-                updateParam_ = actorUpdateParam_ + criticUpdateParam_
-                hardReplaceTargetParam_ = hardReplaceActorTargetParam_ + hardReplaceCriticTargetParam_
-                tf.add_to_collection("updateParam_", updateParam_)
-                tf.add_to_collection("hardReplaceTargetParam_", hardReplaceTargetParam_)
+            for i in range(len(layersWidths)):
+                criticTrainActivation_ = layers.fully_connected(criticTrainActivation_, num_outputs=layersWidths[i], activation_fn=tf.nn.relu)
 
+            criticTrainActivation_ = layers.fully_connected(criticTrainActivation_, num_outputs=1, activation_fn=None)
 
-            with tf.variable_scope("trainActorNet/"+ agentStr):
-                trainQ = criticTrainActivation_[:, 0]
-                pg_loss = -tf.reduce_mean(trainQ)
-                p_reg = tf.reduce_mean(tf.square(actorTrainActivation_))
-                actorLoss_ = pg_loss + p_reg * 1e-3
+        with tf.variable_scope("critic/targetHidden/"+ agentStr):
+            criticTargetActivation_ = tf.concat(allAgentsNextStates_ + allAgentsNextActionsByTargetNet_, axis=1)
+            for i in range(len(layersWidths)):
+                criticTargetActivation_ = layers.fully_connected(criticTargetActivation_, num_outputs= layersWidths[i],activation_fn=tf.nn.relu)
 
-                actorOptimizer = tf.train.AdamOptimizer(learningRate_, name='actorOptimizer')
-                actorTrainOpt_ = U.minimize_and_clip(actorOptimizer, actorLoss_, actorTrainParams_, self.gradNormClipping)
+            criticTargetActivation_ = layers.fully_connected(criticTargetActivation_, num_outputs= 1,activation_fn=None)
 
-                tf.add_to_collection("actorLoss_", actorLoss_)
-                tf.add_to_collection("actorTrainOpt_", actorTrainOpt_)
+        with tf.variable_scope("updateParameters/"+ agentStr):
+            actorTrainParams_ = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='actor/trainHidden/'+ agentStr)
+            actorTargetParams_ = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='actor/targetHidden/'+ agentStr)
+            actorUpdateParam_ = [actorTargetParams_[i].assign((1 - tau_) * actorTargetParams_[i] + tau_ * actorTrainParams_[i]) for i in range(len(actorTargetParams_))]
 
-            with tf.variable_scope("trainCriticNet/"+ agentStr):
-                yi_ = agentReward_ + gamma_ * criticTargetActivation_
-                criticLoss_ = tf.reduce_mean(tf.squared_difference(tf.squeeze(yi_), tf.squeeze(criticTrainActivationOfGivenAction_)))
+            tf.add_to_collection("actorTrainParams_", actorTrainParams_)
+            tf.add_to_collection("actorTargetParams_", actorTargetParams_)
+            tf.add_to_collection("actorUpdateParam_", actorUpdateParam_)
 
-                tf.add_to_collection("yi_", yi_)
-                tf.add_to_collection("valueLoss_", criticLoss_)
+            hardReplaceActorTargetParam_ = [tf.assign(trainParam, targetParam) for trainParam, targetParam in zip(actorTrainParams_, actorTargetParams_)]
+            tf.add_to_collection("hardReplaceActorTargetParam_", hardReplaceActorTargetParam_)
 
-                criticOptimizer = tf.train.AdamOptimizer(learningRate_, name='criticOptimizer')
-                crticTrainOpt_ = U.minimize_and_clip(criticOptimizer, criticLoss_, criticTrainParams_, self.gradNormClipping)
+            criticTrainParams_ = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='critic/trainHidden/'+ agentStr)
+            criticTargetParams_ = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='critic/targetHidden/'+ agentStr)
 
-                tf.add_to_collection("crticTrainOpt_", crticTrainOpt_)
+            criticUpdateParam_ = [criticTargetParams_[i].assign((1 - tau_) * criticTargetParams_[i] + tau_ * criticTrainParams_[i]) for i in range(len(criticTargetParams_))]
 
-            with tf.variable_scope("summary"+ agentStr):
-                criticLossSummary = tf.identity(criticLoss_)
-                tf.add_to_collection("criticLossSummary", criticLossSummary)
-                tf.summary.scalar("criticLossSummary", criticLossSummary)
+            tf.add_to_collection("criticTrainParams_", criticTrainParams_)
+            tf.add_to_collection("criticTargetParams_", criticTargetParams_)
+            tf.add_to_collection("criticUpdateParam_", criticUpdateParam_)
 
-            fullSummary = tf.summary.merge_all()
-            tf.add_to_collection("summaryOps", fullSummary)
+            hardReplaceCriticTargetParam_ = [tf.assign(trainParam, targetParam) for trainParam, targetParam in zip(criticTrainParams_, criticTargetParams_)]
+            tf.add_to_collection("hardReplaceCriticTargetParam_", hardReplaceCriticTargetParam_)
 
-            saver = tf.train.Saver(max_to_keep=None)
-            tf.add_to_collection("saver", saver)
+            updateParam_ = actorUpdateParam_ + criticUpdateParam_
+            hardReplaceTargetParam_ = hardReplaceActorTargetParam_ + hardReplaceCriticTargetParam_
+            tf.add_to_collection("updateParam_", updateParam_)
+            tf.add_to_collection("hardReplaceTargetParam_", hardReplaceTargetParam_)
 
-            model = tf.Session(graph=graph)
-            model.run(tf.global_variables_initializer())
 
-            # writer = tf.summary.FileWriter('tensorBoard/onlineDDPG/'+ agentStr, graph= graph)
-            # tf.add_to_collection("writer", writer)
+        with tf.variable_scope("trainActorNet/"+ agentStr):
+            trainQ = criticTrainActivation_[:, 0]
+            pg_loss = -tf.reduce_mean(trainQ)
+            p_reg = tf.reduce_mean(tf.square(actorTrainActivation_))
+            actorLoss_ = pg_loss + p_reg * 1e-3
+
+            actorOptimizer = tf.train.AdamOptimizer(learningRate_, name='actorOptimizer')
+            actorTrainOpt_ = U.minimize_and_clip(actorOptimizer, actorLoss_, actorTrainParams_, self.gradNormClipping)
+
+            tf.add_to_collection("actorLoss_", actorLoss_)
+            tf.add_to_collection("actorTrainOpt_", actorTrainOpt_)
+
+        with tf.variable_scope("trainCriticNet/"+ agentStr):
+            yi_ = agentReward_ + gamma_ * criticTargetActivation_
+            criticLoss_ = tf.reduce_mean(tf.squared_difference(tf.squeeze(yi_), tf.squeeze(criticTrainActivationOfGivenAction_)))
+
+            tf.add_to_collection("yi_", yi_)
+            tf.add_to_collection("valueLoss_", criticLoss_)
+
+            criticOptimizer = tf.train.AdamOptimizer(learningRate_, name='criticOptimizer')
+            crticTrainOpt_ = U.minimize_and_clip(criticOptimizer, criticLoss_, criticTrainParams_, self.gradNormClipping)
+
+            tf.add_to_collection("crticTrainOpt_", crticTrainOpt_)
+
+        with tf.variable_scope("summary"+ agentStr):
+            criticLossSummary = tf.identity(criticLoss_)
+            tf.add_to_collection("criticLossSummary", criticLossSummary)
+            criticLossSummaryOp_ = tf.summary.scalar("criticLossSummary", criticLossSummary)
+
+        # only this agent's summary, merge_all would pull in the other agents of a shared graph
+        fullSummary = tf.summary.merge([criticLossSummaryOp_])
+        tf.add_to_collection("summaryOps", fullSummary)
+
+def getAgentsFeedDict(allAgentsPlaceholders_, allAgentsBatch):
+    # batches from ArrayReplayBuffer are already split by agent, others are lists of time steps
+    if isinstance(allAgentsBatch, AgentsBatch):
+        return dict(zip(allAgentsPlaceholders_, allAgentsBatch))
+    return {agentPlaceholder_: [timeStep[i] for timeStep in allAgentsBatch] for i, agentPlaceholder_ in enumerate(allAgentsPlaceholders_)}
+
+
+def getAgentRewardBatch(allAgentsRewardBatch, agentID):
+    if isinstance(allAgentsRewardBatch, AgentsBatch):
+        return allAgentsRewardBatch[agentID][:, None]
+    return [[reward[agentID]] for reward in allAgentsRewardBatch]
+
+
+def splitMiniBatch(miniBatch):
+    if isinstance(miniBatch[0], AgentsBatch):
+        return miniBatch
+    return list(zip(*miniBatch))
 
-        return model
 
 class ActOneStep:
     def __init__(self, actByTrainNoisy):
@@ -193,7 +273,7 @@ def actByPolicyTrainNoNoisy(model, allAgentsStatesBatch):
     graph = model.graph
     allAgentsStates_ = graph.get_collection_ref("allAgentsStates_")[0]
     trainAction_ = graph.get_collection_ref("trainAction_")[0]
-    stateDict = {agentState_: [states[i] for states in allAgentsStatesBatch] for i, agentState_ in enumerate(allAgentsStates_)}
+    stateDict = getAgentsFeedDict(allAgentsStates_, allAgentsStatesBatch)
 
     trainAction = model.run(trainAction_, feed_dict= stateDict)
     normalizedTrainAction = softmax(trainAction, axis = 1)
@@ -204,7 +284,7 @@ def actByPolicyTrainNoisy(model, allAgentsStatesBatch):
     graph = model.graph
     allAgentsStates_ = graph.get_collection_ref("allAgentsStates_")[0]
     noisyTrainAction_ = graph.get_collection_ref("noisyTrainAction_")[0]
-    stateDict = {agentState_: [states[i] for states in allAgentsStatesBatch] for i, agentState_ in enumerate(allAgentsStates_)}
+    stateDict = getAgentsFeedDict(allAgentsStates_, allAgentsStatesBatch)
 
     noisyTrainAction = model.run(noisyTrainAction_, feed_dict= stateDict)
 
@@ -216,23 +296,45 @@ def actByPolicyTargetNoisyForNextState(model, allAgentsNextStatesBatch):
     allAgentsNextStates_ = graph.get_collection_ref("allAgentsNextStates_")[0]
     noisyTargetAction_ = graph.get_collection_ref("noisyTargetAction_")[0]
 
-    nextStateDict = {agentNextState_: [states[i] for states in allAgentsNextStatesBatch] for i, agentNextState_ in enumerate(allAgentsNextStates_)}
+    nextStateDict = getAgentsFeedDict(allAgentsNextStates_, allAgentsNextStatesBatch)
     noisyTargetAction = model.run(noisyTargetAction_, feed_dict= nextStateDict)
 
     return noisyTargetAction
 
 
+def actByPoliciesTargetNoisyForNextState(allAgentsModels, allAgentsNextStatesBatch):
+    sharedSessions = {id(getattr(model, 'sharedSession', model)) for model in allAgentsModels}
+    if len(allAgentsModels) == 1 or len(sharedSessions) != 1:
+        return [actByPolicyTargetNoisyForNextState(model, allAgentsNextStatesBatch) for model in allAgentsModels]
+
+    # agents built with shareSession run their target actors together
+    noisyTargetActions_ = [model.graph.get_collection_ref("noisyTargetAction_")[0] for model in allAgentsModels]
+    nextStateDict = {}
+    for model in allAgentsModels:
+        nextStateDict.update(getAgentsFeedDict(model.graph.get_collection_ref("allAgentsNextStates_")[0], allAgentsNextStatesBatch))
+    noisyTargetActions = allAgentsModels[0].run(noisyTargetActions_, feed_dict= nextStateDict)
+
+    return noisyTargetActions
+
+
 
 class TrainCriticBySASR:
-    def __init__(self, actByPolicyTargetNoisyForNextState, criticLearningRate, gamma):
+    def __init__(self, actByPolicyTargetNoisyForNextState, criticLearningRate, gamma, actByPoliciesTargetNoisyForNextState = None):
         self.actByPolicyTargetNoisyForNextState = actByPolicyTargetNoisyForNextState
         self.criticLearningRate = criticLearningRate
         self.gamma = gamma
+        self.actByPoliciesTargetNoisyForNextState = actByPoliciesTargetNoisyForNextState
         self.runCount = 0
 
-    def __call__(self, agentID, allAgentsModels, allAgentsStateBatch, allAgentsActionsBatch, allAgentsNextStatesBatch, allAgentsRewardBatch):
+    def getAllAgentsNextTargetActions(self, allAgentsModels, allAgentsNextStatesBatch):
+        if self.actByPoliciesTargetNoisyForNextState is not None:
+            return self.actByPoliciesTargetNoisyForNextState(allAgentsModels, allAgentsNextStatesBatch)
+        return [self.actByPolicyTargetNoisyForNextState(model, allAgentsNextStatesBatch) for model in allAgentsModels]
+
+    def __call__(self, agentID, allAgentsModels, allAgentsStateBatch, allAgentsActionsBatch, allAgentsNextStatesBatch, allAgentsRewardBatch,
+                 allAgentsNextTargetActions = None):
         agentModel = allAgentsModels[agentID]
-        agentReward = [[reward[agentID]] for reward in allAgentsRewardBatch]
+        agentReward = getAgentRewardBatch(allAgentsRewardBatch, agentID)
         graph = agentModel.graph
 
         allAgentsStates_ = graph.get_collection_ref("allAgentsStates_")[0]#
@@ -254,12 +356,14 @@ class TrainCriticBySASR:
         # actionDict = {action_: actionBatch for action_, actionBatch in zip(allAgentsActions_, allAgentsActionsBatch)}
         valueDict = {agentReward_: agentReward, learningRate_: self.criticLearningRate, gamma_: self.gamma}
 
-        stateDict = {agentState_: [states[i] for states in allAgentsStateBatch] for i, agentState_ in enumerate(allAgentsStates_)}
-        actionDict = {agentAction_: [actions[i] for actions in allAgentsActionsBatch] for i, agentAction_ in enumerate(allAgentsActions_)}
-        nextStateDict = {agentNextState_: [states[i] for states in allAgentsNextStatesBatch] for i, agentNextState_ in enumerate(allAgentsNextStates_)}
+        stateDict = getAgentsFeedDict(allAgentsStates_, allAgentsStateBatch)
+        actionDict = getAgentsFeedDict(allAgentsActions_, allAgentsActionsBatch)
+        nextStateDict = getAgentsFeedDict(allAgentsNextStates_, allAgentsNextStatesBatch)
 
-        getAgentNextAction = lambda agentID: self.actByPolicyTargetNoisyForNextState(allAgentsModels[agentID], allAgentsNextStatesBatch)
-        nextActionDict = {nextAction_: getAgentNextAction(i) for i, nextAction_ in enumerate(allAgentsNextActionsByTargetNet_)}
+        if allAgentsNextTargetActions is None:
+            getAgentNextAction = lambda agentID: self.actByPolicyTargetNoisyForNextState(allAgentsModels[agentID], allAgentsNextStatesBatch)
+            allAgentsNextTargetActions = [getAgentNextAction(i) for i in range(len(allAgentsNextActionsByTargetNet_))]
+        nextActionDict = dict(zip(allAgentsNextActionsByTargetNet_, allAgentsNextTargetActions))
 
 
         criticSummary, criticLoss, crticTrainOpt = agentModel.run([criticSummary_, valueLoss_, crticTrainOpt_],
@@ -276,9 +380,14 @@ class TrainCritic:
     def __init__(self, trainCriticBySASR):
         self.trainCriticBySASR = trainCriticBySASR
 
-    def __call__(self, agentID, allAgentsModels, miniBatch):
-        allAgentsStateBatch, allAgentsActionsBatch, allAgentsRewardBatch, allAgentsNextStatesBatch = list(zip(*miniBatch))
-        criticLoss, agentModel = self.trainCriticBySASR(agentID, allAgentsModels, allAgentsStateBatch, allAgentsActionsBatch, allAgentsNextStatesBatch, allAgentsRewardBatch)
+    def getAllAgentsNextTargetActions(self, allAgentsModels, miniBatch):
+        allAgentsStateBatch, allAgentsActionsBatch, allAgentsRewardBatch, allAgentsNextStatesBatch = splitMiniBatch(miniBatch)
+        return self.trainCriticBySASR.getAllAgentsNextTargetActions(allAgentsModels, allAgentsNextStatesBatch)
+
+    def __call__(self, agentID, allAgentsModels, miniBatch, allAgentsNextTargetActions = None):
+        allAgentsStateBatch, allAgentsActionsBatch, allAgentsRewardBatch, allAgentsNextStatesBatch = splitMiniBatch(miniBatch)
+        criticLoss, agentModel = self.trainCriticBySASR(agentID, allAgentsModels, allAgentsStateBatch, allAgentsActionsBatch, allAgentsNextStatesBatch, allAgentsRewardBatch,
+                                                        allAgentsNextTargetActions)
 
         return agentModel
 
@@ -297,8 +406,8 @@ class TrainActorFromSA:
         learningRate_ = graph.get_collection_ref("learningRate_")[0]
         actorTrainOpt_ = graph.get_collection_ref("actorTrainOpt_")[0]
 
-        stateDict = {agentState_: [states[i] for states in allAgentsStateBatch] for i, agentState_ in enumerate(allAgentsStates_)}
-        actionDict = {agentAction_: [actions[i] for actions in allAgentsActionsBatch] for i, agentAction_ in enumerate(allAgentsActions_)}
+        stateDict = getAgentsFeedDict(allAgentsStates_, allAgentsStateBatch)
+        actionDict = getAgentsFeedDict(allAgentsActions_, allAgentsActionsBatch)
         valueDict = {learningRate_: self.actorLearningRate}
 
         actorTrainOpt = agentModel.run(actorTrainOpt_, feed_dict={**stateDict, **actionDict, **valueDict} )
@@ -311,7 +420,7 @@ class TrainActor:
         self.trainActorFromSA = trainActorFromSA
 
     def __call__(self, agentID, allAgentsModels, miniBatch):
-        allAgentsStateBatch, allAgentsActionsBatch, allAgentsRewardBatch, allAgentsNextStatesBatch = list(zip(*miniBatch))
+        allAgentsStateBatch, allAgentsActionsBatch, allAgentsRewardBatch, allAgentsNextStatesBatch = splitMiniBatch(miniBatch)
         agentModel = self.trainActorFromSA(agentID, allAgentsModels, allAgentsStateBatch, allAgentsActionsBatch)
 
         return agentModel
@@ -337,22 +446,31 @@ class TrainActor:
 
 
 class TrainMADDPGModelsWithBuffer:
-    def __init__(self, updateParameters, trainActor, trainCritic, sampleFromBuffer, startLearn, allModels):
+    def __init__(self, updateParameters, trainActor, trainCritic, sampleFromBuffer, startLearn, allModels, shareMiniBatch = False):
         self.updateParameters = updateParameters
         self.trainActor = trainActor
         self.trainCritic = trainCritic
         self.sampleFromBuffer = sampleFromBuffer
         self.startLearn = startLearn
         self.allModels = allModels
+        self.shareMiniBatch = shareMiniBatch
 
     def __call__(self, buffer, runTime):
         if not self.startLearn(runTime):
             return
 
         numAgents = len(self.allModels)
-        for agentID in range(numAgents):
+        if self.shareMiniBatch:
+            # one minibatch and one set of target actions per step, taken before any agent's target net is updated
             miniBatch = self.sampleFromBuffer(buffer)
-            agentModel = self.trainCritic(agentID, self.allModels, miniBatch)
+            allAgentsNextTargetActions = self.trainCritic.getAllAgentsNextTargetActions(self.allModels, miniBatch)
+
+        for agentID in range(numAgents):
+            if self.shareMiniBatch:
+                agentModel = self.trainCritic(agentID, self.allModels, miniBatch, allAgentsNextTargetActions)
+            else:
+                miniBatch = self.sampleFromBuffer(buffer)
+                agentModel = self.trainCritic(agentID, self.allModels, miniBatch)
             agentModel = self.trainActor(agentID, agentModel, miniBatch)
             agentModel = self.updateParameters(agentModel)
             self.allModels[agentID] = agentModel
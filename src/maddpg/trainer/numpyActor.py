@@ -0,0 +1,80 @@
+import re
+import numpy as np
+from scipy.special import softmax
+from src.maddpg.trainer.agentsBatch import AgentsBatch
+
+
+def exportActorParameters(model):
+    # actor/trainHidden/Agent{id} holds weights, biases of each fully connected layer in creation order,
+    # actionRange_ is the constant BuildMADDPGModels scales trainAction_ by
+    graph = model.graph
+    actorTrainParams_ = graph.get_collection_ref("actorTrainParams_")[0]
+    agentID = int(re.search(r'actor/trainHidden/Agent(\d+)/', actorTrainParams_[0].name).group(1))
+    actionRange_ = graph.get_collection_ref("actionRange_")[0]
+    actorTrainParams, actionRange = model.run([actorTrainParams_, actionRange_])
+    weights = [np.asarray(param) for param in actorTrainParams[0::2]]
+    biases = [np.asarray(param) for param in actorTrainParams[1::2]]
+    return agentID, weights, biases, actionRange.item()
+
+
+class NumpyActor:
+    def __init__(self, agentID, weights, biases, actionRange):
+        self.agentID = agentID
+        self.weights = weights
+        self.biases = biases
+        self.actionRange = actionRange
+
+    def getAgentObservations(self, allAgentsStatesBatch):
+        if isinstance(allAgentsStatesBatch, AgentsBatch):
+            return allAgentsStatesBatch[self.agentID]
+        if isinstance(allAgentsStatesBatch, np.ndarray) and allAgentsStatesBatch.ndim == 3:
+            return allAgentsStatesBatch[:, self.agentID]
+        return np.array([states[self.agentID] for states in allAgentsStatesBatch])
+
+    def trainAction(self, allAgentsStatesBatch):
+        # same layers as actorTrainActivation_ in BuildMADDPGModels, computed in float32 like the graph
+        activation = np.asarray(self.getAgentObservations(allAgentsStatesBatch), dtype=np.float32)
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            activation = np.maximum(activation @ weight + bias, 0)
+        activation = activation @ self.weights[-1] + self.biases[-1]
+        return activation * np.float32(self.actionRange)
+
+
+def exportNumpyActor(model):
+    agentID, weights, biases, actionRange = exportActorParameters(model)
+    return NumpyActor(agentID, weights, biases, actionRange)
+
+
+def saveNumpyActor(numpyActor, path):
+    np.savez(path, agentID=numpyActor.agentID, actionRange=numpyActor.actionRange,
+             **{'weight' + str(i): weight for i, weight in enumerate(numpyActor.weights)},
+             **{'bias' + str(i): bias for i, bias in enumerate(numpyActor.biases)})
+
+
+def loadNumpyActor(path):
+    actorFile = np.load(path)
+    numLayers = len([key for key in actorFile.files if key.startswith('weight')])
+    weights = [actorFile['weight' + str(i)] for i in range(numLayers)]
+    biases = [actorFile['bias' + str(i)] for i in range(numLayers)]
+    return NumpyActor(int(actorFile['agentID']), weights, biases, actorFile['actionRange'].item())
+
+
+def actByNumpyPolicyTrainNoNoisy(numpyActor, allAgentsStatesBatch):
+    trainAction = numpyActor.trainAction(allAgentsStatesBatch)
+    normalizedTrainAction = softmax(trainAction, axis=1)
+    return normalizedTrainAction
+
+
+class ActByNumpyPolicyTrainNoisy:
+    def __init__(self, randomState=np.random):
+        self.randomState = randomState
+
+    def __call__(self, numpyActor, allAgentsStatesBatch):
+        # gumbel-softmax as noisyTrainAction_
+        trainAction = numpyActor.trainAction(allAgentsStatesBatch)
+        sampleNoiseTrain = self.randomState.uniform(size=trainAction.shape).astype(np.float32)
+        noisyTrainAction = softmax(trainAction - np.log(-np.log(sampleNoiseTrain)), axis=-1)
+        return noisyTrainAction
+
+
+actByNumpyPolicyTrainNoisy = ActByNumpyPolicyTrainNoisy()
@@ -0,0 +1,85 @@
+import os
+import sys
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+os.environ['KMP_DUPLICATE_LIB_OK']='True'
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..', '..'))
+
+import tempfile
+import numpy as np
+import unittest
+from ddt import ddt, data, unpack
+
+try:
+    import tensorflow as tf
+    from src.maddpg.trainer.myMADDPG import BuildMADDPGModels, actByPolicyTrainNoNoisy
+    from src.functionTools.loadSaveModel import saveVariables, restoreVariables
+    isTensorflowInstalled = True
+except ImportError:
+    isTensorflowInstalled = False
+
+
+@unittest.skipIf(not isTensorflowInstalled, 'tensorflow 1.x is not installed')
+@ddt
+class TestSharedSessionCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.actionDim = 5
+        self.obsShapeList = [16, 16, 16, 14]
+        self.numAgents = len(self.obsShapeList)
+        self.layersWidths = [64, 64]
+        self.numModels = 3
+        self.checkpointDirectory = tempfile.mkdtemp()
+
+    def getTrainActions(self, model, allAgentsStatesBatch):
+        graph = model.graph
+        allAgentsStates_ = graph.get_collection_ref("allAgentsStates_")[0]
+        trainAction_ = graph.get_collection_ref("trainAction_")[0]
+        stateDict = {agentState_: [states[i] for states in allAgentsStatesBatch] for i, agentState_ in enumerate(allAgentsStates_)}
+        return model.run(trainAction_, feed_dict=stateDict)
+
+    def sampleStatesBatch(self, batchSize):
+        randomState = np.random.RandomState(14)
+        return [[randomState.uniform(-1, 1, obsDim) for obsDim in self.obsShapeList] for _ in range(batchSize)]
+
+    def buildModels(self, shareSession):
+        buildMADDPGModels = BuildMADDPGModels(self.actionDim, self.numAgents, self.obsShapeList, shareSession=shareSession)
+        return [buildMADDPGModels(self.layersWidths, agentID) for agentID in range(self.numModels)]
+
+    @data((False, True), (True, False))
+    @unpack
+    def testCheckpointsRestoreAcrossLayouts(self, saveShareSession, restoreShareSession):
+        savedModels = self.buildModels(saveShareSession)
+        restoredModels = self.buildModels(restoreShareSession)
+        paths = [os.path.join(self.checkpointDirectory, 'agent' + str(agentID)) for agentID in range(self.numModels)]
+        [saveVariables(model, path) for model, path in zip(savedModels, paths)]
+        [restoreVariables(model, path) for model, path in zip(restoredModels, paths)]
+
+        for singleStateBatch in [self.sampleStatesBatch(1), self.sampleStatesBatch(32)]:
+            for savedModel, restoredModel in zip(savedModels, restoredModels):
+                self.assertTrue(np.array_equal(self.getTrainActions(restoredModel, singleStateBatch),
+                                               self.getTrainActions(savedModel, singleStateBatch)))
+                self.assertTrue(np.array_equal(actByPolicyTrainNoNoisy(restoredModel, singleStateBatch),
+                                               actByPolicyTrainNoNoisy(savedModel, singleStateBatch)))
+
+    def testSharedSaverCoversExactlyTheSeparateCheckpoint(self):
+        # the per-agent saver of the shared layout, optimizer slots included, maps onto the names of a separate model
+        separateModels = self.buildModels(shareSession=False)
+        sharedModels = self.buildModels(shareSession=True)
+        for agentID, (separateModel, sharedModel) in enumerate(zip(separateModels, sharedModels)):
+            path = os.path.join(self.checkpointDirectory, 'separate' + str(agentID))
+            saveVariables(separateModel, path)
+            checkpointNames = {name for name, shape in tf.train.list_variables(path)}
+            sharedSaver = sharedModel.graph.get_collection_ref("saver")[0]
+            sharedNames = set(sharedSaver._var_list.keys())
+            self.assertEqual(sharedNames, checkpointNames)
+
+    def testAgentsDoNotShareVariables(self):
+        sharedModels = self.buildModels(shareSession=True)
+        actorParams = [model.graph.get_collection_ref("actorTrainParams_")[0] for model in sharedModels]
+        actorParamNames = [{param.op.name for param in params} for params in actorParams]
+        for agentID, paramNames in enumerate(actorParamNames):
+            self.assertTrue(all('Agent' + str(agentID) + '/' in name for name in paramNames))
+
+
+if __name__ == '__main__':
+    unittest.main()
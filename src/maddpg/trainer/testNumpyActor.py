@@ -0,0 +1,90 @@
+import os
+import sys
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+os.environ['KMP_DUPLICATE_LIB_OK']='True'
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..', '..'))
+
+import tempfile
+import numpy as np
+import unittest
+from ddt import ddt, data, unpack
+
+from src.maddpg.trainer.numpyActor import NumpyActor, saveNumpyActor, loadNumpyActor, actByNumpyPolicyTrainNoNoisy
+from src.maddpg.trainer.agentsBatch import AgentsBatch
+
+try:
+    from src.maddpg.trainer.myMADDPG import BuildMADDPGModels, actByPolicyTrainNoNoisy
+    from src.maddpg.trainer.numpyActor import exportNumpyActor
+    isTensorflowInstalled = True
+except ImportError:
+    isTensorflowInstalled = False
+
+
+@unittest.skipIf(not isTensorflowInstalled, 'tensorflow 1.x is not installed')
+@ddt
+class TestNumpyActorMatchesTensorflowActor(unittest.TestCase):
+    def setUp(self):
+        self.actionDim = 5
+        self.obsShapeList = [16, 16, 16, 14]
+        self.numAgents = len(self.obsShapeList)
+        self.layersWidths = [64, 64]
+
+    def sampleStatesBatch(self, batchSize):
+        randomState = np.random.RandomState(15)
+        return [[randomState.uniform(-1, 1, obsDim) for obsDim in self.obsShapeList] for _ in range(batchSize)]
+
+    def getTrainActions(self, model, allAgentsStatesBatch):
+        graph = model.graph
+        allAgentsStates_ = graph.get_collection_ref("allAgentsStates_")[0]
+        trainAction_ = graph.get_collection_ref("trainAction_")[0]
+        stateDict = {agentState_: [states[i] for states in allAgentsStatesBatch] for i, agentState_ in enumerate(allAgentsStates_)}
+        return model.run(trainAction_, feed_dict=stateDict)
+
+    @data((1, 1, False), (1, 32, False), (2.5, 1, False), (2.5, 32, True))
+    @unpack
+    def testTrainActionMatches(self, actionRange, batchSize, shareSession):
+        buildMADDPGModels = BuildMADDPGModels(self.actionDim, self.numAgents, self.obsShapeList, actionRange, shareSession)
+        models = [buildMADDPGModels(self.layersWidths, agentID) for agentID in range(3)]
+        allAgentsStatesBatch = self.sampleStatesBatch(batchSize)
+        for agentID, model in enumerate(models):
+            numpyActor = exportNumpyActor(model)
+            self.assertEqual(numpyActor.agentID, agentID)
+            self.assertEqual(numpyActor.actionRange, actionRange)
+            self.assertTrue(np.allclose(numpyActor.trainAction(allAgentsStatesBatch), self.getTrainActions(model, allAgentsStatesBatch),
+                                        rtol=1e-5, atol=1e-5))
+            self.assertTrue(np.allclose(actByNumpyPolicyTrainNoNoisy(numpyActor, allAgentsStatesBatch),
+                                        actByPolicyTrainNoNoisy(model, allAgentsStatesBatch), rtol=1e-5, atol=1e-6))
+
+
+@ddt
+class TestNumpyActor(unittest.TestCase):
+    def setUp(self):
+        randomState = np.random.RandomState(16)
+        layersDims = [6, 8, 8, 5]
+        self.weights = [randomState.normal(size=(inputDim, outputDim)).astype(np.float32) for inputDim, outputDim in zip(layersDims[:-1], layersDims[1:])]
+        self.biases = [randomState.normal(size=outputDim).astype(np.float32) for outputDim in layersDims[1:]]
+        self.allAgentsStatesBatch = randomState.uniform(-1, 1, (10, 3, 6))
+
+    @data((0, 1), (2, 1.5))
+    @unpack
+    def testBatchLayoutsGiveTheSameActions(self, agentID, actionRange):
+        numpyActor = NumpyActor(agentID, self.weights, self.biases, actionRange)
+        trainAction = numpyActor.trainAction(list(self.allAgentsStatesBatch))
+        self.assertTrue(np.array_equal(numpyActor.trainAction(self.allAgentsStatesBatch), trainAction))
+        agentsBatch = AgentsBatch(self.allAgentsStatesBatch[:, agentIndex] for agentIndex in range(3))
+        self.assertTrue(np.array_equal(numpyActor.trainAction(agentsBatch), trainAction))
+        self.assertTrue(np.array_equal(numpyActor.trainAction(self.allAgentsStatesBatch[:1]), trainAction[:1]))
+
+    def testSaveAndLoadRoundTrip(self):
+        numpyActor = NumpyActor(1, self.weights, self.biases, 2.5)
+        path = os.path.join(tempfile.mkdtemp(), 'actor.npz')
+        saveNumpyActor(numpyActor, path)
+        loadedActor = loadNumpyActor(path)
+        self.assertEqual(loadedActor.agentID, 1)
+        self.assertEqual(loadedActor.actionRange, 2.5)
+        self.assertTrue(np.array_equal(loadedActor.trainAction(self.allAgentsStatesBatch), numpyActor.trainAction(self.allAgentsStatesBatch)))
+
+
+if __name__ == '__main__':
+    unittest.main()
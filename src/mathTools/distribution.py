@@ -1,35 +1,119 @@
 import numpy as np
 import random
 import scipy.stats as ss
+from collections.abc import Mapping, MutableMapping
+
+class Categorical(MutableMapping):
+    # support list plus an unnormalized weight vector; reads and writes like the dict distributions it replaces
+    def __init__(self, support, weights):
+        self.support = list(support)
+        self.weights = np.array(weights, dtype=float)
+        self.supportIndex = None
+        self.cumulativeWeights = None
+
+    @classmethod
+    def fromDict(cls, distribution):
+        if isinstance(distribution, Categorical):
+            return distribution
+        return cls(distribution.keys(), np.fromiter(distribution.values(), dtype=float, count=len(distribution)))
+
+    @property
+    def probabilities(self):
+        return self.weights / np.sum(self.weights)
+
+    @property
+    def logProbabilities(self):
+        with np.errstate(divide='ignore'):
+            return np.log(self.weights) - np.log(np.sum(self.weights))
+
+    def getIndex(self, key):
+        if self.supportIndex is None:
+            self.supportIndex = {hypothesis: index for index, hypothesis in enumerate(self.support)}
+        return self.supportIndex[key]
+
+    def __getitem__(self, key):
+        return self.weights[self.getIndex(key)]
+
+    def __setitem__(self, key, value):
+        try:
+            index = self.getIndex(key)
+        except KeyError:
+            # copies share the index dict, so a new key gets a fresh one
+            index = len(self.support)
+            self.support.append(key)
+            self.weights = np.append(self.weights, 0.0)
+            self.supportIndex = dict(self.supportIndex)
+            self.supportIndex[key] = index
+        self.weights[index] = value
+        self.cumulativeWeights = None
+
+    def __delitem__(self, key):
+        index = self.getIndex(key)
+        del self.support[index]
+        self.weights = np.delete(self.weights, index)
+        self.supportIndex = None
+        self.cumulativeWeights = None
+
+    def __iter__(self):
+        return iter(self.support)
+
+    def __len__(self):
+        return len(self.support)
+
+    def keys(self):
+        return list(self.support)
+
+    def values(self):
+        return list(self.weights)
+
+    def items(self):
+        return list(zip(self.support, self.weights))
+
+    def copy(self):
+        copied = Categorical(self.support, self.weights)
+        copied.supportIndex = self.supportIndex
+        copied.cumulativeWeights = self.cumulativeWeights
+        return copied
+
+    def toDict(self):
+        return dict(zip(self.support, self.weights))
+
+    def soften(self, softParameter):
+        softenWeights = np.power(self.weights, softParameter)
+        self.weights = softenWeights / np.sum(softenWeights)
+        self.cumulativeWeights = None
+        return self
+
+    def sampleIndex(self, randomState=np.random):
+        if self.cumulativeWeights is None:
+            self.cumulativeWeights = np.cumsum(self.weights)
+        sampledIndex = np.searchsorted(self.cumulativeWeights, randomState.random_sample() * self.cumulativeWeights[-1], side='right')
+        return min(sampledIndex, len(self.support) - 1)
+
+    def sample(self, randomState=np.random):
+        return self.support[self.sampleIndex(randomState)]
+
+    def argmax(self, randomState=np.random):
+        maxIndices = np.flatnonzero(self.weights == np.max(self.weights))
+        return self.support[randomState.choice(maxIndices)]
+
 
 class SoftDistribution:
     def __init__(self, softParameter):
         self.softParameter = softParameter
 
     def __call__(self, distribution):
-        hypotheses = list(distribution.keys())
-        softenUnnormalizedProbabilities = np.array([np.power(probability, self.softParameter)for probability in list(distribution.values())])
-        softenNormalizedProbabilities = list(softenUnnormalizedProbabilities / np.sum(softenUnnormalizedProbabilities))
-        softenDistribution = dict(zip(hypotheses, softenNormalizedProbabilities))
-        return softenDistribution
+        softenDistribution = Categorical.fromDict(distribution).copy().soften(self.softParameter)
+        if isinstance(distribution, Categorical):
+            return softenDistribution
+        return softenDistribution.toDict()
 
 def maxFromDistribution(distribution):
-    hypotheses = list(distribution.keys())
-    probs = list(distribution.values())
-    maxIndices = np.argwhere(probs == np.max(probs)).flatten()
-    selectedIndex = np.random.choice(maxIndices)
-    selectedHypothesis = hypotheses[selectedIndex]
-    return selectedHypothesis 
+    return Categorical.fromDict(distribution).argmax()
 
 
 def sampleFromDistribution(distribution):
-    hypotheses = list(distribution.keys())
-    probs = list(distribution.values())
-    normlizedProbs = [prob / sum(probs) for prob in probs]
-    # print('normlizedProbs', normlizedProbs)
-    selectedIndex = list(np.random.multinomial(1, normlizedProbs)).index(1)
-    selectedHypothesis = hypotheses[selectedIndex]
-    return selectedHypothesis 
+    return Categorical.fromDict(distribution).sample()
 
 
 class BuildGaussianFixCov:
@@ -41,3 +125,99 @@ class BuildGaussianFixCov:
 
 def sampleFromContinuousSpace(distribution):
     return distribution.rvs() 
+
+
+class GaussianWithFixCov:
+    def __init__(self, mean, buildGaussian):
+        self.mean = mean
+        self.buildGaussian = buildGaussian
+
+    def rvs(self, size=None, random_state=None):
+        randomState = np.random if random_state is None else random_state
+        means = self.mean if size is None else np.broadcast_to(self.mean, np.atleast_1d(size).tolist() + [len(self.mean)])
+        return self.buildGaussian.sample(means, randomState)
+
+    def logpdf(self, x):
+        return self.buildGaussian.logpdf(x, self.mean)
+
+    def pdf(self, x):
+        return np.exp(self.logpdf(x))
+
+
+class BuildGaussianFixCovWithCholesky:
+    def __init__(self, cov):
+        cov = np.array(cov, dtype=float)
+        self.cov = np.diag(cov) if cov.ndim == 1 else cov
+        self.dim = len(self.cov)
+        self.choleskyFactor = np.linalg.cholesky(self.cov)
+        self.choleskyInverse = np.linalg.inv(self.choleskyFactor)
+        logDetCov = 2 * np.sum(np.log(np.diag(self.choleskyFactor)))
+        self.logNormalizer = -0.5 * (self.dim * np.log(2 * np.pi) + logDetCov)
+
+    def __call__(self, mean):
+        return GaussianWithFixCov(np.array(mean, dtype=float), self)
+
+    def sample(self, means, randomState=np.random):
+        # means: (..., dim); one RNG call for the whole batch
+        means = np.asarray(means, dtype=float)
+        standardNoise = randomState.standard_normal(means.shape)
+        return standardNoise @ self.choleskyFactor.T + means
+
+    def logpdf(self, x, means):
+        whitenedDiff = (np.asarray(x, dtype=float) - np.asarray(means, dtype=float)) @ self.choleskyInverse.T
+        return self.logNormalizer - 0.5 * np.sum(np.square(whitenedDiff), axis=-1)
+
+    def pdf(self, x, means):
+        return np.exp(self.logpdf(x, means))
+
+
+class IndexedJointActionSpace:
+    def __init__(self, jointActionSpace):
+        self.jointActionSpace = [tuple(tuple(individualAction) for individualAction in jointAction) for jointAction in jointActionSpace]
+        numAgents = len(self.jointActionSpace[0])
+        self.individualActionSpaces = [list(dict.fromkeys([jointAction[agentPosition] for jointAction in self.jointActionSpace]))
+                                       for agentPosition in range(numAgents)]
+        self.individualActionIndexes = [{action: index for index, action in enumerate(individualActionSpace)}
+                                        for individualActionSpace in self.individualActionSpaces]
+        self.jointToIndividualIndex = np.array([[actionIndex[jointAction[agentPosition]]
+                                                 for agentPosition, actionIndex in enumerate(self.individualActionIndexes)]
+                                                for jointAction in self.jointActionSpace])
+        self.jointActionIndexes = {jointAction: index for index, jointAction in enumerate(self.jointActionSpace)}
+        self.marginalLayouts = {}
+
+    def getMarginalLayout(self, agentPositions):
+        # the joint-to-marginal index only depends on which positions are kept, so it is built once per layout
+        agentPositions = tuple(agentPositions)
+        if agentPositions not in self.marginalLayouts:
+            marginalShape = tuple(len(self.individualActionSpaces[agentPosition]) for agentPosition in agentPositions)
+            marginalIndex = np.ravel_multi_index(self.jointToIndividualIndex[:, list(agentPositions)].T, marginalShape)
+            self.marginalLayouts[agentPositions] = (marginalIndex, marginalShape)
+        return self.marginalLayouts[agentPositions]
+
+    def marginalize(self, jointProbabilities, agentPositions):
+        marginalIndex, marginalShape = self.getMarginalLayout(agentPositions)
+        return np.bincount(marginalIndex, weights=jointProbabilities, minlength=int(np.prod(marginalShape)))
+
+    def getMarginalActionIndex(self, individualActions, agentPositions):
+        marginalIndex, marginalShape = self.getMarginalLayout(agentPositions)
+        individualIndexes = [self.individualActionIndexes[agentPosition][tuple(individualAction)]
+                             for agentPosition, individualAction in zip(agentPositions, individualActions)]
+        return np.ravel_multi_index(individualIndexes, marginalShape)
+
+    def getJointActionIndex(self, jointAction):
+        return self.jointActionIndexes[tuple(tuple(individualAction) for individualAction in jointAction)]
+
+    def toProbabilities(self, distribution):
+        if isinstance(distribution, Categorical):
+            jointActions, probabilities = distribution.support, distribution.probabilities
+        elif isinstance(distribution, Mapping):
+            jointActions = list(distribution.keys())
+            probabilities = np.fromiter(distribution.values(), dtype=float, count=len(distribution))
+        else:
+            return np.asarray(distribution, dtype=float)
+        # distributions that enumerate the space in its own order, as ApproximatePolicy does, are used as they are
+        if jointActions == self.jointActionSpace:
+            return probabilities
+        spaceProbabilities = np.zeros(len(self.jointActionSpace))
+        spaceProbabilities[[self.getJointActionIndex(jointAction) for jointAction in jointActions]] = probabilities
+        return spaceProbabilities
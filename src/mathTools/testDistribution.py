@@ -0,0 +1,112 @@
+import os
+import sys
+dirName = os.path.dirname(__file__)
+sys.path.append(os.path.join(dirName, '..', '..'))
+
+import numpy as np
+import unittest
+from ddt import ddt, data, unpack
+
+from src.mathTools.distribution import Categorical, SoftDistribution, maxFromDistribution, sampleFromDistribution
+
+
+def softDistributionAsDict(distribution, softParameter):
+    # the dict implementation Categorical.soften replaces
+    hypotheses = list(distribution.keys())
+    softenUnnormalizedProbabilities = np.array([np.power(probability, softParameter) for probability in list(distribution.values())])
+    softenNormalizedProbabilities = list(softenUnnormalizedProbabilities / np.sum(softenUnnormalizedProbabilities))
+    return dict(zip(hypotheses, softenNormalizedProbabilities))
+
+
+@ddt
+class TestCategorical(unittest.TestCase):
+    def setUp(self):
+        self.distribution = {(10, 0): 0.2, (0, 10): 0.5, (-10, 0): 0.0, (0, -10): 0.3, (0, 0): 1.0}
+
+    @data(({'a': 1, 'b': 1}, ), ({'a': 0.2, 'b': 0.5, 'c': 0.0, 'd': 0.3}, ), ({0: 3.0, 1: 1.0, 2: 6.0}, ))
+    @unpack
+    def testSampleFrequenciesMatchNormalizedWeights(self, distribution):
+        categorical = Categorical.fromDict(distribution)
+        randomState = np.random.RandomState(17)
+        numSamples = 100000
+        samples = [categorical.sample(randomState) for _ in range(numSamples)]
+        normalizedWeights = np.array(list(distribution.values())) / np.sum(list(distribution.values()))
+        frequencies = np.array([samples.count(hypothesis) for hypothesis in distribution.keys()]) / numSamples
+        self.assertTrue(np.allclose(frequencies, normalizedWeights, atol=0.01))
+        self.assertTrue(all(frequency == 0 for frequency, weight in zip(frequencies, normalizedWeights) if weight == 0))
+
+    def testSampleFromDistributionOnDict(self):
+        np.random.seed(18)
+        samples = [sampleFromDistribution(self.distribution) for _ in range(50000)]
+        frequencies = np.array([samples.count(hypothesis) for hypothesis in self.distribution.keys()]) / len(samples)
+        self.assertTrue(np.allclose(frequencies, np.array(list(self.distribution.values())) / 2.0, atol=0.01))
+
+    def testArgmaxBreaksTiesAtRandom(self):
+        categorical = Categorical(['a', 'b', 'c', 'd'], [0.4, 0.1, 0.4, 0.1])
+        randomState = np.random.RandomState(19)
+        maxHypotheses = [categorical.argmax(randomState) for _ in range(1000)]
+        self.assertEqual(set(maxHypotheses), {'a', 'c'})
+        self.assertTrue(0.4 < maxHypotheses.count('a') / len(maxHypotheses) < 0.6)
+        self.assertEqual(maxFromDistribution(self.distribution), (0, 0))
+
+    @data((1, ), (0.5, ), (3, ), (0, ))
+    @unpack
+    def testSoftenMatchesDictSoftDistribution(self, softParameter):
+        softenDistribution = SoftDistribution(softParameter)(self.distribution)
+        trueSoftenDistribution = softDistributionAsDict(self.distribution, softParameter)
+        self.assertIsInstance(softenDistribution, dict)
+        self.assertEqual(list(softenDistribution.keys()), list(trueSoftenDistribution.keys()))
+        self.assertTrue(np.allclose(list(softenDistribution.values()), list(trueSoftenDistribution.values()), rtol=1e-12))
+
+    def testSoftenKeepsCategoricalAndLeavesInputUnchanged(self):
+        categorical = Categorical.fromDict(self.distribution)
+        softenCategorical = SoftDistribution(2)(categorical)
+        self.assertIsInstance(softenCategorical, Categorical)
+        self.assertTrue(np.array_equal(categorical.weights, list(self.distribution.values())))
+        self.assertTrue(np.allclose(softenCategorical.values(), list(softDistributionAsDict(self.distribution, 2).values())))
+
+    def testSetNewKeyOnCopyLeavesOriginalUnchanged(self):
+        categorical = Categorical.fromDict(self.distribution)
+        categorical[(0, 0)]  # builds supportIndex, which the copy then shares
+        copied = categorical.copy()
+        copied[(7, 7)] = 0.4
+        self.assertEqual(copied[(7, 7)], 0.4)
+        self.assertEqual(len(copied), len(self.distribution) + 1)
+        self.assertEqual(len(categorical), len(self.distribution))
+        self.assertNotIn((7, 7), categorical)
+        with self.assertRaises(KeyError):
+            categorical[(7, 7)]
+        categorical[(7, 7)] = 0.9
+        self.assertEqual(categorical[(7, 7)], 0.9)
+        self.assertEqual(copied[(7, 7)], 0.4)
+
+    def testSetExistingKeyUpdatesSampling(self):
+        categorical = Categorical(['a', 'b'], [1.0, 0.0])
+        randomState = np.random.RandomState(20)
+        self.assertEqual(categorical.sample(randomState), 'a')
+        categorical['a'] = 0.0
+        categorical['b'] += 1.0
+        self.assertEqual({categorical.sample(randomState) for _ in range(100)}, {'b'})
+
+    def testDeleteKey(self):
+        categorical = Categorical.fromDict(self.distribution)
+        copied = categorical.copy()
+        del categorical[(0, 10)]
+        self.assertNotIn((0, 10), categorical)
+        self.assertEqual(categorical.keys(), [(10, 0), (-10, 0), (0, -10), (0, 0)])
+        self.assertEqual([categorical[hypothesis] for hypothesis in categorical], [0.2, 0.0, 0.3, 1.0])
+        self.assertEqual(copied[(0, 10)], 0.5)
+        self.assertEqual(copied[(0, 0)], 1.0)
+        with self.assertRaises(KeyError):
+            del categorical[(0, 10)]
+
+    def testDictAdapter(self):
+        categorical = Categorical.fromDict(self.distribution)
+        self.assertIs(Categorical.fromDict(categorical), categorical)
+        self.assertEqual(categorical.toDict(), self.distribution)
+        self.assertEqual(dict(categorical.items()), self.distribution)
+        self.assertTrue(np.allclose(categorical.probabilities, np.array(list(self.distribution.values())) / 2.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
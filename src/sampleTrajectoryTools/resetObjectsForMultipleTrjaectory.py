@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 import copy
+from src.inference.intention import IntentionHistory
 
 class RecordValuesForObjects:
     def __init__(self, attributes, objects):
@@ -19,8 +20,18 @@ class ResetObjects:
         self.objects = objects
 
     def __call__(self):
-        [[setattr(objectCase, attribute, value) for attribute, value in zip(list(attributeValue.keys()), copy.deepcopy(list(attributeValue.values())))]
-         for objectCase, attributeValue in zip(self.objects, self.attributeValues)]
+        for objectCase, attributeValue in zip(self.objects, self.attributeValues):
+            for attribute, value in attributeValue.items():
+                currentValue = getattr(objectCase, attribute, None)
+                # array histories keep their buffer and only rewind
+                if isinstance(currentValue, IntentionHistory):
+                    currentValue.rewind(value)
+                else:
+                    setattr(objectCase, attribute, copy.deepcopy(value))
+            # one-step inference with its own per-trial state, e.g. InferOneStepOnBeam, resets itself
+            resetInferIntentionOneStep = getattr(getattr(objectCase, 'inferIntentionOneStep', None), 'reset', None)
+            if resetInferIntentionOneStep is not None:
+                resetInferIntentionOneStep()
 
 
 
@@ -37,4 +48,16 @@ class GetObjectsValuesOfAttributes:
         return returnAttributeValues
 
 
+class GetObjectsIntentionHistories:
+    def __init__(self, returnAttribute, objects):
+        self.returnAttribute = returnAttribute
+        self.objects = objects
 
+    def __call__(self):
+        # one (numObjects, numSteps, numIntentions) array with the intention index the objects share
+        intentionHistories = [getattr(objectCase, self.returnAttribute) for objectCase in self.objects]
+        intentions = list(intentionHistories[0].intentions)
+        if any(list(intentionHistory.intentions) != intentions for intentionHistory in intentionHistories[1:]):
+            raise ValueError('intention histories of the objects are recorded over different intentions')
+        return {'intentions': intentions,
+                'probabilities': np.stack([intentionHistory.toArray() for intentionHistory in intentionHistories])}
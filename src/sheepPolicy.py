@@ -3,6 +3,7 @@
 import tensorflow as tf
 import tensorflow.contrib.layers as layers
 import model.tf_util as U
+from src.mathTools.distribution import Categorical
 import numpy as np
 import scipy.stats as stats
 import random
@@ -310,21 +311,11 @@ class ApproximatePolicy:
 
 
 def chooseGreedyAction(actionDist):
-    actions = list(actionDist.keys())
-    probs = list(actionDist.values())
-    maxIndices = np.argwhere(probs == np.max(probs)).flatten()
-    selectedIndex = np.random.choice(maxIndices)
-    selectedAction = actions[selectedIndex]
-    return selectedAction
+    return Categorical.fromDict(actionDist).argmax()
 
 
 def sampleAction(actionDist):
-    actions = list(actionDist.keys())
-    probs = list(actionDist.values())
-    normlizedProbs = [prob / sum(probs) for prob in probs]
-    selectedIndex = list(np.random.multinomial(1, normlizedProbs)).index(1)
-    selectedAction = actions[selectedIndex]
-    return selectedAction
+    return Categorical.fromDict(actionDist).sample()
 
 
 class SoftmaxAction:
@@ -332,12 +323,10 @@ class SoftmaxAction:
         self.softMaxBeta = softMaxBeta
 
     def __call__(self, actionDist):
-        actions = list(actionDist.keys())
-        probs = list(actionDist.values())
-        normlizedProbs = list(np.divide(np.exp(np.multiply(self.softMaxBeta, probs)), np.sum(np.exp(np.multiply(self.softMaxBeta, probs)))))
-        selectedIndex = list(np.random.multinomial(1, normlizedProbs)).index(1)
-        selectedAction = actions[selectedIndex]
-        return selectedAction
+        actionCategorical = Categorical.fromDict(actionDist)
+        scaledValues = np.multiply(self.softMaxBeta, actionCategorical.weights)
+        softmaxCategorical = Categorical(actionCategorical.support, np.exp(scaledValues - np.max(scaledValues)))
+        return softmaxCategorical.sample()
 
 
 def restoreVariables(model, path):
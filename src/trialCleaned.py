@@ -136,7 +136,7 @@ class NewtonChaseTrialAllCondtionVariouSpeedForSharedAgency():
             
             wolfActionUpdateInterval = self.allWolfActionUpdateInterval[sheepMaxSpeed]
             if np.mod(trialStep, wolfActionUpdateInterval) == 0:
-                wolfAction = [sampleAction(state) for sampleAction in wolfPolicy]
+                wolfAction = wolfPolicy(state) if callable(wolfPolicy) else [sampleAction(state) for sampleAction in wolfPolicy]
             else:
                 wolfAction = wolfAction
                 
@@ -148,7 +148,7 @@ class NewtonChaseTrialAllCondtionVariouSpeedForSharedAgency():
             action = wolfAction + sheepAction
             recordActionForUpdateIntention([action])
             if np.mod(trialStep, inferenceInterval) == 0 and np.mod(trialStep, wolfActionUpdateInterval) != 0:
-                supposedWolfAction = [sampleAction(state) for sampleAction in wolfPolicy] # just for running inferrence and updateIntention in 'sampleAction'
+                supposedWolfAction = wolfPolicy(state) if callable(wolfPolicy) else [sampleAction(state) for sampleAction in wolfPolicy] # just for running inferrence and updateIntention in 'sampleAction'
                 
             nextState = transit(state, wolfAction, sheepAction, wolfForce, sheepForce)
             reward = rewardWolf(state, action, nextState)[0]
@@ -146,7 +146,7 @@ class NewtonChaseTrialHybridTeamForSharedAgency():
             
             wolfActionUpdateInterval = self.allWolfActionUpdateInterval[sheepMaxSpeed]
             if np.mod(trialStep, wolfActionUpdateInterval) == 0:
-                wolfAction = [sampleAction(state) for sampleAction in wolfPolicy]
+                wolfAction = wolfPolicy(state) if callable(wolfPolicy) else [sampleAction(state) for sampleAction in wolfPolicy]
             else:
                 wolfAction = wolfAction
             # print(trialStep, 'wolfAction', wolfAction)
@@ -170,7 +170,7 @@ class NewtonChaseTrialHybridTeamForSharedAgency():
             # print(trialStep, 'action', action)
             recordActionForUpdateIntention([action])
             if np.mod(trialStep, inferenceInterval) == 0 and np.mod(trialStep, wolfActionUpdateInterval) != 0:
-                supposedWolfAction = [sampleAction(state) for sampleAction in wolfPolicy] # just for running inferrence and updateIntention in 'sampleAction'
+                supposedWolfAction = wolfPolicy(state) if callable(wolfPolicy) else [sampleAction(state) for sampleAction in wolfPolicy] # just for running inferrence and updateIntention in 'sampleAction'
                 
             nextState = transit(state, actionWolfHybrid, actionSheepHumanTrial, wolfForce, sheepForce)
             reward = rewardWolf(state, action, nextState)[0]